@@ -0,0 +1,147 @@
+"""
+连接复用对比 - 每次请求新建连接（requests.post） vs 共享连接池（LLMClient）
+本地桩服务按脚本模型回复 chat/completions，统计服务端接受的 TCP 连接数；
+每个新连接在服务端等待 --handshake 秒，模拟真实接口的 TCP + TLS 握手耗时。
+同一批订单各跑一遍完整的多轮 ReAct 循环，输出连接数、总耗时和平均每轮耗时。
+
+    python3 bench_pool.py --handshake 0.03 --latency 0.05
+"""
+import io
+import json
+import time
+import socket
+import argparse
+import threading
+from contextlib import redirect_stdout
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from order_agent import PROMPT, Agent, run_agent, scripted_reply
+from common import llm
+from common.cache import LRUCompletionCache
+from common.llm import API_KEY, LLMClient, parse_sse_line, SSE_DONE
+from common.offline import ScriptedLLMClient, message_to_chunks
+
+ORDERS = [
+    "我要2份汉堡和1杯可乐",
+    "来一杯咖啡，再来两个三明治",
+    "一份披萨、一份沙拉和两杯奶茶，帮我算一下总价",
+    "两个鸡翅，一份薯条",
+]
+
+
+class StubServer:
+    """keep-alive 的大模型桩服务：记录接受的连接数，新连接先等待 handshake 秒"""
+
+    def __init__(self, handshake: float, latency: float):
+        stub = self
+        script = ScriptedLLMClient(scripted_reply)
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                # 响应头和响应体分两次写出，关闭 Nagle 避免与客户端的延迟确认叠加出 40ms 等待
+                self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                with stub.lock:
+                    stub.connections += 1
+                time.sleep(stub.handshake)
+
+            def do_POST(self):
+                data = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                time.sleep(stub.latency)
+                response = script.chat(data)
+                if data.get("stream"):
+                    chunks = message_to_chunks(response["choices"][0]["message"])
+                    body = "".join(f"data: {json.dumps(c, ensure_ascii=False)}\n\n" for c in chunks)
+                    body = (body + "data: [DONE]\n\n").encode("utf-8")
+                    content_type = "text/event-stream"
+                else:
+                    body = json.dumps(response, ensure_ascii=False).encode("utf-8")
+                    content_type = "application/json"
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.handshake = handshake
+        self.latency = latency
+        self.connections = 0
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/v1/chat/completions"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class PerRequestClient:
+    """改造前的做法：每次调用模块级 requests.post，每轮都新建连接"""
+
+    def __init__(self):
+        self.headers = {"Content-Type": "application/json", "Authorization": f"Bearer {API_KEY}"}
+
+    def chat(self, data: dict, body: bytes = None) -> dict:
+        import requests
+        response = requests.post(llm.API_URL, headers=self.headers, data=body or llm.dumps_compact(data),
+                                 timeout=llm.REQUEST_TIMEOUT, verify=False)
+        response.raise_for_status()
+        return response.json()
+
+    def chat_stream(self, data: dict, body: bytes = None):
+        import requests
+        with requests.post(llm.API_URL, headers=self.headers, data=body or llm.dumps_compact(data),
+                           timeout=llm.REQUEST_TIMEOUT, verify=False, stream=True) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                chunk = parse_sse_line(line.decode("utf-8"))
+                if chunk is SSE_DONE:
+                    break
+                if chunk is not None:
+                    yield chunk
+
+    def close(self):
+        pass
+
+
+def run_variant(stub: StubServer, orders: list, client, stream: bool) -> dict:
+    """逐个订单运行多轮 ReAct 循环，返回轮次、新建连接数和耗时"""
+    connections = stub.connections
+    turns = 0
+    start = time.perf_counter()
+    for order in orders:
+        # 每个订单使用独立的空缓存，每一轮都真实请求桩服务
+        agent = Agent(PROMPT, client=client, stream=stream, cache=LRUCompletionCache())
+        with redirect_stdout(io.StringIO()):
+            run_agent(order, agent=agent)
+        turns += len(agent.turns)
+    return {"turns": turns, "connections": stub.connections - connections,
+            "elapsed": time.perf_counter() - start}
+
+
+# ==================== 主程序入口 ====================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="每次新建连接与共享连接池对比")
+    parser.add_argument("--handshake", type=float, default=0.03, help="每个新连接的模拟握手耗时（秒）")
+    parser.add_argument("--latency", type=float, default=0.05, help="模拟的大模型响应耗时（秒）")
+    parser.add_argument("--repeat", type=int, default=5, help="内置订单重复次数")
+    parser.add_argument("--stream", action="store_true", help="使用流式输出")
+    args = parser.parse_args()
+
+    stub = StubServer(args.handshake, args.latency)
+    llm.API_URL = stub.url
+    orders = ORDERS * args.repeat
+    print(f"{'方式':<12} {'轮次':>6} {'新建连接':>8} {'总耗时':>10} {'平均每轮':>10}")
+    for name, client in (("每次新建连接", PerRequestClient()), ("共享连接池", LLMClient())):
+        result = run_variant(stub, orders, client, args.stream)
+        client.close()
+        print(f"{name:<12} {result['turns']:>6} {result['connections']:>8} {result['elapsed']:>9.2f}s "
+              f"{result['elapsed'] / result['turns'] * 1000:>8.1f}ms")
+    stub.close()
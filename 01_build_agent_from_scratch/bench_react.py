@@ -0,0 +1,86 @@
+"""
+ReAct 输出控制对比 - 停止序列 / max_tokens / 提前截断 开启前后
+同一批订单分别用两种设置跑一遍，输出每轮的生成 token 数和耗时。
+
+默认回放 fixtures/bench_react.jsonl（内置订单、两种设置、流式和非流式都已录制，不访问网络）：
+    python3 bench_react.py --stream
+自带的录制由脚本模型生成：模拟模型输出 [Call: ...] 后继续编造 Action / Observation 的行为，
+耗时按 首 token 0.35s + 每 token 20ms 计算。用真实模型重新录制（截断后第二轮起的对话历史不同，两种设置都要录制）：
+    LLM_MODE=record LLM_FIXTURE_PATH=fixtures/bench_react.jsonl python3 bench_react.py --live
+    LLM_MODE=record LLM_FIXTURE_PATH=fixtures/bench_react.jsonl python3 bench_react.py --live --stream
+回放时 stop 按接口语义截断录制的回复，耗时按保留比例缩短（max_tokens 不模拟）；自定义订单需要 --live。
+"""
+import io
+import os
+import argparse
+from contextlib import redirect_stdout
+
+from order_agent import PROMPT, Agent, run_agent
+from common.cache import LRUCompletionCache
+from common.offline import ReplayLLMClient
+
+FIXTURE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "bench_react.jsonl")
+
+ORDERS = [
+    "我要2份汉堡和1杯可乐",
+    "来一杯咖啡，再来两个三明治",
+    "一份披萨、一份沙拉和两杯奶茶，帮我算一下总价",
+]
+
+VARIANTS = {
+    "before": {"stop": None, "max_tokens": None, "early_cutoff": False},
+    "after": {},  # 使用 order_agent 中的默认配置
+}
+
+
+def run_variant(orders: list, stream: bool, options: dict, client=None) -> list:
+    """逐个订单运行 ReAct 循环，返回 [(订单, 每轮统计)]；client 为 None 时按 LLM_MODE 创建"""
+    results = []
+    for order in orders:
+        # 每个订单使用独立的空缓存，避免命中之前的回复
+        agent = Agent(PROMPT, client=client, stream=stream, cache=LRUCompletionCache(), **options)
+        with redirect_stdout(io.StringIO()):
+            run_agent(order, agent=agent)
+        results.append((order, agent.turns))
+    return results
+
+
+def report(name: str, results: list):
+    print(f"\n[{name}]")
+    print(f"{'订单':<24} {'轮次':>4} {'tokens':>8} {'耗时':>10} {'截断':>4}")
+    total_tokens = 0
+    total_elapsed = 0.0
+    turns = 0
+    for order, stats in results:
+        for i, turn in enumerate(stats, 1):
+            print(f"{order[:22]:<24} {i:>4} {turn['completion_tokens']:>8} "
+                  f"{turn['elapsed']*1000:>8.0f}ms {'是' if turn['cut'] else '':>4}")
+            total_tokens += turn["completion_tokens"]
+            total_elapsed += turn["elapsed"]
+            turns += 1
+    if turns:
+        print(f"合计 {turns} 轮  生成 {total_tokens} tokens（平均 {total_tokens / turns:.1f}）  "
+              f"耗时 {total_elapsed:.2f}s（平均 {total_elapsed / turns * 1000:.0f}ms）")
+
+
+# ==================== 主程序入口 ====================
+if __name__ == "__main__":
+    import urllib3
+    urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+    parser = argparse.ArgumentParser(description="ReAct 输出控制开启前后对比")
+    parser.add_argument("--stream", action="store_true", help="使用流式输出（提前截断只在流式下断开连接）")
+    parser.add_argument("--variant", choices=["before", "after", "both"], default="both")
+    parser.add_argument("--orders", help="订单文件（每行一个），默认使用内置示例")
+    parser.add_argument("--fixture", default=FIXTURE_PATH, help="回放的录制文件")
+    parser.add_argument("--live", action="store_true", help="不回放录制，按 LLM_MODE 请求模型（live / record / ...）")
+    args = parser.parse_args()
+
+    orders = ORDERS
+    if args.orders:
+        with open(args.orders, encoding="utf-8") as f:
+            orders = [line.strip() for line in f if line.strip()]
+    names = ["before", "after"] if args.variant == "both" else [args.variant]
+    client = None if args.live else ReplayLLMClient(args.fixture)
+    for name in names:
+        report(name, run_variant(orders, args.stream, VARIANTS[name], client))
@@ -5,78 +5,247 @@
 """
 import os
 import re
-import requests
+import sys
+import time
+import threading
+
+# LLM 客户端、缓存、菜单、工具注册表等各章共用的部分在仓库根目录的 common 包中
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common import offline
+from common.llm import MODEL, LLMClient
+from common.offline import LLM_MODE
+from common.cache import CompletionCache, get_completion_cache
+from common.router import ModelRouter, router_stats, cascade, chat_cached
+from common.tools import ToolRegistry
+from common.menu import MENU_LIST_LIMIT, get_menu_catalog, ask_menu_price, price_items
+from common.expression import calculate
+from common.fast_path import try_fast_path, fast_path_stats, extract_order_items
 
 # ==================== 配置 ====================
-API_URL = "https://api.lkeap.cloud.tencent.com/v1/chat/completions"
-API_KEY = os.environ.get("TENCENT_API_KEY", "")
-MODEL = "deepseek-v3"
-
-# ==================== 菜单数据 ====================
-MENU = {
-    "汉堡": 25,
-    "薯条": 12,
-    "可乐": 8,
-    "鸡翅": 18,
-    "冰淇淋": 6,
-    "咖啡": 15,
-    "沙拉": 20,
-    "披萨": 45,
-    "三明治": 22,
-    "奶茶": 10,
-}
-
-def ask_menu_price(item_name: str) -> str:
-    """查询菜品价格"""
-    item_name = item_name.strip()
-    if item_name in MENU:
-        return f"{item_name}的价格是{MENU[item_name]}元"
-    else:
-        available = "、".join(MENU.keys())
-        return f"抱歉，菜单中没有{item_name}。可选菜品有：{available}"
-
-
-def calculate(expression: str) -> str:
-    """计算数学表达式"""
-    try:
-        # 安全地计算数学表达式
-        result = eval(expression, {"__builtins__": {}}, {})
-        return f"{result}元"
-    except Exception as e:
-        return f"计算错误: {str(e)}"
+# 流式输出（SSE）：边生成边显示
+STREAM = False
+
+# ReAct 输出控制：模型输出 [Call: ...] 后常会继续编造 Action / Observation，用停止序列截断
+STOP_SEQUENCES = ["\nAction:", "\nObservation:"]
+MAX_TOKENS = 256  # 每轮最多生成的 token 数（None 表示不限制）
+EARLY_CUTOFF = True  # 匹配到第一个完整的 [Call: ...] 后立即停止接收（流式）并丢弃后续内容
+
+# 模型级联：命中路由规则的轮次先用小模型（CHEAP_MODEL），输出校验失败（或请求失败）再升级到 MODEL
+ROUTE_RULES = [
+    # max_messages: 历史消息数上限（历史越长，小模型越容易出错）
+    {"name": "observation", "turn": "tool", "max_pending_tools": 1, "max_messages": 12},
+    {"name": "first_turn", "turn": "user", "max_messages": 2},
+]
+
+# ==================== 工具注册 ====================
+# 同一个注册表服务 ReAct 文本协议：[Call: 工具名: 参数] 由 registry.dispatch_text 分发
+registry = ToolRegistry()
+registry.tool(params={"item_name": "菜品名称，如：汉堡、可乐、薯条"})(ask_menu_price)
+registry.tool(params={"expression": "数学表达式，如：25*2 + 8*1"})(calculate)
+
+
+@registry.tool(params={"items": "菜品列表，如：汉堡*2, 可乐*1"})
+def ask_menu_prices(items: str) -> str:
+    """批量查询菜品价格，参数形如 "汉堡*2, 可乐*1"（数量缺省为 1）"""
+    parsed = []
+    for part in re.split(r'[,，、;；]', items):
+        part = part.strip()
+        if not part:
+            continue
+        m = re.match(r'^(.+?)\s*(?:[*xX×]\s*(-?\d+))?$', part)  # 负数也解析出来，由 price_items 拒绝
+        parsed.append((m.group(1), int(m.group(2) or 1)))
+    return price_items(parsed)
+
+
+# ==================== LLM 客户端 ====================
+_llm_client = None
+_llm_client_lock = threading.Lock()
+
+
+def get_llm_client() -> LLMClient:
+    """获取进程内共享的 LLMClient（所有 Agent 复用同一个连接池）"""
+    global _llm_client
+    if _llm_client is None:
+        with _llm_client_lock:
+            if _llm_client is None:
+                _llm_client = create_llm_client()
+    return _llm_client
+
+
+def create_llm_client(mode: str = LLM_MODE):
+    """按 LLM_MODE 创建大模型客户端（live / record / replay / scripted）"""
+    return offline.create_llm_client(scripted_reply, mode)
+
+
+# ==================== 脚本模型规则（LLM_MODE=scripted）====================
+def scripted_reply(messages: list) -> dict:
+    """脚本规则：顾客点单 → 输出 [Call: ask_menu_prices: ...]；收到 Observation → 按合计回答"""
+    last = messages[-1]["content"]
+    if last.startswith("Observation:"):
+        total = re.search(r"合计：(\d+)元", last)
+        answer = f"您的订单总计{total.group(1)}元" if total else last[len("Observation:"):].strip()
+        return {"role": "assistant", "content": f"Thought: 得到合计，输出答案\nAnswer: {answer}"}
+    items = extract_order_items(last)
+    if not items:
+        return {"role": "assistant", "content": "Thought: 没有识别到菜品\nAnswer: 抱歉，没有识别到菜品"}
+    items = ", ".join(f"{name}*{quantity}" for name, quantity in items)
+    return {"role": "assistant", "content": f"Thought: 一次查询所有菜品[Call: ask_menu_prices: {items}]"}
+
+
+# ==================== ReAct 输出控制 ====================
+# 从 Thought 中匹配工具调用意图 [Call: tool_name: params]
+CALL_RE = re.compile(r'\[Call: (\w+): ([^\]]+)\]', re.MULTILINE)
+
+
+def cut_after_first_call(text: str) -> str:
+    """只保留到第一个完整的 [Call: ...] 为止，丢弃模型之后编造的 Action / Observation"""
+    match = CALL_RE.search(text)
+    return text[:match.end()] if match else text
+
+
+def estimate_tokens(text: str) -> int:
+    """接口没有返回 token 用量时（如提前断开的流式回复）按字节数粗略估算"""
+    return len(text.encode("utf-8")) // 4
+
+
+# ==================== 模型路由（级联）====================
+def validate_react_output(text: str) -> str:
+    """检查 ReAct 输出：可解析的 [Call: ...]（工具存在、参数合法）或 Answer，返回失败原因（通过时为 None）"""
+    match = CALL_RE.search(text)
+    if match:
+        error = registry.validate_text(*match.groups())
+        return error.split(":")[0] if error else None
+    if "[Call:" in text:
+        return "调用格式错误"
+    if "Answer:" in text:
+        return None
+    return "没有调用也没有回答"
+
+
+class ReActRouter(ModelRouter):
+    """ReAct 版本的路由：工具结果以 "Observation:" 开头的 user 消息传回"""
+
+    @staticmethod
+    def pending_tools(messages: list) -> int:
+        last = messages[-1] if messages else {}
+        return int(last.get("role") == "user" and (last.get("content") or "").startswith("Observation:"))
 
 
 # ==================== Agent 核心类 ====================
 class Agent:
-    def __init__(self, system=""):
+    def __init__(self, system="", client: LLMClient = None, stream: bool = False,
+                 cache: CompletionCache = None, stop: list = STOP_SEQUENCES,
+                 max_tokens: int = MAX_TOKENS, early_cutoff: bool = EARLY_CUTOFF, router: ModelRouter = None):
         self.system = system
         self.messages = []
+        self.client = client or get_llm_client()
+        self.stream = stream
+        self.cache = cache if cache is not None else get_completion_cache()
+        self.stop = stop
+        self.max_tokens = max_tokens
+        self.early_cutoff = early_cutoff
+        self.router = router or ReActRouter(ROUTE_RULES)
+        self.last_usage = {}  # 最近一次请求的 token 用量（命中缓存或提前断开时为空）
+        self.last_cached = False  # 最近一次请求是否命中响应缓存
+        self.turns = []  # 每轮的耗时、生成 token 数、是否提前截断、使用的模型和是否升级
         if self.system:
             self.messages.append({"role": "system", "content": system})
 
-    def invoke(self, message: str) -> str:
-        """发送消息并获取回复"""
+    def invoke(self, message: str, on_delta=None) -> str:
+        """发送消息并获取回复（流式模式下每收到一段内容调用 on_delta）"""
         self.messages.append({"role": "user", "content": message})
-        result = self.execute()
+        result = self.execute(on_delta)
         self.messages.append({"role": "assistant", "content": result})
         return result
 
-    def execute(self) -> str:
-        """调用大模型API"""
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {API_KEY}"
-        }
+    def execute(self, on_delta=None) -> str:
+        """调用大模型API（按路由规则先用小模型，输出校验失败再升级到大模型）"""
         data = {
             "model": MODEL,
             "messages": self.messages,
             "temperature": 0,
-            "stream": False
+            "stream": self.stream
         }
+        if self.stop:
+            data["stop"] = self.stop
+        if self.max_tokens:
+            data["max_tokens"] = self.max_tokens
+        
+        route, models = self.router.route(self.messages)
+        start = time.perf_counter()
+
+        def attempt(model: str, cascading: bool) -> tuple:
+            data["model"] = model
+            # 小模型的流式输出先缓冲，校验通过后再输出，无效内容不会展示给用户
+            return self._complete(data, None if cascading else on_delta,
+                                  validate_react_output if cascading else None)
+
+        (text, result, cut), model, escalation = cascade(
+            self.router, route, models, attempt, lambda reply: validate_react_output(reply[1]),
+            replay=(lambda reply: on_delta(reply[1])) if on_delta else None, cached=lambda: self.last_cached)
         
-        response = requests.post(API_URL, headers=headers, json=data, verify=False)
-        response.raise_for_status()
-        return response.json()["choices"][0]["message"]["content"]
+        self.turns.append({
+            "elapsed": time.perf_counter() - start,
+            "completion_tokens": self.last_usage.get("completion_tokens", estimate_tokens(text)),
+            "cut": cut,
+            "model": model,
+            "escalated": escalation is not None,
+        })
+        return result
+
+    def _complete(self, data: dict, on_delta=None, check=None) -> tuple:
+        """请求一次模型，返回 (原始内容, 截断后的内容, 是否截断)；check 校验截断后的内容，未通过的回复不写入缓存"""
+        self.last_usage = {}
+        self.last_cached = False
+        if not self.stream:
+            cut_off = cut_after_first_call if self.early_cutoff else str
+            validate = (lambda message: check(cut_off(message["content"] or ""))) if check else None
+            text = self._chat_cached(data, validate)["content"] or ""
+            result = cut_off(text)
+            return text, result, len(result) < len(text)
+        data["stream_options"] = {"include_usage": True}
+        text, cut = self._chat_stream(data, on_delta)
+        return text, text, cut
+
+    def _chat_stream(self, data: dict, on_delta=None) -> tuple:
+        """
+        流式接收回复，返回 (内容, 是否提前断开)
+
+        开启 early_cutoff 时匹配到第一个完整的 [Call: ...] 立即断开连接，不再等待模型生成后续内容
+        """
+        parts = []
+        chunks = self.client.chat_stream(data)
+        try:
+            for chunk in chunks:
+                if chunk.get("usage"):
+                    self.last_usage = chunk["usage"]
+                for choice in chunk.get("choices", []):
+                    delta = (choice.get("delta") or {}).get("content")
+                    if not delta:
+                        continue
+                    parts.append(delta)
+                    match = CALL_RE.search("".join(parts)) if self.early_cutoff and "]" in delta else None
+                    if match:
+                        # 同一数据块中 "]" 之后的内容不再输出
+                        overflow = sum(map(len, parts)) - match.end()
+                        if on_delta:
+                            on_delta(delta[:len(delta) - overflow])
+                        return "".join(parts)[:match.end()], True
+                    if on_delta:
+                        on_delta(delta)
+        finally:
+            chunks.close()
+        return "".join(parts), False
+
+    def _chat_cached(self, data: dict, check=None) -> dict:
+        """先查响应缓存，未命中再请求大模型（check(message) 返回错误信息时不写入缓存）"""
+        key = self.cache.make_key(data) if self.cache else None
+        message, response = chat_cached(self.cache, key, lambda: self.client.chat(data), check)
+        self.last_cached = response is None
+        if response is not None:
+            self.last_usage = response.get("usage") or {}
+        return message
 
 
 PROMPT = """
@@ -88,8 +257,9 @@ PROMPT = """
 3. 完成后输出 Thought + Answer
 
 ## 可用工具
-1. ask_menu_price: 查询单个菜品价格，如 [Call: ask_menu_price: 咖啡]
-2. calculate: 计算总价，如 [Call: calculate: 10*1 + 8*2]
+1. ask_menu_prices: 一次查询多个菜品的价格和合计（推荐），如 [Call: ask_menu_prices: 汉堡*2, 可乐*1]
+2. ask_menu_price: 查询单个菜品价格，如 [Call: ask_menu_price: 咖啡]
+3. calculate: 计算总价，如 [Call: calculate: 10*1 + 8*2]
 
 ## 输出格式
 Thought: 思考内容[Call: 工具名: 参数]
@@ -104,32 +274,53 @@ Observation: 咖啡的价格是15元
 
 Thought: 得到总价15元，输出答案
 Answer: 您的订单：咖啡x1=15元，总计15元
-"""
 
+用户: 我要2份汉堡和1杯可乐
 
-# ==================== 主查询函数 ====================
-# 从 Thought 中匹配工具调用意图 [Call: tool_name: params]
-CALL_RE = re.compile(r'\[Call: (\w+): ([^\]]+)\]', re.MULTILINE)
+Thought: 一次查询所有菜品[Call: ask_menu_prices: 汉堡*2, 可乐*1]
+Action: ask_menu_prices(汉堡*2, 可乐*1)
+Observation: 汉堡x2：单价25元，小计50元
+可乐x1：单价8元，小计8元
+合计：58元
 
-# 已注册的工具
-KNOWN_ACTIONS = {
-    "ask_menu_price": ask_menu_price,
-    "calculate": calculate
-}
+Thought: 得到合计58元，输出答案
+Answer: 您的订单：汉堡x2=50元，可乐x1=8元，总计58元
+"""
 
 
-def query(question: str, max_turns: int = 10) -> str:
+# ==================== 主查询函数 ====================
+def query(question: str, max_turns: int = 10, stream: bool = STREAM, fast_path: bool = True) -> str:
     """
     执行点餐查询
     
     Args:
         question: 用户的点餐需求
         max_turns: 最大循环次数
+        stream: 是否使用流式输出
+        fast_path: 简单订单是否走本地快速通道（不调用大模型）
     
     Returns:
         最终的订单信息
     """
-    agent = Agent(PROMPT)
+    if not fast_path:
+        return run_agent(question, max_turns, stream)
+    
+    start = time.perf_counter()
+    answer = try_fast_path(question)
+    if answer is not None:
+        fast_path_stats.record(True, time.perf_counter() - start)
+        print(f"\n⚡ 快速通道\n{answer}")
+        print(f"\n✅ 点餐完成!")
+        return answer
+    
+    result = run_agent(question, max_turns, stream)
+    fast_path_stats.record(False, time.perf_counter() - start)
+    return result
+
+
+def run_agent(question: str, max_turns: int = 10, stream: bool = STREAM, agent: Agent = None) -> str:
+    """通过 ReAct 循环（大模型 + 工具）处理订单（传入 agent 时使用它的流式和输出控制设置）"""
+    agent = agent or Agent(PROMPT, stream=stream)
     next_prompt = question
     
     for i in range(max_turns):
@@ -138,8 +329,16 @@ def query(question: str, max_turns: int = 10) -> str:
         print(f"{'='*50}")
         
         # Thought: 大模型思考并输出工具调用意图
-        result = agent.invoke(next_prompt)
-        print(f"\n{result}")
+        if agent.stream:
+            print()
+            result = agent.invoke(next_prompt, on_delta=lambda text: print(text, end="", flush=True))
+            print()
+        else:
+            result = agent.invoke(next_prompt)
+            print(f"\n{result}")
+        turn = agent.turns[-1]
+        print(f"⏱️ {turn['elapsed']*1000:.0f}ms  {turn['model']}  生成 {turn['completion_tokens']} tokens"
+              f"{'（已截断）' if turn['cut'] else ''}{'（小模型失败，已升级）' if turn['escalated'] else ''}")
         
         # 从 Thought 中匹配工具调用意图
         calls = CALL_RE.findall(result)
@@ -147,12 +346,12 @@ def query(question: str, max_turns: int = 10) -> str:
         if calls:
             tool_name, tool_input = calls[0]
             
-            if tool_name not in KNOWN_ACTIONS:
+            if tool_name not in registry:
                 raise Exception(f"未知工具: {tool_name}: {tool_input}")
             
             # Action: 程序执行工具调用
             print(f"Action: {tool_name}({tool_input})")
-            observation = KNOWN_ACTIONS[tool_name](tool_input)
+            observation = registry.dispatch_text(tool_name, tool_input)
             
             # Observation: 工具返回结果
             print(f"Observation: {observation}")
@@ -174,8 +373,9 @@ if __name__ == "__main__":
     print("🍔 欢迎使用智能点餐助手!")
     print("=" * 50)
     print("菜单:")
-    for item, price in MENU.items():
-        print(f"  {item}: {price}元")
+    catalog = get_menu_catalog()
+    for item in catalog.names(limit=MENU_LIST_LIMIT):
+        print(f"  {item}: {catalog.price(item)}元")
     print("=" * 50)
     
     # 示例点餐
@@ -183,4 +383,6 @@ if __name__ == "__main__":
     print(f"\n👤 用户: {order}")
     
     result = query(order)
+    if router_stats.routes:
+        print(f"\n{router_stats.report()}")
 
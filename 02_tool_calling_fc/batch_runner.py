@@ -0,0 +1,140 @@
+"""
+批量点餐处理 - 基于 order_agent_fc.query
+把大量订单（如 JSONL 文件的每一行）放进有界线程池并发执行，
+结果按完成顺序实时写入 JSONL，最后输出吞吐量和 p50/p95/p99 延迟。
+
+配合本地桩服务（设置 LLM_API_URL）即可作为压测工具使用。
+"""
+import json
+import math
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from order_agent_fc import query, fast_path_stats, router_stats
+
+
+def load_orders(path: str):
+    """
+    逐行读取订单
+
+    支持三种行格式：{"order": "...", "max_turns": 5}、"..."（JSON 字符串）、纯文本
+    """
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                item = json.loads(line)
+            except ValueError:
+                item = line
+            if isinstance(item, str):
+                item = {"order": item}
+            yield item
+
+
+def percentile(sorted_values: list, p: float) -> float:
+    """最近秩法计算百分位数"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def run_one(index: int, item: dict, max_turns: int) -> dict:
+    """执行单个订单，记录延迟和异常（格式不对的行同样记为失败，不中断整批）"""
+    start = time.perf_counter()
+    order = item.get("order") if isinstance(item, dict) else None
+    record = {"index": index, "order": order if isinstance(order, str) else item}
+    try:
+        if not isinstance(order, str):
+            raise ValueError('订单必须是字符串或 {"order": "..."} 形式的 JSON 对象')
+        record["result"] = query(order, max_turns=item.get("max_turns", max_turns), verbose=False)
+    except Exception as e:
+        record["error"] = f"{type(e).__name__}: {e}"
+    record["latency"] = time.perf_counter() - start
+    return record
+
+
+def run_batch(orders, output_path: str = None, workers: int = 8, max_turns: int = 10) -> dict:
+    """
+    批量执行订单
+
+    Args:
+        orders: 订单可迭代对象，元素为字符串或 {"order": ..., "max_turns": ...}
+        output_path: 结果 JSONL 路径，None 时不写文件
+        workers: 并发线程数
+        max_turns: 每个订单默认的最大循环次数
+
+    Returns:
+        统计信息：总数、失败数、耗时、吞吐量、延迟分位数
+    """
+    out = open(output_path, "w", encoding="utf-8") if output_path else None
+    latencies = []
+    errors = 0
+
+    def handle(record: dict):
+        nonlocal errors
+        latencies.append(record["latency"])
+        if "error" in record:
+            errors += 1
+        if out:
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+
+    start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            pending = set()
+            for index, item in enumerate(orders):
+                if isinstance(item, str):
+                    item = {"order": item}
+                # 有界提交：在途任务达到上限时先等待完成，避免一次性创建海量 Future
+                if len(pending) >= workers * 2:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        handle(future.result())
+                pending.add(executor.submit(run_one, index, item, max_turns))
+            for future in wait(pending).done:
+                handle(future.result())
+    finally:
+        if out:
+            out.close()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "total": len(latencies),
+        "errors": errors,
+        "elapsed": elapsed,
+        "throughput": len(latencies) / elapsed if elapsed else 0.0,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+    }
+
+
+# ==================== 主程序入口 ====================
+if __name__ == "__main__":
+    import urllib3
+    urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+    parser = argparse.ArgumentParser(description="批量点餐处理")
+    parser.add_argument("input", help="订单文件（每行一个订单，JSONL 或纯文本）")
+    parser.add_argument("-o", "--output", default="results.jsonl", help="结果 JSONL 文件")
+    parser.add_argument("-w", "--workers", type=int, default=8, help="并发线程数")
+    parser.add_argument("--max-turns", type=int, default=10, help="每个订单的最大循环次数")
+    args = parser.parse_args()
+
+    stats = run_batch(load_orders(args.input), args.output, args.workers, args.max_turns)
+
+    print("=" * 50)
+    print(f"订单数: {stats['total']}  失败: {stats['errors']}")
+    print(f"耗时: {stats['elapsed']:.2f}s  吞吐量: {stats['throughput']:.2f} 单/秒")
+    print(f"延迟 p50: {stats['p50']*1000:.1f}ms  p95: {stats['p95']*1000:.1f}ms  "
+          f"p99: {stats['p99']*1000:.1f}ms")
+    fast = fast_path_stats.summary()
+    print(f"快速通道命中率: {fast['hit_rate']:.1%}  估算节省: {fast['saved_seconds']:.2f}s")
+    if router_stats.routes:
+        print(router_stats.report())
@@ -0,0 +1,107 @@
+"""
+菜单目录基准 - DictMenuCatalog vs SQLiteMenuCatalog
+生成 10 / 1万 / 100万 条菜品（其中 10% 在 5 个门店有单独定价），
+统计构建耗时、内存占用和查价延迟（命中、门店价、未命中）。
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import tracemalloc
+
+# common 包在仓库根目录
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.menu import DictMenuCatalog, SQLiteMenuCatalog, build_menu_db
+
+FLAVORS = ["香辣", "蜜汁", "黑椒", "照烧", "藤椒", "芝士", "蒜香", "咖喱", "孜然", "糖醋"]
+MAINS = ["鸡腿堡", "牛肉饭", "鸡翅", "薯条", "奶茶", "咖啡", "披萨", "沙拉", "三明治", "拉面"]
+STORES = [f"store-{i}" for i in range(5)]
+
+
+def make_menu(size: int, seed: int = 0):
+    """生成 size 条菜品和门店价格"""
+    rng = random.Random(seed)
+    prices = {f"{rng.choice(FLAVORS)}{rng.choice(MAINS)}{i}": rng.randint(5, 99) for i in range(size)}
+    store_prices = {store: {} for store in STORES}
+    for name in rng.sample(list(prices), max(1, size // 10)):
+        store_prices[rng.choice(STORES)][name] = prices[name] + rng.randint(1, 5)
+    return prices, store_prices
+
+
+def percentile(sorted_values: list, p: float) -> float:
+    """最近秩法计算百分位数"""
+    rank = max(1, -(-len(sorted_values) * p // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def time_lookups(catalog, keys: list) -> dict:
+    """逐个查价，返回平均 / p50 / p99 延迟（微秒）"""
+    timings = []
+    for name, store in keys:
+        start = time.perf_counter_ns()
+        catalog.price(name, store)
+        timings.append(time.perf_counter_ns() - start)
+    timings.sort()
+    return {"mean": sum(timings) / len(timings) / 1000,
+            "p50": percentile(timings, 50) / 1000, "p99": percentile(timings, 99) / 1000}
+
+
+def bench(size: int, lookups: int, workdir: str):
+    prices, store_prices = make_menu(size)
+    rng = random.Random(1)
+    names = list(prices)
+    store_names = [(name, store) for store, items in store_prices.items() for name in items]
+    workloads = {
+        "命中": [(rng.choice(names), None) for _ in range(lookups)],
+        "门店价": [rng.choice(store_names) for _ in range(lookups)],
+        "未命中": [(f"不存在的菜{i}", None) for i in range(lookups)],
+    }
+
+    # 从 JSON 加载后构建，菜品名字符串也计入内存占用
+    source = json.dumps([prices, store_prices], ensure_ascii=False)
+    tracemalloc.start()
+    start = time.perf_counter()
+    loaded = json.loads(source)
+    catalog = DictMenuCatalog(*loaded, aliases={})
+    build = time.perf_counter() - start
+    del loaded
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    report(size, "dict", build, memory, None, {k: time_lookups(catalog, v) for k, v in workloads.items()})
+    del catalog
+
+    path = os.path.join(workdir, f"menu_{size}.db")
+    start = time.perf_counter()
+    build_menu_db(path, prices, store_prices)
+    build = time.perf_counter() - start
+    tracemalloc.start()
+    catalog = SQLiteMenuCatalog(path, reload_interval=3600)
+    time_lookups(catalog, workloads["命中"][:100])  # 预热连接
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    report(size, "sqlite", build, memory, os.path.getsize(path),
+           {k: time_lookups(catalog, v) for k, v in workloads.items()})
+
+
+def report(size: int, backend: str, build: float, memory: int, file_size, results: dict):
+    file_part = f"  文件 {file_size / 1024 / 1024:.1f}MB" if file_size is not None else ""
+    print(f"{size:>9} {backend:<7} 构建 {build:6.2f}s  Python 内存 {memory / 1024 / 1024:7.1f}MB{file_part}")
+    for name, r in results.items():
+        print(f"{'':>18}{name:<4} 平均 {r['mean']:6.2f}us  p50 {r['p50']:6.2f}us  p99 {r['p99']:6.2f}us")
+
+
+# ==================== 主程序入口 ====================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="菜单目录查价基准")
+    parser.add_argument("--sizes", default="10,10000,1000000", help="逗号分隔的菜品数")
+    parser.add_argument("--lookups", type=int, default=20000, help="每种查询的次数")
+    args = parser.parse_args()
+
+    print("SQLite 的页缓存和 mmap 不计入 Python 内存，内存占用以文件大小为上限")
+    with tempfile.TemporaryDirectory() as workdir:
+        for size in (int(s) for s in args.sizes.split(",")):
+            bench(size, args.lookups, workdir)
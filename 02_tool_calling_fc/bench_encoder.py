@@ -0,0 +1,83 @@
+"""
+请求体序列化微基准 - json.dumps 全量编码 vs RequestEncoder 增量编码
+模拟 Agent 循环：历史每轮追加一条消息后重新编码请求体，
+统计历史为 10 / 100 / 1000 条消息时每次请求的 CPU 时间和内存分配量。
+"""
+import json
+import time
+import argparse
+import tracemalloc
+
+from order_agent_fc import MODEL, tools
+from common.encoding import RequestEncoder, json_backend
+
+
+def make_message(i: int) -> dict:
+    """构造一条接近真实对话的消息（用户、助手工具调用、工具结果交替）"""
+    kind = i % 3
+    if kind == 0:
+        return {"role": "user", "content": f"我要{i % 5 + 1}份宫保鸡丁和一碗米饭，再来杯可乐（第 {i} 单）"}
+    if kind == 1:
+        return {"role": "assistant", "content": None, "tool_calls": [{
+            "id": f"call_{i}", "type": "function",
+            "function": {"name": "calculate", "arguments": json.dumps({"expression": f"38*{i % 5 + 1}+3+5"})},
+        }]}
+    return {"role": "tool", "tool_call_id": f"call_{i - 1}", "content": f"{38 * (i % 5 + 1) + 8}"}
+
+
+def make_request(messages: list) -> dict:
+    return {"model": MODEL, "messages": messages, "tools": tools,
+            "tool_choice": "auto", "temperature": 0, "stream": False}
+
+
+def full_encode(data: dict) -> bytes:
+    """原来的做法：每次请求都序列化整个请求体"""
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def measure(encode, size: int, rounds: int) -> tuple:
+    """先把历史增长到 size 条，再测量之后 rounds 次“追加一条 + 编码”的平均 CPU 时间和分配量"""
+    messages = [{"role": "system", "content": "你是一个智能点餐助手。"}]
+    for i in range(size - 1):
+        messages.append(make_message(i))
+        encode(make_request(messages))
+
+    cpu = 0.0
+    allocated = 0
+    for i in range(size - 1, size - 1 + rounds):
+        messages.append(make_message(i))
+        data = make_request(messages)
+        tracemalloc.start()
+        start = time.process_time()
+        encode(data)
+        cpu += time.process_time() - start
+        allocated += tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return cpu / rounds, allocated / rounds
+
+
+def run(sizes: list, rounds: int):
+    backend = json_backend()
+    print(f"增量编码后端: {backend}（tracemalloc 开启时计时偏高，只用于对比）")
+    print(f"{'消息数':>8} {'全量 CPU':>12} {'增量 CPU':>12} {'全量分配':>12} {'增量分配':>12}")
+    for size in sizes:
+        encoder = RequestEncoder()
+
+        def incremental(data):
+            body = encoder.encode(data)
+            encoder.release()
+            return body
+
+        full_cpu, full_alloc = measure(full_encode, size, rounds)
+        inc_cpu, inc_alloc = measure(incremental, size, rounds)
+        print(f"{size:>8} {full_cpu*1e6:>10.1f}us {inc_cpu*1e6:>10.1f}us "
+              f"{full_alloc/1024:>10.1f}KB {inc_alloc/1024:>10.1f}KB")
+
+
+# ==================== 主程序入口 ====================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="请求体序列化微基准")
+    parser.add_argument("--sizes", default="10,100,1000", help="逗号分隔的历史消息数")
+    parser.add_argument("--rounds", type=int, default=50, help="每种规模测量的请求次数")
+    args = parser.parse_args()
+    run([int(s) for s in args.sizes.split(",")], args.rounds)
@@ -0,0 +1,68 @@
+"""
+表达式计算微基准 - 原来的 eval vs 安全表达式计算（common.expression）
+用一批点餐总价表达式，分别统计每次计算的平均耗时：
+    eval：原来的 calculate，每次都重新编译
+    解析（未命中缓存）：每次清空 LRU，测 ast 解析 + Decimal 求值
+    缓存命中：同一批表达式重复计算，测 LRU 命中
+"""
+import os
+import sys
+import time
+import random
+import argparse
+
+# common 包在仓库根目录
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.expression import calculate, evaluate_expression
+
+
+def make_expressions(count: int, seed: int = 0) -> list:
+    """生成 count 条形如 “25*2 + 8*1 + 12.5*3” 的总价表达式"""
+    rng = random.Random(seed)
+    return [" + ".join(f"{rng.choice([8, 12, 15, 25, 28, 32, 12.5])}*{rng.randint(1, 5)}"
+                       for _ in range(rng.randint(1, 6)))
+            for _ in range(count)]
+
+
+def eval_calculate(expression: str) -> str:
+    """原来的做法"""
+    try:
+        result = eval(expression, {"__builtins__": {}}, {})
+        return f"{result}元"
+    except Exception as e:
+        return f"计算错误: {str(e)}"
+
+
+def uncached_calculate(expression: str) -> str:
+    evaluate_expression.cache_clear()
+    return calculate(expression)
+
+
+def measure(fn, expressions: list, rounds: int) -> float:
+    """返回每次调用的平均耗时（秒）"""
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for expression in expressions:
+            fn(expression)
+    return (time.perf_counter() - start) / (rounds * len(expressions))
+
+
+def run(count: int, rounds: int):
+    expressions = make_expressions(count)
+    calculate(expressions[0])  # 预热
+    variants = [("eval", eval_calculate), ("解析（未命中缓存）", uncached_calculate), ("缓存命中", calculate)]
+    print(f"{count} 条表达式 × {rounds} 轮")
+    for name, fn in variants:
+        evaluate_expression.cache_clear()
+        print(f"  {name:<12} {measure(fn, expressions, rounds) * 1e6:>8.2f}us/次")
+    print(f"  缓存: {evaluate_expression.cache_info()}")
+
+
+# ==================== 主程序入口 ====================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="表达式计算微基准")
+    parser.add_argument("--count", type=int, default=200, help="表达式条数（不超过 LRU 容量时第二轮起全部命中）")
+    parser.add_argument("--rounds", type=int, default=50, help="重复轮数")
+    args = parser.parse_args()
+    run(args.count, args.rounds)
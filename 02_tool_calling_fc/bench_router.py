@@ -0,0 +1,89 @@
+"""
+模型级联基准 - 只用大模型 vs 小模型优先、失败升级
+用脚本模型模拟两个模型：小模型更快但有一定比例输出无效的工具调用，
+同一批订单分别跑一遍，输出总耗时、各模型的延迟和各规则的升级率。
+
+    python3 bench_router.py --cheap-latency 0.2 --big-latency 1.0 --cheap-error-rate 0.1
+"""
+import io
+import time
+import random
+import argparse
+from contextlib import redirect_stdout
+
+from order_agent_fc import MODEL, PROMPT, ROUTE_RULES, Agent, ModelRouter, run_agent, scripted_reply
+from common.cache import LRUCompletionCache
+from common.offline import ScriptedLLMClient
+from common.router import RouterStats
+
+CHEAP_MODEL_NAME = "cheap-model"
+
+ORDERS = [
+    "我要2份汉堡和1杯可乐",
+    "来一杯咖啡，再来两个三明治",
+    "一份披萨、一份沙拉和两杯奶茶，帮我算一下总价",
+    "两个鸡翅，一份薯条",
+]
+
+
+class ByModelClient:
+    """按请求中的 model 分发到不同的脚本模型；小模型按 error_rate 输出无效的工具调用"""
+
+    def __init__(self, clients: dict, cheap_model: str, error_rate: float, seed: int = 0):
+        self.clients = clients
+        self.cheap_model = cheap_model
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+
+    def chat(self, data: dict, body: bytes = None) -> dict:
+        response = self.clients[data["model"]].chat(data, body)
+        if data["model"] == self.cheap_model and self.rng.random() < self.error_rate:
+            message = dict(response["choices"][0]["message"])
+            if message.get("tool_calls"):
+                message["tool_calls"] = [{**message["tool_calls"][0], "function": {
+                    "name": message["tool_calls"][0]["function"]["name"], "arguments": "{\"items\": ["}}]
+            else:
+                message["content"] = ""
+            response = {**response, "choices": [{"index": 0, "message": message}]}
+        return response
+
+    def chat_stream(self, data: dict, body: bytes = None):
+        # 复用 ScriptedLLMClient 的分块逻辑
+        message = self.chat(data, body)["choices"][0]["message"]
+        yield from ScriptedLLMClient(lambda messages: message).chat_stream(data, body)
+
+    def close(self):
+        pass
+
+
+def run_variant(orders: list, client: ByModelClient, cheap_model: str, stream: bool) -> tuple:
+    """逐个订单运行 Agent 循环，返回 (总耗时, 路由统计)"""
+    stats = RouterStats()
+    router = ModelRouter(ROUTE_RULES, cheap_model=cheap_model, model=MODEL, stats=stats)
+    start = time.perf_counter()
+    for order in orders:
+        # 每个订单使用独立的空缓存，耗时反映真实的模型调用
+        agent = Agent(PROMPT, client=client, stream=stream, cache=LRUCompletionCache(), router=router)
+        with redirect_stdout(io.StringIO()):
+            run_agent(order, agent=agent)
+    return time.perf_counter() - start, stats
+
+
+# ==================== 主程序入口 ====================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="模型级联开启前后对比")
+    parser.add_argument("--cheap-latency", type=float, default=0.2, help="小模型每次请求的耗时（秒）")
+    parser.add_argument("--big-latency", type=float, default=1.0, help="大模型每次请求的耗时（秒）")
+    parser.add_argument("--cheap-error-rate", type=float, default=0.1, help="小模型输出无效回复的比例")
+    parser.add_argument("--repeat", type=int, default=5, help="内置订单重复次数")
+    parser.add_argument("--stream", action="store_true", help="使用流式输出")
+    args = parser.parse_args()
+
+    orders = ORDERS * args.repeat
+    clients = {MODEL: ScriptedLLMClient(scripted_reply, latency=args.big_latency),
+               CHEAP_MODEL_NAME: ScriptedLLMClient(scripted_reply, latency=args.cheap_latency)}
+    for name, cheap_model in (("只用大模型", ""), ("级联", CHEAP_MODEL_NAME)):
+        client = ByModelClient(clients, CHEAP_MODEL_NAME, args.cheap_error_rate)
+        elapsed, stats = run_variant(orders, client, cheap_model, args.stream)
+        print(f"\n[{name}] {len(orders)} 单  总耗时 {elapsed:.2f}s（平均每单 {elapsed / len(orders):.2f}s）")
+        print(stats.report())
@@ -0,0 +1,110 @@
+"""
+查不到菜品时的建议检索基准 - SuggestionIndex
+生成 10 / 1万 / 100万 条菜品，统计索引构建耗时和内存、未命中查询（错别字、多字、少字）的延迟、
+原菜品出现在建议中的比例，以及写进对话历史的回复字节数：列出整个菜单、列出前 MENU_LIST_LIMIT 个、只给 top-k 建议。
+
+菜品名由口味 + 主菜 + 若干修饰字组成；bench_catalog 那种“名称 + 数字编号”的菜单在百万条时
+每个二元组都对应几万条目，召回会退化，这类目录应先把编号从名称中拆出去。
+"""
+import time
+import random
+import argparse
+import tracemalloc
+
+from order_agent_fc import MENU_LIST_LIMIT
+from common.menu import MENU_SUGGEST_K, DictMenuCatalog, SuggestionIndex, to_pinyin
+from bench_catalog import FLAVORS, MAINS, percentile
+
+NOISE = "的大小份超级特"
+TAGS = "".join(dict.fromkeys("鲜嫩脆酥爽滑软糯甜酸麻咸浓淡清炖烤煎煮蒸焖卤拌炒烧熏腌泡凉热冰冻暖金银玉翠红白黑青紫"
+                             "黄绿橙粉蓝彩双全单老新秘家乡村山海田园湖江岛城都港湾北南东西风味招牌特制经典精选"))
+
+
+def make_menu(size: int, seed: int = 0) -> dict:
+    """生成 size 条不重复的菜品：口味 + 主菜 + 随机修饰字（组合数远大于 size）"""
+    rng = random.Random(seed)
+    width = 1
+    while len(TAGS) ** width < size * 10:
+        width += 1
+    prices = {}
+    while len(prices) < size:
+        tag = "".join(rng.choices(TAGS, k=width))
+        prices[f"{rng.choice(FLAVORS)}{rng.choice(MAINS)}{tag}"] = rng.randint(5, 99)
+    return prices
+
+
+def make_misses(names: list, count: int, seed: int = 2) -> list:
+    """对随机菜品名做一次替换 / 插入 / 删除，得到 [(查不到的名称, 原菜品名)]"""
+    rng = random.Random(seed)
+    known = set(names)
+    misses = []
+    while len(misses) < count:
+        name = rng.choice(names)
+        i = rng.randrange(len(name))
+        op = rng.randrange(3)
+        if op == 0:
+            miss = name[:i] + rng.choice(NOISE) + name[i + 1:]
+        elif op == 1:
+            miss = name[:i] + rng.choice(NOISE) + name[i:]
+        else:
+            miss = name[:i] + name[i + 1:]
+        if miss and miss not in known:
+            misses.append((miss, name))
+    return misses
+
+
+def reply_bytes(text: str) -> int:
+    return len(text.encode("utf-8"))
+
+
+def bench(size: int, queries: int):
+    prices = make_menu(size)
+    catalog = DictMenuCatalog(prices, aliases={})
+    names = list(prices)
+    misses = make_misses(names, queries)
+
+    start = time.perf_counter()
+    SuggestionIndex(catalog._suggestion_entries(), catalog.version)
+    build = time.perf_counter() - start
+    # tracemalloc 会拖慢构建，内存单独再构建一次测量
+    tracemalloc.start()
+    index = SuggestionIndex(catalog._suggestion_entries(), catalog.version)
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    catalog._index = index
+
+    timings = []
+    hits = 0
+    recalled = 0
+    suggested = 0
+    for miss, source in misses:
+        start = time.perf_counter_ns()
+        suggestions = catalog.suggest(miss)
+        timings.append(time.perf_counter_ns() - start)
+        hits += bool(suggestions)
+        recalled += any(name == source for name, _ in suggestions)
+        suggested += reply_bytes("抱歉，菜单中没有{}。相近的菜品有：{}".format(
+            miss, "、".join(f"{name}（{prices[name]}元）" for name, _ in suggestions)))
+    timings.sort()
+
+    miss = misses[0][0]
+    full = reply_bytes(f"抱歉，菜单中没有{miss}。可选菜品有：{'、'.join(names)}")
+    limited = reply_bytes(f"抱歉，菜单中没有{miss}。可选菜品有：{'、'.join(names[:MENU_LIST_LIMIT])}")
+    print(f"{size:>9} 构建 {build:6.2f}s  索引内存 {memory / 1024 / 1024:7.1f}MB  "
+          f"有建议 {hits / len(misses):.0%}  原菜品在建议中 {recalled / len(misses):.0%}")
+    print(f"{'':>10}未命中 平均 {sum(timings) / len(timings) / 1000:7.1f}us  "
+          f"p50 {percentile(timings, 50) / 1000:7.1f}us  p99 {percentile(timings, 99) / 1000:7.1f}us")
+    print(f"{'':>10}回复字节 整个菜单 {full:>10}  前{MENU_LIST_LIMIT}个 {limited:>6}  "
+          f"top-{MENU_SUGGEST_K} 平均 {suggested / len(misses):6.0f}")
+
+
+# ==================== 主程序入口 ====================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="菜品建议检索基准")
+    parser.add_argument("--sizes", default="10,10000,1000000", help="逗号分隔的菜品数")
+    parser.add_argument("--queries", type=int, default=2000, help="未命中查询次数")
+    args = parser.parse_args()
+
+    print(f"拼音检索: {'开启' if to_pinyin('菜') is not None else '未安装 pypinyin，只按汉字检索'}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        bench(size, args.queries)
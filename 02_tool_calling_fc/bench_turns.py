@@ -0,0 +1,124 @@
+"""
+批量查价基准 - 逐个查价 vs 同轮并行查价 vs ask_menu_prices 批量查价
+用脚本模型模拟三种调用习惯，同一批固定订单分别跑一遍完整的 Function Calling 循环，
+输出每单的轮次、工具调用次数、prompt tokens 和总耗时（每次模型请求固定耗时 --latency 秒）。
+逐个查价对应只有 ask_menu_price 的旧工具集：N 个菜品需要 N+2 轮。
+
+    python3 bench_turns.py --latency 0.5
+"""
+import io
+import re
+import json
+import time
+import argparse
+from contextlib import redirect_stdout
+
+from order_agent_fc import PROMPT, Agent, run_agent, scripted_reply
+from common.cache import LRUCompletionCache
+from common.fast_path import extract_order_items
+from common.offline import ScriptedLLMClient
+
+ORDERS = [
+    "来一杯咖啡",
+    "我要2份汉堡和1杯可乐",
+    "两个鸡翅，一份薯条",
+    "来一杯咖啡，再来两个三明治",
+    "一份披萨、一份沙拉和两杯奶茶，帮我算一下总价",
+    "汉堡包一个，薯条两份，可乐三杯，冰淇淋一个",
+    "3个汉堡、2份薯条、2杯可乐、1份沙拉、1杯咖啡",
+]
+
+PRICE_RE = re.compile(r"的价格是(\d+(?:\.\d+)?)元")
+
+
+def _tool_call(messages: list, calls: list) -> dict:
+    """生成带 tool_calls 的 assistant 消息，calls 为 [(工具名, 参数字典)]"""
+    return {
+        "role": "assistant",
+        "content": "",
+        "tool_calls": [{
+            "id": f"call_{len(messages)}_{i}",
+            "type": "function",
+            "function": {"name": name, "arguments": json.dumps(args, ensure_ascii=False)}
+        } for i, (name, args) in enumerate(calls)]
+    }
+
+
+def single_item_reply(messages: list, parallel: bool = False) -> dict:
+    """
+    旧工具集的脚本规则：每个菜品调用一次 ask_menu_price，再用 calculate 求合计，最后回答
+
+    parallel=False 时每轮只查一个菜品（N+2 轮），True 时同一轮并行查完所有菜品（3 轮）
+    """
+    question = next(m["content"] for m in messages if m["role"] == "user")
+    items = extract_order_items(question)
+    if not items:
+        return {"role": "assistant", "content": "Answer: 抱歉，没有识别到菜品"}
+    names = [tc["function"]["name"] for m in messages if m["role"] == "assistant" for tc in m.get("tool_calls") or ()]
+    results = [m["content"] for m in messages if m["role"] == "tool"]
+    asked = names.count("ask_menu_price")
+    if asked < len(items):
+        pending = items[asked:] if parallel else items[asked:asked + 1]
+        return _tool_call(messages, [("ask_menu_price", {"item_name": name}) for name, _ in pending])
+    if "calculate" not in names:
+        # 查不到价格的菜品不计入合计
+        terms = [f"{match.group(1)}*{quantity}" for (_, quantity), result in zip(items, results)
+                 if (match := PRICE_RE.search(result))]
+        return _tool_call(messages, [("calculate", {"expression": " + ".join(terms) or "0"})])
+    return {"role": "assistant", "content": f"Answer: 您的订单总计{results[-1]}"}
+
+
+class CountingClient(ScriptedLLMClient):
+    """脚本模型，同时统计请求次数、工具调用次数和 prompt tokens"""
+
+    def __init__(self, script, latency: float = 0.0):
+        super().__init__(script, latency)
+        self.requests = 0
+        self.tool_calls = 0
+        self.prompt_tokens = 0
+
+    def _reply(self, data: dict) -> dict:
+        response = super()._reply(data)
+        self.requests += 1
+        self.tool_calls += len(response["choices"][0]["message"].get("tool_calls") or ())
+        self.prompt_tokens += response["usage"]["prompt_tokens"]
+        return response
+
+
+VARIANTS = {
+    "逐个查价": lambda messages: single_item_reply(messages),
+    "同轮并行查价": lambda messages: single_item_reply(messages, parallel=True),
+    "批量查价": scripted_reply,
+}
+
+
+def run_variant(orders: list, script, latency: float) -> tuple:
+    """逐个订单运行 Agent 循环，返回 (每单的 (订单, 轮次, 回答), 客户端统计, 总耗时)"""
+    client = CountingClient(script, latency)
+    results = []
+    start = time.perf_counter()
+    for order in orders:
+        requests = client.requests
+        # 每个订单使用独立的空缓存，每一轮都真实请求模型
+        agent = Agent(PROMPT, client=client, cache=LRUCompletionCache())
+        with redirect_stdout(io.StringIO()):
+            answer = run_agent(order, agent=agent)
+        results.append((order, client.requests - requests, answer))
+    return results, client, time.perf_counter() - start
+
+
+# ==================== 主程序入口 ====================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="逐个查价与批量查价的轮次对比")
+    parser.add_argument("--latency", type=float, default=0.0, help="脚本模型每次请求的耗时（秒）")
+    parser.add_argument("--verbose", action="store_true", help="输出每单的轮次和回答")
+    args = parser.parse_args()
+
+    print(f"{'方式':<12} {'订单':>4} {'总轮次':>6} {'平均轮次':>8} {'工具调用':>8} {'prompt tokens':>14} {'总耗时':>10}")
+    for name, script in VARIANTS.items():
+        results, client, elapsed = run_variant(ORDERS, script, args.latency)
+        print(f"{name:<12} {len(results):>4} {client.requests:>6} {client.requests / len(results):>8.2f} "
+              f"{client.tool_calls:>8} {client.prompt_tokens:>14} {elapsed:>9.2f}s")
+        if args.verbose:
+            for order, turns, answer in results:
+                print(f"    {turns} 轮  {order}  →  {answer}")
@@ -3,121 +3,205 @@
 对接大模型：deepseek-v3 (腾讯云API)
 """
 import os
+import re
+import sys
 import json
-import requests
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout
+
+# LLM 客户端、缓存、菜单、工具注册表等各章共用的部分在仓库根目录的 common 包中
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common import offline
+from common.llm import MODEL, LLMClient, StreamAssembler
+from common.offline import LLM_MODE
+from common.encoding import RequestEncoder
+from common.cache import CompletionCache, get_completion_cache
+from common.router import ModelRouter, router_stats, cascade, chat_cached, replay_message
+from common.tools import ToolRegistry, parse_arguments
+from common.menu import MENU_LIST_LIMIT, get_menu_catalog, ask_menu_price, price_items
+from common.expression import calculate
+from common.fast_path import try_fast_path, fast_path_stats, extract_order_items
 
 # ==================== 配置 ====================
-API_URL = "https://api.lkeap.cloud.tencent.com/v1/chat/completions"
-API_KEY = os.environ.get("TENCENT_API_KEY", "")
-MODEL = "deepseek-v3"
-
-# ==================== 菜单数据 ====================
-MENU = {
-    "汉堡": 25,
-    "薯条": 12,
-    "可乐": 8,
-    "鸡翅": 18,
-    "冰淇淋": 6,
-    "咖啡": 15,
-    "沙拉": 20,
-    "披萨": 45,
-    "三明治": 22,
-    "奶茶": 10,
-}
-
-# ==================== 工具定义（JSON Schema）====================
-tools = [
-    {
-        "type": "function",
-        "function": {
-            "name": "ask_menu_price",
-            "description": "查询菜品价格",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "item_name": {
-                        "type": "string",
-                        "description": "菜品名称，如：汉堡、可乐、薯条"
-                    }
-                },
-                "required": ["item_name"]
-            }
-        }
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "calculate",
-            "description": "计算数学表达式",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "expression": {
-                        "type": "string",
-                        "description": "数学表达式，如：25*2 + 8*1"
-                    }
-                },
-                "required": ["expression"]
-            }
-        }
-    }
+# 流式输出（SSE）：边生成边显示
+STREAM = False
+
+# 工具调度配置
+TOOL_CONCURRENCY = 4  # 同一轮工具调用的最大并发数
+TOOL_TIMEOUT = 10  # 单个工具的超时时间（秒）
+
+# 模型级联：命中路由规则的轮次先用小模型（CHEAP_MODEL），输出校验失败（或请求失败）再升级到 MODEL
+ROUTE_RULES = [
+    # max_messages: 历史消息数上限（历史越长，小模型越容易出错）
+    {"name": "observation", "turn": "tool", "max_pending_tools": 2, "max_messages": 12},
+    {"name": "first_turn", "turn": "user", "max_messages": 2},
 ]
 
+# ==================== 工具注册 ====================
+# 用 @registry.tool 注册工具：导入时从函数签名生成 JSON Schema 和参数校验器，
+# 调用时按名字查表后直接 fn(**args)，新增工具只需写一个函数
+registry = ToolRegistry()
+registry.tool(params={"item_name": "菜品名称，如：汉堡、可乐、薯条"})(ask_menu_price)
+registry.tool(params={"expression": "数学表达式，如：25*2 + 8*1"})(calculate)
+
+
+@registry.tool(
+    description="批量查询多个菜品的价格，返回每项单价、小计和合计（一次调用完成所有菜品）",
+    params={"items": {
+        "type": "array",
+        "description": "菜品列表",
+        "items": {
+            "type": "object",
+            "properties": {
+                "name": {"type": "string", "description": "菜品名称，如：汉堡"},
+                "quantity": {"type": "integer", "minimum": 1, "description": "数量，默认 1"}
+            },
+            "required": ["name"]
+        }
+    }},
+    display=lambda args: ", ".join(f"{item['name']}*{item.get('quantity', 1)}" for item in args["items"]))
+def ask_menu_prices(items: list) -> str:
+    """批量查询菜品价格"""
+    return price_items([(item["name"], int(item.get("quantity", 1))) for item in items])
+
+
+# ==================== LLM 客户端 ====================
+_llm_client = None
+_llm_client_lock = threading.Lock()
+
 
-# ==================== 工具实现 ====================
-def ask_menu_price(item_name: str) -> str:
-    """查询菜品价格"""
-    item_name = item_name.strip()
-    if item_name in MENU:
-        return f"{item_name}的价格是{MENU[item_name]}元"
-    else:
-        available = "、".join(MENU.keys())
-        return f"抱歉，菜单中没有{item_name}。可选菜品有：{available}"
+def get_llm_client() -> LLMClient:
+    """获取进程内共享的 LLMClient（所有 Agent 复用同一个连接池）"""
+    global _llm_client
+    if _llm_client is None:
+        with _llm_client_lock:
+            if _llm_client is None:
+                _llm_client = create_llm_client()
+    return _llm_client
 
 
-def calculate(expression: str) -> str:
-    """计算数学表达式"""
-    try:
-        result = eval(expression, {"__builtins__": {}}, {})
-        return f"{result}元"
-    except Exception as e:
-        return f"计算错误: {str(e)}"
+def create_llm_client(mode: str = LLM_MODE):
+    """按 LLM_MODE 创建大模型客户端（live / record / replay / scripted）"""
+    return offline.create_llm_client(scripted_reply, mode)
+
+
+# ==================== 脚本模型规则（LLM_MODE=scripted）====================
+def scripted_reply(messages: list) -> dict:
+    """脚本规则：顾客点单 → 调用 ask_menu_prices；收到工具结果 → 按合计回答"""
+    last = messages[-1]
+    if last["role"] == "tool":
+        total = re.search(r"合计：(\d+)元", last["content"])
+        answer = f"您的订单总计{total.group(1)}元" if total else last["content"]
+        return {"role": "assistant", "content": f"Answer: {answer}"}
+    items = extract_order_items(last["content"])
+    if not items:
+        return {"role": "assistant", "content": "Answer: 抱歉，没有识别到菜品"}
+    arguments = json.dumps({"items": [{"name": name, "quantity": quantity} for name, quantity in items]},
+                           ensure_ascii=False)
+    return {
+        "role": "assistant",
+        "content": "",
+        "tool_calls": [{
+            "id": f"call_{len(messages)}",
+            "type": "function",
+            "function": {"name": "ask_menu_prices", "arguments": arguments}
+        }]
+    }
+
+
+# ==================== 模型路由（级联）====================
+def validate_fc_message(message: dict) -> str:
+    """检查 Function Calling 回复：tool_calls 完整（有 id、工具存在、参数合法）或有文本回答，返回失败原因（通过时为 None）"""
+    tool_calls = message.get("tool_calls")
+    if not tool_calls:
+        return None if (message.get("content") or "").strip() else "空回复"
+    for tool_call in tool_calls:
+        function = tool_call.get("function") or {}
+        if not tool_call.get("id") or not function.get("name"):
+            return "调用格式错误"
+        try:
+            args = json.loads(function.get("arguments") or "{}")
+        except ValueError:
+            return "参数不是合法 JSON"
+        error = registry.validate(function["name"], args)
+        if error:
+            return error.split(":")[0]
+    return None
 
 
 # ==================== Agent 核心类 ====================
 class Agent:
-    def __init__(self, system=""):
+    def __init__(self, system="", client: LLMClient = None, stream: bool = False,
+                 cache: CompletionCache = None, router: ModelRouter = None):
         self.system = system
         self.messages = []
+        self.client = client or get_llm_client()
+        self.stream = stream
+        self.cache = cache if cache is not None else get_completion_cache()
+        self.encoder = RequestEncoder()
+        self.router = router or ModelRouter(ROUTE_RULES)
+        self.last_cached = False  # 最近一次请求是否命中响应缓存
+        self.last_model = None  # 最近一轮最终使用的模型
+        self.last_escalation = None  # 最近一轮小模型的失败原因（没有升级时为 None）
         if self.system:
             self.messages.append({"role": "system", "content": system})
 
-    def invoke(self, message: str = "") -> dict:
-        """发送消息并获取回复"""
+    def invoke(self, message: str = "", on_delta=None, on_tool_call=None) -> dict:
+        """发送消息并获取回复（流式模式下通过回调增量输出内容和工具调用）"""
         if message:  # FC 版本：空消息不添加（工具结果已通过 add_tool_result 添加）
             self.messages.append({"role": "user", "content": message})
-        result = self.execute()
+        result = self.execute(on_delta, on_tool_call)
         self.messages.append(result)
         return result
 
-    def execute(self) -> dict:
-        """调用大模型 API（使用 Function Calling）"""
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {API_KEY}"
-        }
+    def execute(self, on_delta=None, on_tool_call=None) -> dict:
+        """调用大模型 API（使用 Function Calling；按路由规则先用小模型，校验失败再升级到大模型）"""
         data = {
             "model": MODEL,
             "messages": self.messages,
             "tools": tools,
             "tool_choice": "auto",
             "temperature": 0,
-            "stream": False
+            "stream": self.stream
         }
         
-        response = requests.post(API_URL, headers=headers, json=data, verify=False)
-        response.raise_for_status()
-        return response.json()["choices"][0]["message"]
+        route, models = self.router.route(self.messages)
+
+        def attempt(model: str, cascading: bool) -> dict:
+            data["model"] = model
+            # 小模型的流式输出先缓冲（不回调），校验通过后再回放，无效的工具调用不会被提前执行
+            if cascading:
+                return self._complete(data, check=validate_fc_message)
+            return self._complete(data, on_delta, on_tool_call)
+
+        replay = (lambda message: replay_message(message, on_delta, on_tool_call)) if self.stream else None
+        message, self.last_model, self.last_escalation = cascade(
+            self.router, route, models, attempt, validate_fc_message, replay, lambda: self.last_cached)
+        return message
+
+    def _complete(self, data: dict, on_delta=None, on_tool_call=None, check=None) -> dict:
+        """请求一次模型（流式时组装成完整的 assistant 消息；check 未通过的回复不写入缓存）"""
+        self.last_cached = False
+        if not self.stream:
+            return self._chat_cached(data, check)
+        
+        assembler = StreamAssembler(on_delta, on_tool_call)
+        body = self.encoder.encode(data)
+        self.encoder.release()
+        for chunk in self.client.chat_stream(data, body):
+            assembler.feed(chunk)
+        return assembler.finish()
+
+    def _chat_cached(self, data: dict, check=None) -> dict:
+        """先查响应缓存，未命中再请求大模型（check(message) 返回错误信息时不写入缓存）"""
+        key = self.cache.make_key(data, self.encoder) if self.cache else None
+        message, response = chat_cached(self.cache, key, lambda: self.client.chat(data, self.encoder.encode(data)),
+                                        check)
+        self.encoder.release()
+        self.last_cached = response is None
+        return message
 
     def add_tool_result(self, tool_call_id: str, result: str):
         """添加工具执行结果到消息历史"""
@@ -132,8 +216,9 @@ PROMPT = """
 你是一个智能点餐助手，负责帮助顾客完成点餐并计算总价。
 
 ## 重要规则
-1. 计算总价必须使用 calculate 工具
-2. **calculate 返回结果后，不要再调用任何工具**，直接输出 Answer 结束对话
+1. 查询价格时优先使用 ask_menu_prices，一次查询订单中的所有菜品
+2. ask_menu_prices 已返回合计时直接使用该合计；否则计算总价必须使用 calculate 工具
+3. **得到总价后，不要再调用任何工具**，直接输出 Answer 结束对话
 
 ## 输出示例
 Answer: 您的订单：咖啡x1=15元，总计15元
@@ -141,72 +226,135 @@ Answer: 您的订单：咖啡x1=15元，总计15元
 """
 
 
+# 工具定义（JSON Schema），由注册表从函数签名生成
+tools = registry.schemas()
+
 
-# 已注册的工具
-KNOWN_ACTIONS = {
-    "ask_menu_price": ask_menu_price,
-    "calculate": calculate,
-}
+# ==================== 工具调度 ====================
+_tool_executor = ThreadPoolExecutor(max_workers=TOOL_CONCURRENCY, thread_name_prefix="tool")
+
+
+def dispatch_tool_calls(calls: list, timeout: float = TOOL_TIMEOUT) -> list:
+    """
+    并发执行同一条 assistant 消息中的多个工具调用
+    
+    Args:
+        calls: [(工具名, 参数字典), ...]，顺序与 tool_calls 一致
+        timeout: 单个工具的超时时间（秒）
+    
+    Returns:
+        与 calls 顺序一致的结果列表
+    """
+    # 单个调用也提交到线程池：同样受超时保护，工具抛出的异常转成错误信息返回给模型
+    futures = [_tool_executor.submit(registry.dispatch, name, args) for name, args in calls]
+    return collect_tool_results([name for name, _ in calls], futures, timeout)
+
+
+def collect_tool_results(names: list, futures: list, timeout: float = TOOL_TIMEOUT) -> list:
+    """按原顺序收集已提交工具的执行结果"""
+    results = []
+    for name, future in zip(names, futures):
+        try:
+            results.append(future.result(timeout=timeout))
+        except FuturesTimeout:
+            future.cancel()
+            results.append(f"工具执行超时: {name}")
+        except Exception as e:
+            results.append(f"工具执行错误: {name}: {str(e)}")
+    return results
 
 
 # ==================== 主查询函数 ====================
-def query(question: str, max_turns: int = 10) -> str:
+def query(question: str, max_turns: int = 10, stream: bool = STREAM, verbose: bool = True,
+          fast_path: bool = True) -> str:
     """
     执行点餐查询
     
     Args:
         question: 用户的点餐需求
         max_turns: 最大循环次数
+        stream: 是否使用流式输出（工具参数一完整就立即执行）
+        verbose: 是否打印每轮对话过程（批量运行时关闭）
+        fast_path: 简单订单是否走本地快速通道（不调用大模型）
     
     Returns:
         最终的订单信息
     """
-    agent = Agent(PROMPT)
+    if not fast_path:
+        return run_agent(question, max_turns, stream, verbose)
+    
+    start = time.perf_counter()
+    answer = try_fast_path(question)
+    if answer is not None:
+        fast_path_stats.record(True, time.perf_counter() - start)
+        if verbose:
+            print(f"\n⚡ 快速通道\n{answer}")
+            print(f"\n✅ 点餐完成!")
+        return answer
+    
+    result = run_agent(question, max_turns, stream, verbose)
+    fast_path_stats.record(False, time.perf_counter() - start)
+    return result
+
+
+def run_agent(question: str, max_turns: int = 10, stream: bool = STREAM, verbose: bool = True,
+              agent: Agent = None) -> str:
+    """通过 Agent 循环（大模型 + 工具）处理订单（传入 agent 时使用它的客户端、流式和路由设置）"""
+    log = print if verbose else (lambda *args, **kwargs: None)
+    agent = agent or Agent(PROMPT, stream=stream)
     next_prompt = question
     
     for i in range(max_turns):
-        print(f"\n{'='*50}")
-        print(f"第 {i+1} 轮对话")
-        print(f"{'='*50}")
+        log(f"\n{'='*50}")
+        log(f"第 {i+1} 轮对话")
+        log(f"{'='*50}")
         
         # Thought: 大模型思考（使用 Function Calling）
-        msg = agent.invoke(next_prompt)
-        content = msg.get("content", "").strip()
+        if agent.stream:
+            # 流式模式：边生成边显示，工具调用参数完整后立即提交执行
+            submitted = {}
+            
+            def on_tool_call(tool_call: dict, func_args: dict):
+                func_name = tool_call["function"]["name"]
+                log(f"\nAction: {func_name}({registry.format_args(func_name, func_args)})")
+                submitted[tool_call["id"]] = _tool_executor.submit(registry.dispatch, func_name, func_args)
+            
+            log()
+            msg = agent.invoke(next_prompt,
+                               on_delta=lambda text: log(text, end="", flush=True),
+                               on_tool_call=on_tool_call)
+            log()
+        else:
+            msg = agent.invoke(next_prompt)
+        content = (msg.get("content") or "").strip()
+        if agent.last_escalation:
+            log(f"\n⤴️ 小模型失败（{agent.last_escalation}），已升级到 {agent.last_model}")
         
         # 检查是否有工具调用
         if "tool_calls" in msg and msg["tool_calls"]:
-            # 打印模型的思考过程（如果有）
-            if content:
-                print(f"\n{content}")
-            
-            for tool_call in msg["tool_calls"]:
-                func_name = tool_call["function"]["name"]
-                func_args = json.loads(tool_call["function"]["arguments"])
-                
-                # 格式化参数显示
-                if func_name == "ask_menu_price":
-                    args_display = func_args["item_name"]
-                elif func_name == "calculate":
-                    args_display = func_args["expression"]
-                else:
-                    args_display = json.dumps(func_args, ensure_ascii=False)
+            tool_calls = msg["tool_calls"]
+            if agent.stream:
+                for tc in tool_calls:
+                    if tc["id"] not in submitted:  # 参数不是合法 JSON 对象时兜底执行，由校验返回错误信息
+                        func_args = parse_arguments(tc["function"]["arguments"])
+                        submitted[tc["id"]] = _tool_executor.submit(registry.dispatch, tc["function"]["name"], func_args)
+                results = collect_tool_results([tc["function"]["name"] for tc in tool_calls],
+                                               [submitted[tc["id"]] for tc in tool_calls])
+            else:
+                # 打印模型的思考过程（如果有）
+                if content:
+                    log(f"\n{content}")
                 
-                # Action: 程序执行工具调用
-                print(f"Action: {func_name}({args_display})")
-                
-                # 执行工具
-                if func_name in KNOWN_ACTIONS:
-                    if func_name == "ask_menu_price":
-                        result = KNOWN_ACTIONS[func_name](func_args["item_name"])
-                    elif func_name == "calculate":
-                        result = KNOWN_ACTIONS[func_name](func_args["expression"])
-                    else:
-                        result = "未知工具"
-                else:
-                    result = f"未知工具: {func_name}"
+                # Action: 同一轮的多个工具调用并发执行，结果按原顺序返回
+                calls = [(tc["function"]["name"], parse_arguments(tc["function"]["arguments"])) for tc in tool_calls]
+                for func_name, func_args in calls:
+                    log(f"Action: {func_name}({registry.format_args(func_name, func_args)})")
                 
+                results = dispatch_tool_calls(calls)
+            
+            for tool_call, result in zip(tool_calls, results):
                 # Observation: 工具返回结果
-                print(f"Observation: {result}")
+                log(f"Observation: {result}")
                 
                 # 将工具结果加入历史
                 agent.add_tool_result(tool_call["id"], result)
@@ -214,10 +362,10 @@ def query(question: str, max_turns: int = 10) -> str:
             next_prompt = ""  # FC 版本不需要手动传递 Observation
         else:
             # 没有工具调用，输出最终回答
-            import re
             content = re.sub(r'(Thought:.*?)\n\n+(Answer:)', r'\1\n\2', content, flags=re.DOTALL)
-            print(f"\n{content}")
-            print(f"\n✅ 点餐完成!")
+            if not agent.stream:
+                log(f"\n{content}")
+            log(f"\n✅ 点餐完成!")
             return content
     
     return "抱歉，处理超时，请重试。"
@@ -231,8 +379,9 @@ if __name__ == "__main__":
     print("🍔 智能点餐助手（Function Calling 版）")
     print("=" * 50)
     print("菜单:")
-    for item, price in MENU.items():
-        print(f"  {item}: {price}元")
+    catalog = get_menu_catalog()
+    for item in catalog.names(limit=MENU_LIST_LIMIT):
+        print(f"  {item}: {catalog.price(item)}元")
     print("=" * 50)
     
     # 示例点餐
@@ -240,3 +389,5 @@ if __name__ == "__main__":
     print(f"\n👤 用户: {order}")
     
     result = query(order)
+    if router_stats.routes:
+        print(f"\n{router_stats.report()}")
@@ -0,0 +1,390 @@
+# -*- coding: utf-8 -*-
+"""
+程序员助手 Agent 服务 - 多会话 HTTP / WebSocket 版本
+一个进程同时服务多个用户：每个会话保留自己的 Agent 上下文，
+所有会话共享同一个大模型连接池和同一个 MCP 客户端。
+
+接口：
+    POST   /sessions                     创建会话，返回 session_id
+    POST   /sessions/{id}/messages       发送消息，按行返回过程事件（NDJSON）
+    DELETE /sessions/{id}                结束会话
+    WS     /ws?session_id=...            WebSocket：发送 {"message": ...}，逐条接收事件
+    GET    /stats                        会话数、排队情况、追踪统计和模型路由统计
+
+会话状态保存在进程内存中，只能以单进程方式运行。
+"""
+import os
+import json
+import time
+import uuid
+import asyncio
+import logging
+import argparse
+from collections import OrderedDict
+from contextlib import aclosing, asynccontextmanager
+
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route, WebSocketRoute
+from starlette.websockets import WebSocket, WebSocketDisconnect
+
+from dev_agent import (
+    PROMPT, STREAM, MCP_POOL_SIZE, MCP_SERVER_SCRIPT, MCP_SERVER_URL,
+    AsyncAgent, MCPClient, MCPClientPool, DropConsumedToolOutputs,
+    query, create_async_llm_client, router_stats,
+)
+from common.tracing import get_tracer
+
+# ==================== 配置 ====================
+MAX_SESSIONS = 1000  # 会话上限，满了先淘汰最久未使用的空闲会话
+SESSION_IDLE_TIMEOUT = 600  # 空闲超过该时间（秒）的会话被回收
+EVICT_INTERVAL = 30  # 空闲回收的检查间隔（秒）
+MAX_INFLIGHT = 64  # 同时执行的请求数
+MAX_QUEUE = 256  # 排队上限，超过后直接返回 429
+QUEUE_TIMEOUT = 30  # 排队等待超时（秒）
+MAX_TURNS = 10
+LLM_POOL_SIZE = 64  # 所有会话共享的大模型连接数
+LOG_LEVEL = os.environ.get("AGENT_LOG_LEVEL", "WARNING")  # 多会话时默认关闭逐轮输出
+
+logger = logging.getLogger("agent_server")
+
+
+class ServerBusy(Exception):
+    """会话数或排队数达到上限"""
+
+
+# ==================== 会话存储 ====================
+class Session:
+    """一个用户会话：独立的 Agent 上下文，同一会话的消息依次处理"""
+
+    def __init__(self, session_id: str, agent: AsyncAgent):
+        self.id = session_id
+        self.agent = agent
+        self.lock = asyncio.Lock()
+        self.last_used = time.monotonic()
+
+    @property
+    def busy(self) -> bool:
+        return self.lock.locked()
+
+    def touch(self):
+        self.last_used = time.monotonic()
+
+
+class SessionStore:
+    """有界会话存储：按最近使用排序，满时淘汰最久未使用的空闲会话，定期回收空闲会话"""
+
+    def __init__(self, agent_factory, max_sessions: int = MAX_SESSIONS,
+                 idle_timeout: float = SESSION_IDLE_TIMEOUT):
+        self.agent_factory = agent_factory
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.evicted = 0
+        self._sessions = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def create(self) -> Session:
+        if len(self._sessions) >= self.max_sessions and not self._evict_one():
+            raise ServerBusy("会话数已达上限")
+        session = Session(uuid.uuid4().hex, self.agent_factory())
+        self._sessions[session.id] = session
+        return session
+
+    def get(self, session_id: str):
+        session = self._sessions.get(session_id)
+        if session is not None:
+            self._sessions.move_to_end(session_id)
+            session.touch()
+        return session
+
+    def remove(self, session_id: str) -> bool:
+        return self._sessions.pop(session_id, None) is not None
+
+    def _evict_one(self) -> bool:
+        """淘汰最久未使用的空闲会话"""
+        for session_id, session in self._sessions.items():
+            if not session.busy:
+                del self._sessions[session_id]
+                self.evicted += 1
+                return True
+        return False
+
+    def evict_idle(self) -> int:
+        """回收空闲超时的会话"""
+        deadline = time.monotonic() - self.idle_timeout
+        expired = [sid for sid, s in self._sessions.items() if not s.busy and s.last_used < deadline]
+        for session_id in expired:
+            del self._sessions[session_id]
+        self.evicted += len(expired)
+        return len(expired)
+
+
+# ==================== 准入控制 ====================
+class AdmissionController:
+    """限制同时执行的请求数，超出的请求排队；队列满或等待超时时拒绝"""
+
+    def __init__(self, max_inflight: int = MAX_INFLIGHT, max_queue: int = MAX_QUEUE,
+                 timeout: float = QUEUE_TIMEOUT):
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.inflight = 0
+        self.waiting = 0
+        self.rejected = 0
+        self._semaphore = asyncio.Semaphore(max_inflight)
+
+    async def acquire(self):
+        if self._semaphore.locked() and self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise ServerBusy("排队请求过多")
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise ServerBusy("排队超时")
+        finally:
+            self.waiting -= 1
+        self.inflight += 1
+
+    def release(self):
+        self.inflight -= 1
+        self._semaphore.release()
+
+
+class AdmittedStreamingResponse(StreamingResponse):
+    """
+    持有一个准入名额的流式响应：发送结束、出错或客户端在开始读取前断开，都会归还名额
+
+    名额在返回响应前获取（排队失败时才能返回 429），不能只靠生成器的 finally 归还：
+    生成器从未开始迭代时 finally 不会执行
+    """
+
+    def __init__(self, content, admission: AdmissionController, **kwargs):
+        super().__init__(content, **kwargs)
+        self.admission = admission
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            await self.body_iterator.aclose()
+            self.admission.release()
+
+
+# ==================== 服务 ====================
+class AgentServer:
+    """共享资源：大模型连接池、MCP 客户端、会话存储和准入控制"""
+
+    def __init__(self):
+        self.llm_client = None
+        self.mcp_client = None
+        self.sessions = None
+        self.admission = None
+        self._evictor = None
+
+    async def start(self):
+        self.llm_client = create_async_llm_client(pool_size=LLM_POOL_SIZE)
+        self.mcp_client = MCPClientPool(MCP_POOL_SIZE) if MCP_POOL_SIZE > 1 else MCPClient()
+        await self.mcp_client.connect(MCP_SERVER_URL or MCP_SERVER_SCRIPT)
+        self.sessions = SessionStore(self._new_agent)
+        self.admission = AdmissionController()
+        self._evictor = asyncio.create_task(self._evict_loop())
+
+    async def stop(self):
+        self._evictor.cancel()
+        await asyncio.gather(self._evictor, return_exceptions=True)
+        await self.llm_client.close()
+        await self.mcp_client.disconnect()
+        get_tracer().close()
+
+    def _new_agent(self) -> AsyncAgent:
+        return AsyncAgent(PROMPT, self.mcp_client, client=self.llm_client, stream=STREAM,
+                          history=DropConsumedToolOutputs())
+
+    async def _evict_loop(self):
+        while True:
+            await asyncio.sleep(EVICT_INTERVAL)
+            count = self.sessions.evict_idle()
+            if count:
+                logger.info(f"回收空闲会话 {count} 个，当前 {len(self.sessions)} 个")
+
+    async def reply(self, session: Session, message: str):
+        """
+        处理一条消息，逐个产出过程事件，最后产出 answer 事件
+
+        调用前需已通过准入控制，名额由调用方归还；同一会话的消息排队依次处理
+        """
+        events = asyncio.Queue()
+
+        async def run():
+            try:
+                async with session.lock:
+                    checkpoint = len(session.agent.messages)
+                    try:
+                        answer = await query(message, self.mcp_client, MAX_TURNS, stream=STREAM,
+                                             agent=session.agent, on_event=events.put_nowait)
+                    except BaseException:
+                        # 中途取消或出错时回滚本条消息写入的上下文，
+                        # 否则会留下没有工具结果的 tool_calls，该会话之后的请求都会被模型接口拒绝
+                        del session.agent.messages[checkpoint:]
+                        raise
+                    session.touch()
+                events.put_nowait({"type": "answer", "content": answer})
+            except Exception as e:
+                logger.exception("会话处理失败")
+                events.put_nowait({"type": "error", "message": f"{type(e).__name__}: {e}"})
+            finally:
+                events.put_nowait(None)
+
+        task = asyncio.create_task(run())
+        try:
+            while (event := await events.get()) is not None:
+                yield event
+        finally:
+            # 客户端断开时取消仍在执行的请求
+            if not task.done():
+                task.cancel()
+
+    def stats(self) -> dict:
+        histogram = get_tracer().histogram
+        return {
+            "sessions": len(self.sessions),
+            "evicted": self.sessions.evicted,
+            "inflight": self.admission.inflight,
+            "waiting": self.admission.waiting,
+            "rejected": self.admission.rejected,
+            "tool_cache": self.mcp_client.result_cache.stats(),
+            "trace": histogram.summary() if histogram else {},
+            "router": router_stats.summary(),
+        }
+
+
+server = AgentServer()
+
+
+# ==================== HTTP / WebSocket 接口 ====================
+def busy_response(e: ServerBusy) -> JSONResponse:
+    return JSONResponse({"error": str(e)}, status_code=429, headers={"Retry-After": "1"})
+
+
+def parse_message(raw) -> str:
+    """解析客户端发来的 {"message": ...}，返回去掉首尾空白的消息；格式不对时抛出 ValueError"""
+    try:
+        body = json.loads(raw)
+    except ValueError:
+        raise ValueError("请求体不是合法 JSON")
+    message = (body.get("message") or "") if isinstance(body, dict) else None
+    if not isinstance(message, str):
+        raise ValueError('请求体必须是 {"message": 字符串} 形式的 JSON 对象')
+    return message.strip()
+
+
+async def create_session(request):
+    try:
+        session = server.sessions.create()
+    except ServerBusy as e:
+        return busy_response(e)
+    return JSONResponse({"session_id": session.id}, status_code=201)
+
+
+async def delete_session(request):
+    if not server.sessions.remove(request.path_params["session_id"]):
+        return JSONResponse({"error": "会话不存在"}, status_code=404)
+    return JSONResponse({"ok": True})
+
+
+async def post_message(request):
+    session = server.sessions.get(request.path_params["session_id"])
+    if session is None:
+        return JSONResponse({"error": "会话不存在"}, status_code=404)
+    try:
+        message = parse_message(await request.body())
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    if not message:
+        return JSONResponse({"error": "message 不能为空"}, status_code=400)
+    try:
+        await server.admission.acquire()
+    except ServerBusy as e:
+        return busy_response(e)
+
+    async def ndjson():
+        async with aclosing(server.reply(session, message)) as events:
+            async for event in events:
+                yield json.dumps(event, ensure_ascii=False) + "\n"
+
+    return AdmittedStreamingResponse(ndjson(), server.admission, media_type="application/x-ndjson")
+
+
+async def websocket_endpoint(websocket: WebSocket):
+    await websocket.accept()
+    session = server.sessions.get(websocket.query_params.get("session_id", ""))
+    if session is None:
+        try:
+            session = server.sessions.create()
+        except ServerBusy as e:
+            await websocket.close(code=1013, reason=str(e))
+            return
+    await websocket.send_json({"type": "session", "session_id": session.id})
+    try:
+        while True:
+            try:
+                message = parse_message(await websocket.receive_text())
+            except ValueError as e:
+                await websocket.send_json({"type": "error", "message": str(e)})
+                continue
+            if not message:
+                continue
+            try:
+                await server.admission.acquire()
+            except ServerBusy as e:
+                await websocket.send_json({"type": "error", "message": str(e)})
+                continue
+            try:
+                async with aclosing(server.reply(session, message)) as events:
+                    async for event in events:
+                        await websocket.send_json(event)
+            finally:
+                server.admission.release()
+    except WebSocketDisconnect:
+        pass
+
+
+async def get_stats(request):
+    return JSONResponse(server.stats())
+
+
+@asynccontextmanager
+async def lifespan(app):
+    await server.start()
+    try:
+        yield
+    finally:
+        await server.stop()
+
+
+app = Starlette(
+    routes=[
+        Route("/sessions", create_session, methods=["POST"]),
+        Route("/sessions/{session_id}", delete_session, methods=["DELETE"]),
+        Route("/sessions/{session_id}/messages", post_message, methods=["POST"]),
+        WebSocketRoute("/ws", websocket_endpoint),
+        Route("/stats", get_stats, methods=["GET"]),
+    ],
+    lifespan=lifespan,
+)
+
+
+# ==================== 主程序入口 ====================
+if __name__ == "__main__":
+    import uvicorn
+    logging.basicConfig(level=LOG_LEVEL, format="%(message)s")
+
+    parser = argparse.ArgumentParser(description="程序员助手 Agent 服务（多会话）")
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址")
+    parser.add_argument("--port", type=int, default=8080, help="监听端口")
+    args = parser.parse_args()
+
+    uvicorn.run(app, host=args.host, port=args.port, log_level=LOG_LEVEL.lower())
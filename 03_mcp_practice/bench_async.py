@@ -0,0 +1,109 @@
+"""
+并发会话基准 - 阻塞式大模型请求 vs AsyncLLMClient
+本地启动 load_test.py 的大模型桩服务（固定响应耗时），所有会话共享一个 MCPClient，
+分别以 1 / 10 / 100 个并发会话运行 query()，输出每秒完成的会话数和会话耗时。
+“阻塞”一组在协程里直接调用同步 LLMClient，等待大模型时整个事件循环停住，对应改造前的做法。
+
+    python3 bench_async.py --latency 0.05 --concurrency 1,10,100
+"""
+import os
+import sys
+import time
+import socket
+import asyncio
+import argparse
+import subprocess
+
+from load_test import percentile
+import dev_agent
+from common import llm
+from common.cache import LRUCompletionCache
+from common.llm import LLMClient, AsyncLLMClient
+
+TASKS = ["帮我生成一个 UUID", "计算 hello 的 md5", "把 Hello MCP 进行 base64 编码: Hello MCP"]
+
+
+class BlockingClient:
+    """在协程中直接调用同步 LLMClient：接口是异步的，但等待大模型时不让出事件循环"""
+
+    def __init__(self):
+        self.client = LLMClient()
+
+    async def chat(self, data: dict, body: bytes = None) -> dict:
+        return self.client.chat(data, body)
+
+    async def chat_stream(self, data: dict, body: bytes = None):
+        for chunk in self.client.chat_stream(data, body):
+            yield chunk
+
+    async def close(self):
+        self.client.close()
+
+
+def start_stub(latency: float) -> tuple:
+    """在子进程中启动桩服务（不与压测端争用 GIL），返回 (接口地址, 子进程)"""
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    stub = subprocess.Popen([sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "load_test.py"),
+                             "stub", "--port", str(port), "--latency", str(latency)])
+    while socket.socket().connect_ex(("127.0.0.1", port)) != 0:
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}/v1/chat/completions", stub
+
+
+async def run_level(mcp_client, client, concurrency: int, sessions: int, stream: bool) -> dict:
+    """以 concurrency 个并发会话跑完 sessions 个会话"""
+    semaphore = asyncio.Semaphore(concurrency)
+    durations = []
+
+    async def session(i: int):
+        async with semaphore:
+            agent = dev_agent.AsyncAgent(dev_agent.PROMPT, mcp_client, client=client, stream=stream,
+                                         cache=LRUCompletionCache())
+            start = time.perf_counter()
+            await dev_agent.query(TASKS[i % len(TASKS)], mcp_client, stream=stream, agent=agent)
+            durations.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(session(i) for i in range(sessions)))
+    elapsed = time.perf_counter() - start
+    durations.sort()
+    return {"sessions": sessions, "elapsed": elapsed, "rate": sessions / elapsed,
+            "p50": percentile(durations, 50), "p95": percentile(durations, 95)}
+
+
+async def run(levels: list, min_sessions: int, stream: bool):
+    mcp_client = dev_agent.MCPClient()
+    await mcp_client.connect(dev_agent.MCP_SERVER_SCRIPT, lazy=False)
+    print(f"{'方式':<8} {'并发':>6} {'会话数':>6} {'会话/秒':>10} {'会话 p50':>10} {'会话 p95':>10}")
+    try:
+        for name, client in (("阻塞", BlockingClient()), ("异步", AsyncLLMClient(max(levels)))):
+            for concurrency in levels:
+                # 每组使用空的工具结果缓存，两种方式的 MCP 调用次数相同
+                mcp_client.result_cache = dev_agent.ToolResultCache()
+                result = await run_level(mcp_client, client, concurrency, max(concurrency, min_sessions), stream)
+                print(f"{name:<8} {concurrency:>6} {result['sessions']:>6} {result['rate']:>10.1f} "
+                      f"{result['p50']*1000:>8.0f}ms {result['p95']*1000:>8.0f}ms")
+            await client.close()
+    finally:
+        await mcp_client.disconnect()
+
+
+# ==================== 主程序入口 ====================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="阻塞与异步大模型请求的并发会话对比")
+    parser.add_argument("--latency", type=float, default=0.05, help="模拟的大模型响应耗时（秒）")
+    parser.add_argument("--concurrency", default="1,10,100", help="逗号分隔的并发会话数")
+    parser.add_argument("--min-sessions", type=int, default=10, help="每组至少运行的会话数")
+    parser.add_argument("--stream", action="store_true", help="使用流式输出")
+    args = parser.parse_args()
+
+    url, stub = start_stub(args.latency)
+    llm.API_URL = url
+    try:
+        asyncio.run(run([int(c) for c in args.concurrency.split(",")], args.min_sessions, args.stream))
+    finally:
+        stub.terminate()
+        stub.wait()
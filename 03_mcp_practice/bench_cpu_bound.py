@@ -0,0 +1,107 @@
+"""
+CPU 密集型工具卸载基准 - 大哈希任务运行时小调用的延迟
+对每种执行方式（MCP_TOOL_EXECUTOR=inline / thread / process）启动一个 mcp_server.py，
+后台持续发起 --jobs 路大哈希任务（generate_hash sha512 大文本，或 hash_file 大文件），
+同时按固定间隔发起 generate_uuid 小调用，输出小调用的延迟（p50 / p95 / p99 / 最大）和测量期间大任务的吞吐量；
+“空载”一行是没有大任务时的小调用延迟。
+generate_hash 的大文本要在 Server 的事件循环里完成 JSON 解析，这部分无法卸载；hash_file 只传路径，只看计算本身。
+
+    python3 bench_cpu_bound.py --job generate_hash --text-mb 4 --jobs 2 --small 100
+    python3 bench_cpu_bound.py --job hash_file --file-mb 256 --jobs 2 --small 100
+"""
+import os
+import time
+import asyncio
+import argparse
+import tempfile
+
+from load_test import percentile
+from dev_agent import MCP_SERVER_SCRIPT, MCPClient
+
+MB = 1024 * 1024
+
+
+async def measure_small(client: MCPClient, count: int, interval: float) -> list:
+    """按固定间隔发起小调用，返回排好序的延迟"""
+    latencies = []
+    for _ in range(count):
+        start = time.perf_counter()
+        await client.call_tool("generate_uuid", {})
+        latencies.append(time.perf_counter() - start)
+        await asyncio.sleep(interval)
+    return sorted(latencies)
+
+
+async def run_mode(executor: str, args, large_args) -> tuple:
+    """返回 (小调用延迟, 测量期间每秒完成的大任务数)；executor 为 None 时不发起大任务"""
+    os.environ["MCP_TOOL_EXECUTOR"] = executor or "thread"
+    client = MCPClient()
+    await client.connect(MCP_SERVER_SCRIPT, lazy=False)
+    stop = asyncio.Event()
+    done = 0
+
+    async def large_job(job_id: int):
+        nonlocal done
+        i = 0
+        while not stop.is_set():
+            await client.call_tool(args.job, large_args(job_id, i))
+            done += 1
+            i += 1
+
+    workers = args.jobs if executor else 0
+    try:
+        # 预热：先完成一轮大任务，执行池（进程池要启动工作进程）在计时前就绪
+        await asyncio.gather(*(client.call_tool(args.job, large_args(-1 - j, 0)) for j in range(workers)))
+        jobs = [asyncio.create_task(large_job(j)) for j in range(workers)]
+        await asyncio.sleep(0.1 if jobs else 0)  # 让大任务先跑起来
+        start, done = time.perf_counter(), 0
+        latencies = await measure_small(client, args.small, args.interval)
+        rate = done / (time.perf_counter() - start)
+        stop.set()
+        await asyncio.gather(*jobs)
+    finally:
+        await client.disconnect()
+    return latencies, rate
+
+
+async def run(args):
+    if args.job == "hash_file":
+        # 文件工具只能访问 MCP_FILE_BASE_DIR 下的文件（随环境变量转发给 Server 进程）
+        directory = tempfile.mkdtemp()
+        os.environ["MCP_FILE_BASE_DIR"] = directory
+        path = os.path.join(directory, "bench_large.bin")
+        block = os.urandom(MB)
+        with open(path, "wb") as f:
+            for _ in range(args.file_mb):
+                f.write(block)
+        large_args = lambda job_id, i: {"path": "bench_large.bin", "algorithm": "sha512"}
+    else:
+        body = "x" * int(args.text_mb * MB)
+        # 每次的文本都不同，不会命中客户端的工具结果缓存
+        large_args = lambda job_id, i: {"text": f"{job_id}:{i}:{body}", "algorithm": "sha512"}
+
+    print(f"大任务 {args.job} × {args.jobs} 路  小调用 {args.small} 次（间隔 {args.interval * 1000:.0f}ms）")
+    print(f"{'执行方式':<8} {'p50':>10} {'p95':>10} {'p99':>10} {'最大':>10} {'大任务/秒':>10}")
+    try:
+        for executor in [None] + args.executors.split(","):
+            latencies, rate = await run_mode(executor, args, large_args)
+            print(f"{executor or '空载':<8} {percentile(latencies, 50)*1000:>8.1f}ms "
+                  f"{percentile(latencies, 95)*1000:>8.1f}ms {percentile(latencies, 99)*1000:>8.1f}ms "
+                  f"{latencies[-1]*1000:>8.1f}ms {rate:>10.1f}")
+    finally:
+        if args.job == "hash_file":
+            os.remove(path)
+            os.rmdir(directory)
+
+
+# ==================== 主程序入口 ====================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="大哈希任务运行时小调用的延迟")
+    parser.add_argument("--job", choices=["generate_hash", "hash_file"], default="generate_hash", help="大任务使用的工具")
+    parser.add_argument("--text-mb", type=float, default=4, help="generate_hash 的文本大小（MB）")
+    parser.add_argument("--file-mb", type=int, default=256, help="hash_file 的文件大小（MB）")
+    parser.add_argument("--jobs", type=int, default=2, help="同时运行的大任务数")
+    parser.add_argument("--small", type=int, default=100, help="小调用次数")
+    parser.add_argument("--interval", type=float, default=0.01, help="小调用的间隔（秒）")
+    parser.add_argument("--executors", default="inline,thread,process", help="逗号分隔的执行方式")
+    asyncio.run(run(parser.parse_args()))
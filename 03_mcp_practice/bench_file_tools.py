@@ -0,0 +1,91 @@
+"""
+大文件工具基准 - 分块读取（mmap）vs 一次性读入整个文件
+对 1MB / 100MB / 1GB 的文件分别运行 hash_file 和 base64_encode_file，
+输出耗时、吞吐量和 Python 内存分配峰值（tracemalloc）。
+
+    python3 bench_file_tools.py --sizes 1,100,1024 --dir /tmp
+"""
+import os
+import time
+import base64
+import hashlib
+import argparse
+import tempfile
+import tracemalloc
+
+MB = 1024 * 1024
+
+
+def make_file(directory: str, size_mb: int) -> str:
+    """生成指定大小的随机内容文件（按 1MB 块写入，生成过程本身不占用大量内存）"""
+    path = os.path.join(directory, f"bench_{size_mb}mb.bin")
+    block = os.urandom(MB)
+    with open(path, "wb") as f:
+        for _ in range(size_mb):
+            f.write(block)
+    return path
+
+
+def naive_hash(path: str) -> str:
+    """对照组：一次性读入整个文件再计算哈希"""
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def naive_base64(path: str) -> int:
+    """对照组：一次性读入并编码整个文件再写出"""
+    with open(path, "rb") as f:
+        encoded = base64.b64encode(f.read())
+    with open(path + ".b64", "wb") as out:
+        out.write(encoded)
+    return len(encoded)
+
+
+def measure(fn, *args) -> tuple:
+    """返回 (耗时, 内存分配峰值)"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn(*args)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    if isinstance(result, dict) and "error" in result:
+        raise RuntimeError(result["error"])
+    return elapsed, peak
+
+
+def run(sizes: list, directory: str):
+    # 文件工具只允许访问 MCP_FILE_BASE_DIR 下的文件，必须在导入 mcp_server 之前设置
+    os.environ["MCP_FILE_BASE_DIR"] = directory
+    os.environ["MCP_TOOL_EXECUTOR"] = "inline"
+    import mcp_server
+    hash_file = mcp_server._CPU_BOUND["hash_file"]
+    base64_encode_file = mcp_server._CPU_BOUND["base64_encode_file"]
+
+    variants = [
+        ("hash_file", lambda path: hash_file(os.path.basename(path))),
+        ("一次读入哈希", naive_hash),
+        ("base64_encode_file", lambda path: base64_encode_file(os.path.basename(path))),
+        ("一次读入编码", naive_base64),
+    ]
+    print(f"{'文件':>8} {'方式':<20} {'耗时':>10} {'吞吐量':>12} {'内存峰值':>12}")
+    for size_mb in sizes:
+        path = make_file(directory, size_mb)
+        try:
+            for name, fn in variants:
+                elapsed, peak = measure(fn, path)
+                print(f"{size_mb:>6}MB {name:<20} {elapsed:>9.3f}s {size_mb / elapsed:>9.1f}MB/s "
+                      f"{peak / MB:>10.1f}MB")
+        finally:
+            for p in (path, path + ".b64"):
+                if os.path.exists(p):
+                    os.remove(p)
+
+
+# ==================== 主程序入口 ====================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="大文件工具的内存和吞吐量基准")
+    parser.add_argument("--sizes", default="1,100,1024", help="逗号分隔的文件大小（MB）")
+    parser.add_argument("--dir", default=tempfile.gettempdir(), help="生成测试文件的目录")
+    args = parser.parse_args()
+    run([int(s) for s in args.sizes.split(",")], os.path.realpath(args.dir))
@@ -0,0 +1,92 @@
+"""
+MCP HTTP 共享模式压测 - 多个客户端并发调用同一个 Streamable HTTP Server
+启动 mcp_server.py --http（可指定工作进程数），建立 --clients 个独立的 MCPClient 会话（模拟多个 Agent 进程），
+每个客户端依次发起调用，输出每秒完成的调用数、延迟 p50 / p95 / p99 和失败数。
+generate_uuid 不会命中客户端缓存；generate_hash 时每次调用的文本都不同。
+
+    python3 bench_mcp_http.py --workers 1,4 --clients 50 --calls 20 --tool generate_uuid
+"""
+import os
+import sys
+import time
+import socket
+import asyncio
+import argparse
+import subprocess
+
+from load_test import percentile
+from dev_agent import MCPClient
+from mcp_server import HTTP_PATH
+
+
+def start_server(workers: int) -> tuple:
+    """在子进程中启动 HTTP Server，返回 (URL, 子进程)"""
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "mcp_server.py")
+    server = subprocess.Popen([sys.executable, script, "--http", "--port", str(port), "--workers", str(workers)],
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    while socket.socket().connect_ex(("127.0.0.1", port)) != 0:
+        if server.poll() is not None:
+            raise RuntimeError("MCP Server 启动失败")
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}{HTTP_PATH}", server
+
+
+def tool_args(tool: str, client_id: int, i: int, text_kb: int) -> dict:
+    if tool == "generate_hash":
+        return {"text": f"{client_id}:{i}:" + "x" * text_kb * 1024, "algorithm": "sha512"}
+    if tool == "base64_encode":
+        return {"text": f"{client_id}:{i}:" + "x" * text_kb * 1024}
+    return {}
+
+
+async def run_load(url: str, clients: int, calls: int, tool: str, text_kb: int) -> dict:
+    """clients 个客户端各自连接 Server，并发地各发起 calls 次调用"""
+    mcp_clients = [MCPClient() for _ in range(clients)]
+    await asyncio.gather(*(client.connect(url, lazy=False) for client in mcp_clients))
+    latencies = []
+    errors = 0
+
+    async def drive(client_id: int, client: MCPClient):
+        nonlocal errors
+        for i in range(calls):
+            start = time.perf_counter()
+            text = await client.call_tool(tool, tool_args(tool, client_id, i, text_kb))
+            latencies.append(time.perf_counter() - start)
+            errors += text.startswith("❌") or "服务繁忙" in text
+
+    try:
+        start = time.perf_counter()
+        await asyncio.gather(*(drive(i, client) for i, client in enumerate(mcp_clients)))
+        elapsed = time.perf_counter() - start
+    finally:
+        await asyncio.gather(*(client.disconnect() for client in mcp_clients))
+    latencies.sort()
+    return {"calls": len(latencies), "errors": errors, "elapsed": elapsed, "rate": len(latencies) / elapsed,
+            "p50": percentile(latencies, 50), "p95": percentile(latencies, 95), "p99": percentile(latencies, 99)}
+
+
+# ==================== 主程序入口 ====================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="MCP HTTP 共享模式压测")
+    parser.add_argument("--workers", default="1,4", help="逗号分隔的 Server 工作进程数")
+    parser.add_argument("--clients", type=int, default=50, help="并发客户端数")
+    parser.add_argument("--calls", type=int, default=20, help="每个客户端的调用次数")
+    parser.add_argument("--tool", choices=["generate_uuid", "generate_hash", "base64_encode"], default="generate_uuid")
+    parser.add_argument("--text-kb", type=int, default=16, help="generate_hash / base64_encode 的文本大小（KB）")
+    args = parser.parse_args()
+
+    print(f"客户端 {args.clients}  每个客户端调用 {args.calls} 次  工具 {args.tool}")
+    print(f"{'工作进程':>8} {'调用数':>8} {'调用/秒':>10} {'p50':>10} {'p95':>10} {'p99':>10} {'失败':>6}")
+    for workers in [int(w) for w in args.workers.split(",")]:
+        url, server = start_server(workers)
+        try:
+            result = asyncio.run(run_load(url, args.clients, args.calls, args.tool, args.text_kb))
+        finally:
+            server.terminate()
+            server.wait()
+        print(f"{workers:>8} {result['calls']:>8} {result['rate']:>10.1f} {result['p50']*1000:>8.1f}ms "
+              f"{result['p95']*1000:>8.1f}ms {result['p99']*1000:>8.1f}ms {result['errors']:>6}")
@@ -0,0 +1,75 @@
+"""
+MCP 连接池基准 - 工具调用吞吐量随 Server 进程数 N 的变化
+MCPClientPool 分别启动 1 / 2 / 4 个 mcp_server.py 进程，以固定并发对大文本调用 generate_hash(sha512)，
+输出每秒完成的调用数、单次调用延迟（p50 / p95）和相对 N=1 的加速比。
+每次调用的文本都不同，不会命中客户端的工具结果缓存；吞吐量上限取决于机器的 CPU 核数。
+
+    python3 bench_mcp_pool.py --sizes 1,2,4 --calls 64 --concurrency 16 --text-mb 2
+"""
+import os
+import time
+import asyncio
+import argparse
+
+from load_test import percentile
+from dev_agent import MCP_SERVER_SCRIPT, MCPClientPool
+
+
+async def run_size(size: int, texts: list, concurrency: int) -> dict:
+    """用 size 个 Server 进程以 concurrency 个并发跑完所有调用"""
+    pool = MCPClientPool(size)
+    await pool.connect(MCP_SERVER_SCRIPT)
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def call(text: str):
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            result = await pool.call_tool("generate_hash", {"text": text, "algorithm": "sha512"})
+            latencies.append(time.perf_counter() - start)
+            errors += not result.startswith("🔑")
+
+    try:
+        start = time.perf_counter()
+        await asyncio.gather(*(call(text) for text in texts))
+        elapsed = time.perf_counter() - start
+    finally:
+        await pool.disconnect()
+    latencies.sort()
+    return {"elapsed": elapsed, "rate": len(texts) / elapsed, "errors": errors,
+            "p50": percentile(latencies, 50), "p95": percentile(latencies, 95)}
+
+
+async def run(sizes: list, calls: int, concurrency: int, text_mb: float):
+    # 前缀不同的大文本：每次调用都真实计算，且 JSON 编解码和哈希的开销相同
+    body = "x" * int(text_mb * 1024 * 1024)
+    texts = [f"{i:08d}{body}" for i in range(calls)]
+    print(f"CPU 核数 {os.cpu_count()}  调用 {calls} 次  并发 {concurrency}  文本 {text_mb}MB  "
+          f"执行方式 {os.environ.get('MCP_TOOL_EXECUTOR', 'thread')}")
+    print(f"{'进程数':>6} {'调用/秒':>10} {'p50':>10} {'p95':>10} {'加速比':>8} {'失败':>6}")
+    baseline = None
+    for size in sizes:
+        result = await run_size(size, texts, concurrency)
+        baseline = baseline or result["rate"]
+        print(f"{size:>6} {result['rate']:>10.1f} {result['p50']*1000:>8.0f}ms {result['p95']*1000:>8.0f}ms "
+              f"{result['rate'] / baseline:>7.2f}x {result['errors']:>6}")
+
+
+# ==================== 主程序入口 ====================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="MCP 连接池吞吐量随进程数的变化")
+    parser.add_argument("--sizes", default="1,2,4", help="逗号分隔的 Server 进程数")
+    parser.add_argument("--calls", type=int, default=64, help="每组的调用次数")
+    parser.add_argument("--concurrency", type=int, default=16, help="并发调用数")
+    parser.add_argument("--text-mb", type=float, default=2, help="每次哈希的文本大小（MB）")
+    parser.add_argument("--executor", choices=["thread", "process", "inline"],
+                        help="Server 的 CPU 密集型工具执行方式（转发为 MCP_TOOL_EXECUTOR）")
+    args = parser.parse_args()
+
+    if args.executor:
+        os.environ["MCP_TOOL_EXECUTOR"] = args.executor
+    # 大文本走 Server 的大负载通道，放宽排队上限，测的是吞吐量而不是背压拒绝
+    os.environ.setdefault("MCP_LARGE_QUEUE_DEPTH", str(args.concurrency))
+    asyncio.run(run([int(s) for s in args.sizes.split(",")], args.calls, args.concurrency, args.text_mb))
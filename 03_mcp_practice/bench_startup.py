@@ -0,0 +1,67 @@
+"""
+启动耗时基准 - 用 python -X importtime 测量 dev_agent 的导入耗时
+对比两种方式：
+    延迟导入（当前）：import dev_agent，mcp / requests / httpx / urllib3 在首次使用时才导入
+    立即导入（优化前）：import dev_agent 后立即导入上述模块，等价于优化前在模块顶部导入
+每种方式在新进程中重复运行，输出导入耗时和进程总耗时的中位数，以及最慢的几个顶层模块。
+
+    python3 bench_startup.py --repeat 10
+"""
+import os
+import re
+import sys
+import time
+import argparse
+import statistics
+import subprocess
+from collections import defaultdict
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFERRED_MODULES = ["mcp", "mcp.client.stdio", "mcp.client.streamable_http", "requests", "httpx", "urllib3"]
+VARIANTS = {
+    "延迟导入（当前）": "import dev_agent",
+    "立即导入（优化前）": "import dev_agent; " + "; ".join(f"import {m}" for m in DEFERRED_MODULES),
+}
+IMPORTTIME_RE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def run_once(code: str) -> tuple:
+    """在新进程中执行 code，返回 (导入总耗时, 进程总耗时, {顶层模块: 累计耗时})，单位秒"""
+    env = dict(os.environ, TENCENT_API_KEY=os.environ.get("TENCENT_API_KEY", "bench"))
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=HERE, env=env,
+                            capture_output=True, text=True, check=True)
+    wall = time.perf_counter() - start
+    top_level = {}
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_RE.match(line)
+        # 缩进为 1 个空格的是顶层导入，其累计耗时已包含所有子模块
+        if match and len(match.group(3)) == 1:
+            top_level[match.group(4)] = top_level.get(match.group(4), 0) + int(match.group(2)) / 1e6
+    return sum(top_level.values()), wall, top_level
+
+
+def run(repeat: int, top: int):
+    run_once("import dev_agent")  # 预热：生成 .pyc，后续测量不含编译耗时
+    print(f"{'方式':<14} {'导入耗时 p50':>14} {'进程耗时 p50':>14}")
+    for name, code in VARIANTS.items():
+        imports, walls = [], []
+        modules = defaultdict(list)
+        for _ in range(repeat):
+            total, wall, top_level = run_once(code)
+            imports.append(total)
+            walls.append(wall)
+            for module, seconds in top_level.items():
+                modules[module].append(seconds)
+        print(f"{name:<14} {statistics.median(imports) * 1000:>12.1f}ms {statistics.median(walls) * 1000:>12.1f}ms")
+        slowest = sorted(modules.items(), key=lambda kv: statistics.median(kv[1]), reverse=True)[:top]
+        print("    最慢的顶层模块: " + ", ".join(f"{m} {statistics.median(v) * 1000:.1f}ms" for m, v in slowest))
+
+
+# ==================== 主程序入口 ====================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="dev_agent 启动耗时基准（python -X importtime）")
+    parser.add_argument("--repeat", type=int, default=10, help="每种方式的运行次数")
+    parser.add_argument("--top", type=int, default=5, help="列出最慢的顶层模块数")
+    args = parser.parse_args()
+    run(args.repeat, args.top)
@@ -0,0 +1,66 @@
+"""
+工具结果缓存基准 - 不同缓存容量下的命中率和节省的 MCP 往返
+按 Zipf 分布从固定参数集合中抽取 generate_hash / base64_encode 调用（混入不可缓存的 generate_uuid），
+同一串调用分别在不同缓存容量下跑一遍（0 即不缓存），输出命中率、淘汰次数、总耗时、
+平均每次真实往返的耗时，以及按往返耗时估算和实测（对比不缓存）节省的时间。
+
+    python3 bench_tool_cache.py --calls 1000 --keys 100 --text-kb 64 --cache-mb 0,1,16
+"""
+import time
+import random
+import asyncio
+import argparse
+
+from dev_agent import MCP_SERVER_SCRIPT, MCPClient, ToolResultCache
+
+
+def make_calls(calls: int, keys: int, text_kb: int, skew: float, uuid_ratio: float, seed: int = 0) -> list:
+    """生成固定的调用序列 [(工具名, 参数)]，参数按 Zipf 分布重复出现"""
+    rng = random.Random(seed)
+    params = [("generate_hash", {"text": f"{i}:" + "x" * text_kb * 1024, "algorithm": "sha512"}) if i % 2 else
+              ("base64_encode", {"text": f"{i}:" + "y" * text_kb * 1024}) for i in range(keys)]
+    weights = [1 / (rank + 1) ** skew for rank in range(keys)]
+    sequence = []
+    for _ in range(calls):
+        if rng.random() < uuid_ratio:
+            sequence.append(("generate_uuid", {}))
+        else:
+            sequence.append(rng.choices(params, weights)[0])
+    return sequence
+
+
+async def run(sequence: list, cache_sizes: list):
+    mcp_client = MCPClient()
+    await mcp_client.connect(MCP_SERVER_SCRIPT, lazy=False)
+    print(f"{'缓存容量':>8} {'命中率':>8} {'命中':>6} {'未命中':>6} {'淘汰':>6} {'总耗时':>9} "
+          f"{'每次往返':>9} {'估算节省':>9} {'实测节省':>9}")
+    baseline = None
+    try:
+        for cache_mb in cache_sizes:
+            mcp_client.result_cache = ToolResultCache(int(cache_mb * 1024 * 1024))
+            start = time.perf_counter()
+            for name, args in sequence:
+                await mcp_client.call_tool(name, args)
+            elapsed = time.perf_counter() - start
+            baseline = elapsed if baseline is None else baseline
+            stats = mcp_client.result_cache.stats()
+            print(f"{cache_mb:>6g}MB {stats['hit_rate']:>8.1%} {stats['hits']:>6} {stats['misses']:>6} "
+                  f"{stats['evictions']:>6} {elapsed:>8.2f}s {stats['avg_round_trip_ms']:>7.1f}ms "
+                  f"{stats['saved_seconds']:>8.2f}s {baseline - elapsed:>8.2f}s")
+    finally:
+        await mcp_client.disconnect()
+
+
+# ==================== 主程序入口 ====================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="工具结果缓存的命中率和节省的往返耗时")
+    parser.add_argument("--calls", type=int, default=1000, help="调用总数")
+    parser.add_argument("--keys", type=int, default=100, help="不同参数的个数")
+    parser.add_argument("--text-kb", type=int, default=64, help="每个参数的文本大小（KB）")
+    parser.add_argument("--skew", type=float, default=1.1, help="Zipf 分布的偏斜度，越大重复越集中")
+    parser.add_argument("--uuid-ratio", type=float, default=0.1, help="不可缓存的 generate_uuid 调用比例")
+    parser.add_argument("--cache-mb", default="0,1,16", help="逗号分隔的缓存容量（MB），第一个作为对照")
+    args = parser.parse_args()
+
+    sequence = make_calls(args.calls, args.keys, args.text_kb, args.skew, args.uuid_ratio)
+    asyncio.run(run(sequence, [float(s) for s in args.cache_mb.split(",")]))
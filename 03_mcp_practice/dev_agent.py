@@ -5,68 +5,371 @@
 通过 MCP 协议调用工具服务
 """
 import os
+import re
+import sys
 import json
 import asyncio
-import requests
-from contextlib import asynccontextmanager
-from mcp import ClientSession, StdioServerParameters
-from mcp.client.stdio import stdio_client
+import time
+import hashlib
+import logging
+import threading
+import concurrent.futures
+from contextlib import contextmanager
+from collections import OrderedDict, deque
+from types import SimpleNamespace
+
+# mcp / requests / httpx / sqlite3 在首次使用时才导入，缩短启动时间
+
+# LLM 客户端、缓存、模型路由等各章共用的部分在仓库根目录的 common 包中
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common import offline
+from common.llm import MODEL, POOL_SIZE, LLMClient, AsyncLLMClient, StreamAssembler
+from common.offline import LLM_MODE
+from common.encoding import RequestEncoder, message_bytes
+from common.cache import CompletionCache, get_completion_cache
+from common.router import (
+    CHEAP_MODEL, RouterStats, ModelRouter, router_stats,
+    cascade, acascade, chat_cached, achat_cached, replay_message,
+)
+from common.tools import INVALID_JSON, parse_arguments
+from common.tracing import Span, Tracer, get_tracer, payload_bytes
+
+logger = logging.getLogger("dev_agent")
 
 # ==================== 配置 ====================
-API_URL = "https://api.lkeap.cloud.tencent.com/v1/chat/completions"
-API_KEY = os.environ.get("TENCENT_API_KEY", "")
-MODEL = "deepseek-v3"
+# 流式输出（SSE）：边生成边显示
+STREAM = False
+
+# 模型级联：命中路由规则的轮次先用小模型（CHEAP_MODEL），输出校验失败（或请求失败）再升级到 MODEL
+ROUTE_RULES = [
+    # max_messages / max_bytes 按压缩后实际发送的历史计算
+    {"name": "observation", "turn": "tool", "max_pending_tools": 2, "max_bytes": 16 * 1024},
+    {"name": "first_turn", "turn": "user", "max_messages": 2},
+]
+
+# 工具调度配置
+TOOL_CONCURRENCY = 4  # 同一轮工具调用的最大并发数
+TOOL_TIMEOUT = 30  # 单个工具的超时时间（秒）
+
+# 历史压缩配置：单次请求的消息字节预算（0 表示不限制）
+HISTORY_MAX_BYTES = 64 * 1024
+HISTORY_RECORDS = 100  # 每个会话保留最近多少次请求的压缩记录（长期运行的会话不会无限增长）
+# 交互模式默认每次输入新建 Agent（各次输入互不影响）；设为 1 时整个会话共用一个 Agent 保留上下文，输入 reset 清空
+KEEP_CONTEXT = os.environ.get("AGENT_KEEP_CONTEXT", "") == "1"
 
 # MCP Server 配置
 MCP_SERVER_SCRIPT = os.path.join(os.path.dirname(__file__), "mcp_server.py")
+# 共享的 HTTP MCP Server 地址（如 http://127.0.0.1:8765/mcp），设置后不再启动本地子进程
+MCP_SERVER_URL = os.environ.get("MCP_SERVER_URL", "")
+MCP_POOL_SIZE = 1  # MCP Server 进程数，大于 1 时使用 MCPClientPool
+TOOLS_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".mcp_tools_cache.json")
+
+# 工具结果缓存：声明了 readOnlyHint + idempotentHint 或在白名单中的纯函数工具按参数缓存结果
+TOOL_CACHE_MAX_BYTES = 16 * 1024 * 1024
+CACHEABLE_TOOLS = {"generate_hash", "base64_encode"}
+NEVER_CACHE_TOOLS = {"generate_uuid"}  # 非确定性工具，永不缓存
+
+# 日志配置（追踪的 Sink 由 common.tracing 的 AGENT_TRACE_SINKS 配置）
+LOG_LEVEL = os.environ.get("AGENT_LOG_LEVEL", "INFO")  # 高负载时设为 WARNING 关闭过程输出
+
+
+# ==================== 追踪汇总 ====================
+def log_trace_summary(tracer: Tracer):
+    """输出各阶段的耗时分位数和 token 统计"""
+    histogram = tracer.histogram
+    if histogram is None:
+        return
+    for name, stats in sorted(histogram.summary().items()):
+        extras = "  ".join(f"{key}={stats[key]}" for key in
+                           ("prompt_tokens", "completion_tokens", "request_bytes", "response_bytes",
+                            "result_bytes", "cached", "turns") if key in stats)
+        logger.info(f"📊 {name}: n={stats['count']} mean={stats['mean']*1000:.1f}ms "
+                    f"p50≤{stats['p50']*1000:.0f}ms p95≤{stats['p95']*1000:.0f}ms "
+                    f"errors={stats['errors']}  {extras}".rstrip())
+
+
+# ==================== 工具结果缓存 ====================
+class ToolResultCache:
+    """纯函数工具的结果 LRU 缓存，按 (工具名, 规范化 JSON 参数) 作键，按字节数计量容量"""
+    
+    def __init__(self, max_bytes: int = TOOL_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.miss_time = 0.0  # 未命中时真实调用的累计耗时
+        self._data = OrderedDict()
+    
+    @staticmethod
+    def make_key(name: str, arguments: dict) -> str:
+        return name + "\0" + json.dumps(arguments, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    
+    @staticmethod
+    def _size(key: str, value: str) -> int:
+        return len(key.encode("utf-8")) + len(value.encode("utf-8"))
+    
+    def get(self, key: str):
+        value = self._data.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+    
+    def set(self, key: str, value: str, elapsed: float = 0.0):
+        self.miss_time += elapsed
+        size = self._size(key, value)
+        if size > self.max_bytes:
+            return
+        if key in self._data:
+            self.bytes -= self._size(key, self._data.pop(key))
+        self._data[key] = value
+        self.bytes += size
+        while self.bytes > self.max_bytes:
+            old_key, old_value = self._data.popitem(last=False)
+            self.bytes -= self._size(old_key, old_value)
+            self.evictions += 1
+    
+    def stats(self) -> dict:
+        """命中率、占用字节数，以及按平均往返耗时估算的节省时间"""
+        total = self.hits + self.misses
+        avg_miss = self.miss_time / self.misses if self.misses else 0.0
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0,
+            "bytes": self.bytes,
+            "avg_round_trip_ms": avg_miss * 1000,
+            "saved_seconds": self.hits * avg_miss,
+        }
+
+
+# ==================== 工具列表缓存 ====================
+def is_server_url(server: str) -> bool:
+    """server 参数是否为 HTTP 地址（否则视为本地脚本路径）"""
+    return server.startswith(("http://", "https://"))
+
+
+def _script_hash(server_script: str) -> str:
+    with open(server_script, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def tool_to_dict(tool) -> dict:
+    """提取工具定义中用于构建 Schema 的字段"""
+    annotations = getattr(tool, "annotations", None)
+    return {
+        "name": tool.name,
+        "description": tool.description,
+        "inputSchema": tool.inputSchema,
+        "annotations": {
+            "readOnlyHint": getattr(annotations, "readOnlyHint", None),
+            "idempotentHint": getattr(annotations, "idempotentHint", None),
+        },
+    }
+
+
+def load_tools_cache(server_script: str):
+    """读取与 Server 脚本内容哈希匹配的工具缓存，没有或已过期返回 None"""
+    try:
+        with open(TOOLS_CACHE_PATH, encoding="utf-8") as f:
+            cache = json.load(f)
+        if cache.get("script_hash") != _script_hash(server_script):
+            return None
+    except (OSError, ValueError):
+        return None
+    return [
+        SimpleNamespace(**{**tool, "annotations": SimpleNamespace(**tool["annotations"])})
+        for tool in cache["tools"]
+    ]
+
+
+def save_tools_cache(server_script: str, tools: list):
+    """按 Server 脚本内容哈希保存工具列表"""
+    try:
+        with open(TOOLS_CACHE_PATH, "w", encoding="utf-8") as f:
+            json.dump({"script_hash": _script_hash(server_script), "tools": tools}, f, ensure_ascii=False)
+    except OSError:
+        pass
+
+
+class _WatchedStream:
+    """包装传输层的读取流：会话的接收循环退出（Server 进程退出或连接断开）时调用 on_close"""
+    
+    def __init__(self, stream, on_close):
+        self._stream = stream
+        self._on_close = on_close
+    
+    async def __aenter__(self):
+        await self._stream.__aenter__()
+        return self
+    
+    async def __aexit__(self, *exc_info):
+        self._on_close()
+        return await self._stream.__aexit__(*exc_info)
+    
+    def __aiter__(self):
+        return self
+    
+    async def __anext__(self):
+        return await self._stream.__anext__()
+
+
+def is_connection_error(error: Exception) -> bool:
+    """调用失败是否因为连接已断开（而不是工具本身出错）"""
+    import anyio
+    from mcp.shared.exceptions import McpError
+    from mcp.types import CONNECTION_CLOSED
+    if isinstance(error, McpError):
+        return error.error.code == CONNECTION_CLOSED
+    return isinstance(error, (anyio.ClosedResourceError, anyio.BrokenResourceError, ConnectionError))
+
+
+class _ServerConnection:
+    """
+    与单个 MCP Server 的连接：本地脚本走 stdio 子进程，http(s) URL 走 Streamable HTTP。
+    传输和会话由独立任务持有，进入和退出都在同一任务中完成
+    """
+    
+    def __init__(self, server: str):
+        self.server = server
+        self.session = None
+        self.tools = []
+        self.outstanding = 0  # 在途请求数
+        self.restart_lock = asyncio.Lock()
+        self.on_lost = None  # 连接意外断开（不是 stop() 主动断开）时的回调
+        self._stop = None
+        self._stopping = False
+        self._task = None
+    
+    @property
+    def alive(self) -> bool:
+        return self.session is not None and self._task is not None and not self._task.done()
+    
+    async def start(self):
+        """建立连接并等待初始化完成"""
+        self._stop = asyncio.Event()
+        self._stopping = False
+        ready = asyncio.get_running_loop().create_future()
+        self._task = asyncio.create_task(self._run(ready))
+        await ready
+    
+    async def _run(self, ready: asyncio.Future):
+        try:
+            async with self._transport() as streams:
+                # 接收循环退出即连接已断开：结束本任务，alive 变为 False，连接池才会重启它
+                read, write = _WatchedStream(streams[0], self._stop.set), streams[1]
+                from mcp import ClientSession
+                async with ClientSession(read, write) as session:
+                    await session.initialize()
+                    self.tools = (await session.list_tools()).tools
+                    self.session = session
+                    ready.set_result(None)
+                    await self._stop.wait()
+        except Exception as e:
+            if not ready.done():
+                ready.set_exception(e)
+        finally:
+            lost = self.session is not None and not self._stopping
+            self.session = None
+            if lost and self.on_lost:
+                self.on_lost(self)
+    
+    def _transport(self):
+        """URL 使用 Streamable HTTP（底层 httpx 连接复用），否则启动 stdio 子进程"""
+        if is_server_url(self.server):
+            from mcp.client.streamable_http import streamablehttp_client
+            return streamablehttp_client(self.server)
+        import sys
+        from mcp import StdioServerParameters
+        from mcp.client.stdio import stdio_client, get_default_environment
+        # stdio 子进程默认只继承少量环境变量，这里额外转发 Server 的配置（执行池、大负载通道、文件目录等 MCP_*）
+        env = get_default_environment()
+        env.update({k: v for k, v in os.environ.items() if k.startswith("MCP_")})
+        server_params = StdioServerParameters(command=sys.executable, args=[self.server], env=env)
+        return stdio_client(server_params)
+    
+    def check_failure(self, error: Exception) -> bool:
+        """调用失败后检查连接是否已断开；断开时立即标记为不可用（后台任务可能还没有退出），返回是否已断开"""
+        if self.alive and not is_connection_error(error):
+            return False
+        self.session = None
+        return True
+    
+    async def stop(self):
+        """断开连接（stdio 时同时结束子进程）"""
+        if self._task:
+            self._stopping = True
+            self._stop.set()
+            await self._task
 
 
 # ==================== MCP 客户端管理器 ====================
 class MCPClient:
     """MCP 客户端，用于连接和调用 MCP Server"""
     
-    def __init__(self):
-        self.session: ClientSession = None
+    def __init__(self, result_cache: ToolResultCache = None, tracer: Tracer = None):
+        self.session = None
         self.tools = []
         self._tools_schema = []
+        self._cacheable = set()
+        self.result_cache = result_cache or ToolResultCache()
+        self.tracer = tracer or get_tracer()
+        self._server = None
+        self._ready = None
     
-    async def connect(self, server_script: str):
-        """连接到 MCP Server"""
-        import sys
-        server_params = StdioServerParameters(
-            command=sys.executable,  # 使用当前运行的 Python 解释器
-            args=[server_script],
-            env=None
-        )
-        
-        # 创建 stdio 传输
-        self._stdio_transport = stdio_client(server_params)
-        self._read, self._write = await self._stdio_transport.__aenter__()
+    async def connect(self, server_script: str, lazy: bool = True):
+        """
+        连接到 MCP Server
         
-        # 创建并初始化会话
-        self.session = ClientSession(self._read, self._write)
-        await self.session.__aenter__()
-        await self.session.initialize()
-        
-        # 获取可用工具
-        response = await self.session.list_tools()
-        self.tools = response.tools
-        self._build_tools_schema()
-        
-        print(f"✅ 已连接到 MCP Server，发现 {len(self.tools)} 个工具")
+        server_script 为本地脚本路径（stdio）或 HTTP 地址（如 http://127.0.0.1:8765/mcp）。
+        lazy 时如果磁盘上有该 Server 脚本对应的工具缓存，直接使用缓存的工具列表，
+        Server 握手在后台进行，第一次大模型请求无需等待；握手完成后再校验缓存
+        """
+        self._server = _ServerConnection(server_script)
+        cached = load_tools_cache(server_script) if lazy and not is_server_url(server_script) else None
+        if cached is None:
+            await self._start(server_script)
+            logger.info(f"✅ 已连接到 MCP Server，发现 {len(self.tools)} 个工具")
+        else:
+            self.tools = cached
+            self._build_tools_schema()
+            self._ready = asyncio.create_task(self._start(server_script))
+            logger.info(f"✅ 已加载工具缓存，发现 {len(self.tools)} 个工具（MCP Server 后台启动中）")
         return self
     
+    async def _start(self, server_script: str):
+        """启动 Server 并校验工具列表，有变化时更新 Schema 和磁盘缓存"""
+        await self._server.start()
+        self.session = self._server.session
+        tools = [tool_to_dict(tool) for tool in self._server.tools]
+        if tools != [tool_to_dict(tool) for tool in self.tools]:
+            if self.tools:
+                logger.info("♻️ 工具列表已变化，已更新缓存")
+            self.tools = self._server.tools
+            self._build_tools_schema()
+            if not is_server_url(server_script):
+                save_tools_cache(server_script, tools)
+    
     async def disconnect(self):
         """断开连接"""
-        if self.session:
-            await self.session.__aexit__(None, None, None)
-        if self._stdio_transport:
-            await self._stdio_transport.__aexit__(None, None, None)
+        if self._ready:
+            await asyncio.gather(self._ready, return_exceptions=True)
+        if self._server:
+            await self._server.stop()
     
     def _build_tools_schema(self):
-        """构建 OpenAI 兼容的工具 Schema"""
+        """构建 OpenAI 兼容的工具 Schema，同时记录可缓存的纯函数工具"""
         self._tools_schema = []
+        self._cacheable = set(CACHEABLE_TOOLS)
         for tool in self.tools:
+            annotations = getattr(tool, "annotations", None)
+            if annotations and annotations.readOnlyHint and annotations.idempotentHint:
+                self._cacheable.add(tool.name)
             schema = {
                 "type": "function",
                 "function": {
@@ -85,25 +388,379 @@ class MCPClient:
         """获取工具 Schema（用于 Function Calling）"""
         return self._tools_schema
     
+    def is_cacheable(self, name: str) -> bool:
+        """工具结果是否可以缓存"""
+        return name in self._cacheable and name not in NEVER_CACHE_TOOLS
+    
     async def call_tool(self, name: str, arguments: dict) -> str:
-        """调用 MCP 工具"""
+        """调用 MCP 工具（纯函数工具先查结果缓存）"""
+        with self.tracer.span("tool.call", tool=name) as span:
+            text = await self._call_tool_traced(name, arguments, span)
+            if self.tracer.enabled:
+                span.set(args_bytes=payload_bytes(arguments), result_bytes=len(text.encode("utf-8")))
+            return text
+
+    async def _call_tool_traced(self, name: str, arguments: dict, span: Span) -> str:
+        cacheable = self.is_cacheable(name)
+        if cacheable:
+            key = self.result_cache.make_key(name, arguments)
+            cached = self.result_cache.get(key)
+            if cached is not None:
+                span.set(cached=True)
+                return cached
+        span.set(cached=False)
         try:
-            result = await self.session.call_tool(name, arguments)
-            # 提取文本内容
-            if result.content:
-                texts = [c.text for c in result.content if hasattr(c, 'text')]
-                return "\n".join(texts) if texts else str(result.content)
-            return "工具执行完成（无输出）"
+            start = time.perf_counter()
+            result = await self._call_tool_uncached(name, arguments)
+            text = self._format_result(result)
         except Exception as e:
+            span.error = f"{type(e).__name__}: {e}"
             return f"❌ 工具调用失败: {str(e)}"
+        # 失败结果（含“服务繁忙”这类暂时性错误）不缓存，下次重新调用
+        if self._is_error_result(result, text):
+            span.error = text
+        elif cacheable:
+            self.result_cache.set(key, text, time.perf_counter() - start)
+        return text
+
+    @staticmethod
+    def _is_error_result(result, text: str) -> bool:
+        """工具是否执行失败：isError，或按本仓库工具的约定返回的错误（{"error": ...} 字典 / ❌ 开头的文本）"""
+        structured = getattr(result, "structuredContent", None)
+        return bool(result.isError or isinstance(structured, dict) and "error" in structured
+                    or text.startswith("❌"))
+    
+    async def _call_tool_uncached(self, name: str, arguments: dict):
+        """通过 MCP 会话真实调用工具（后台握手未完成时先等待）"""
+        if self._ready:
+            await self._ready
+        return await self.session.call_tool(name, arguments)
+    
+    @staticmethod
+    def _format_result(result) -> str:
+        """提取工具结果中的文本内容"""
+        if result.content:
+            texts = [c.text for c in result.content if hasattr(c, 'text')]
+            return "\n".join(texts) if texts else str(result.content)
+        return "工具执行完成（无输出）"
+
+
+class MCPClientPool(MCPClient):
+    """
+    MCP 客户端池：启动多个 Server 进程，按最少在途请求分发 call_tool，
+    进程崩溃后自动重启。接口与 MCPClient 相同，可被多个 Agent 共享
+    """
+    
+    def __init__(self, size: int = MCP_POOL_SIZE, result_cache: ToolResultCache = None,
+                 tracer: Tracer = None):
+        super().__init__(result_cache, tracer)
+        self.size = size
+        self.workers = []
+        self._restarts = set()
+    
+    async def connect(self, server_script: str):
+        """建立 size 个连接（本地脚本时即启动 size 个 Server 进程）"""
+        self.workers = [_ServerConnection(server_script) for _ in range(self.size)]
+        for worker in self.workers:
+            worker.on_lost = self._restart_in_background
+        await asyncio.gather(*(worker.start() for worker in self.workers))
+        self.tools = self.workers[0].tools
+        self._build_tools_schema()
+        
+        logger.info(f"✅ MCP 连接池就绪（{self.size} 个连接），发现 {len(self.tools)} 个工具")
+        return self
+    
+    async def disconnect(self):
+        """停止所有 Server 进程（先等进行中的重启结束，避免断开后又被拉起）"""
+        for worker in self.workers:
+            worker.on_lost = None
+        await asyncio.gather(*self._restarts, return_exceptions=True)
+        await asyncio.gather(*(worker.stop() for worker in self.workers))
+    
+    async def _restart(self, worker: _ServerConnection):
+        """重启崩溃的 Server 进程（同一进程只重启一次）"""
+        async with worker.restart_lock:
+            if worker.alive:
+                return
+            await worker.stop()
+            await worker.start()
+            logger.warning("♻️ MCP Server 进程已重启")
+    
+    def _restart_in_background(self, worker: _ServerConnection):
+        restart = asyncio.create_task(self._restart(worker))
+        self._restarts.add(restart)
+        restart.add_done_callback(self._restarts.discard)
+    
+    async def _call_tool_uncached(self, name: str, arguments: dict):
+        """选择在途请求最少的进程调用工具，进程崩溃时重启并换一个进程重试一次"""
+        for attempt in range(2):
+            worker = min(self.workers, key=lambda w: (not w.alive, w.outstanding))
+            worker.outstanding += 1
+            try:
+                if not worker.alive:
+                    await self._restart(worker)
+                return await worker.session.call_tool(name, arguments)
+            except Exception as e:
+                if not worker.check_failure(e) or attempt == 1:
+                    raise
+                # 进程已崩溃：后台重启，本次调用换一个进程重试
+                self._restart_in_background(worker)
+            finally:
+                worker.outstanding -= 1
+
+
+# ==================== LLM 客户端 ====================
+_llm_client = None
+_llm_client_lock = threading.Lock()
+
+
+def get_llm_client() -> LLMClient:
+    """获取进程内共享的 LLMClient（所有 Agent 复用同一个连接池）"""
+    global _llm_client
+    if _llm_client is None:
+        with _llm_client_lock:
+            if _llm_client is None:
+                _llm_client = create_llm_client()
+    return _llm_client
+
+
+_async_llm_client = None
+
+
+def get_async_llm_client() -> AsyncLLMClient:
+    """获取共享的 AsyncLLMClient（同一事件循环内的所有 AsyncAgent 复用连接池）"""
+    global _async_llm_client
+    if _async_llm_client is None:
+        _async_llm_client = create_async_llm_client()
+    return _async_llm_client
+
+
+async def close_async_llm_client():
+    """关闭共享的 AsyncLLMClient（在事件循环结束前调用）"""
+    global _async_llm_client
+    if _async_llm_client is not None:
+        await _async_llm_client.close()
+        _async_llm_client = None
+
+
+def create_llm_client(mode: str = LLM_MODE):
+    """按 LLM_MODE 创建同步大模型客户端（live / record / replay / scripted）"""
+    return offline.create_llm_client(scripted_reply, mode)
+
+
+def create_async_llm_client(mode: str = LLM_MODE, pool_size: int = POOL_SIZE):
+    """按 LLM_MODE 创建异步大模型客户端（live / record / replay / scripted）"""
+    return offline.create_async_llm_client(scripted_reply, mode, pool_size)
+
+
+# ==================== 脚本模型规则（LLM_MODE=scripted）====================
+def scripted_reply(messages: list) -> dict:
+    """脚本规则：按关键词选择工具（UUID / Base64 / 哈希），收到工具结果后直接回答"""
+    last = messages[-1]
+    if last["role"] == "tool":
+        return {"role": "assistant", "content": f"Answer: {last['content']}"}
+    request = last["content"].lower()
+    text = re.split(r"[:：]", last["content"], maxsplit=1)[-1].strip()
+    if "uuid" in request:
+        name, arguments = "generate_uuid", {}
+    elif "base64" in request:
+        name, arguments = "base64_encode", {"text": text}
+    elif any(word in request for word in ("哈希", "hash", "md5", "sha")):
+        algorithm = next((a for a in ("sha512", "sha256", "sha1", "md5") if a in request), "md5")
+        name, arguments = "generate_hash", {"text": text, "algorithm": algorithm}
+    else:
+        return {"role": "assistant", "content": "Answer: 抱歉，没有可用的工具"}
+    return {
+        "role": "assistant",
+        "content": "",
+        "tool_calls": [{
+            "id": f"call_{len(messages)}",
+            "type": "function",
+            "function": {"name": name, "arguments": json.dumps(arguments, ensure_ascii=False)}
+        }]
+    }
+
+
+# ==================== 历史压缩 ====================
+
+def group_messages(messages: list) -> list:
+    """
+    把消息按轮次分组：assistant 的 tool_calls 与其后的 tool 结果属于同一组，
+    这样按组裁剪时 tool_call / tool 配对不会被拆开
+    """
+    groups = []
+    for message in messages:
+        if message.get("role") == "tool" and groups:
+            groups[-1].append(message)
+        else:
+            groups.append([message])
+    return groups
+
+
+class HistoryManager:
+    """
+    历史管理器基类：决定每次请求实际发送哪些消息（不修改 Agent.messages），
+    并在超出字节预算时从最早的轮次开始丢弃
+    """
+
+    def __init__(self, max_bytes: int = HISTORY_MAX_BYTES, max_records: int = HISTORY_RECORDS):
+        self.max_bytes = max_bytes
+        self.records = deque(maxlen=max_records)  # 最近若干次请求压缩前后的字节数
+
+    def compact(self, messages: list, measure=message_bytes) -> list:
+        """返回本次请求要发送的消息列表（measure 计算消息字节数，可传入 RequestEncoder.message_bytes）"""
+        before = measure(messages)
+        compacted = self._enforce_budget(self.transform(messages), measure)
+        self.records.append({"before": before, "after": measure(compacted)})
+        return compacted
+
+    def transform(self, messages: list) -> list:
+        """压缩策略，子类覆盖"""
+        return messages
+
+    def _enforce_budget(self, messages: list, measure=message_bytes) -> list:
+        """超出预算时丢弃最早的轮次，保留 system、首个用户问题和最后一轮"""
+        if not self.max_bytes or measure(messages) <= self.max_bytes:
+            return messages
+        groups = group_messages(messages)
+        pinned = [g for g in groups[:2] if g[0].get("role") in ("system", "user")]
+        rest = groups[len(pinned):]
+        while len(rest) > 1 and measure([m for g in pinned + rest for m in g]) > self.max_bytes:
+            rest.pop(0)
+        return [m for g in pinned + rest for m in g]
+
+
+class SlidingWindowHistory(HistoryManager):
+    """滑动窗口：只保留 system、首个用户问题和最近 window 轮"""
+
+    def __init__(self, window: int = 10, max_bytes: int = HISTORY_MAX_BYTES):
+        super().__init__(max_bytes)
+        self.window = window
+
+    def transform(self, messages: list) -> list:
+        groups = group_messages(messages)
+        pinned = [g for g in groups[:2] if g[0].get("role") in ("system", "user")]
+        rest = groups[len(pinned):]
+        return [m for g in pinned + rest[-self.window:] for m in g]
+
+
+class DropConsumedToolOutputs(HistoryManager):
+    """丢弃已消费的工具输出：模型已在其后回复过的 tool 结果替换为占位符，保留配对"""
+
+    PLACEHOLDER = "[工具输出已省略]"
+
+    def __init__(self, max_bytes: int = HISTORY_MAX_BYTES):
+        super().__init__(max_bytes)
+        self._replaced = {}  # id(原消息) -> (原消息, 占位消息)，每次返回同一个对象，请求编码缓存才能命中
+
+    def _placeholder(self, message: dict) -> dict:
+        entry = self._replaced.get(id(message))
+        if entry is None or entry[0] is not message:
+            entry = (message, {**message, "content": self.PLACEHOLDER})
+            self._replaced[id(message)] = entry
+        return entry[1]
+
+    def transform(self, messages: list) -> list:
+        last_assistant = max((i for i, m in enumerate(messages) if m.get("role") == "assistant"), default=-1)
+        live = {id(m) for m in messages}
+        self._replaced = {key: entry for key, entry in self._replaced.items() if key in live}
+        return [
+            self._placeholder(m) if m.get("role") == "tool" and i < last_assistant else m
+            for i, m in enumerate(messages)
+        ]
+
+
+class SummarizeHistory(HistoryManager):
+    """
+    摘要旧轮次：最近 keep 轮原样保留，更早的轮次折叠成一条摘要消息
+
+    summarizer 接收被折叠的消息列表并返回摘要文本，默认做本地截断摘要（不调用大模型）
+    """
+
+    def __init__(self, keep: int = 6, summarizer=None, max_bytes: int = HISTORY_MAX_BYTES):
+        super().__init__(max_bytes)
+        self.keep = keep
+        self.summarizer = summarizer or self._local_summary
+        self._summary = (0, None, None)  # (折叠的消息数, 最后一条折叠的消息, 摘要消息)，折叠范围不变时复用
+
+    @staticmethod
+    def _local_summary(messages: list) -> str:
+        lines = []
+        for m in messages:
+            if m.get("role") == "user":
+                lines.append(f"用户: {m['content'][:80]}")
+            elif m.get("tool_calls"):
+                names = ", ".join(tc["function"]["name"] for tc in m["tool_calls"])
+                lines.append(f"调用工具: {names}")
+            elif m.get("role") == "assistant" and m.get("content"):
+                lines.append(f"助手: {m['content'][:80]}")
+        return "\n".join(lines)
+
+    def transform(self, messages: list) -> list:
+        groups = group_messages(messages)
+        head = groups[:1] if groups and groups[0][0].get("role") == "system" else []
+        body = groups[len(head):]
+        if len(body) <= self.keep:
+            return messages
+        old = [m for g in body[:-self.keep] for m in g]
+        count, last, summary = self._summary
+        if count != len(old) or last is not old[-1]:
+            summary = {"role": "system", "content": f"之前的对话摘要：\n{self.summarizer(old)}"}
+            self._summary = (len(old), old[-1], summary)
+        return [m for g in head for m in g] + [summary] + [m for g in body[-self.keep:] for m in g]
+
+
+# ==================== 模型路由（级联）====================
+def validate_fc_message(message: dict, tools: list) -> str:
+    """检查 Function Calling 回复：tool_calls 完整（有 id、工具存在、参数符合 Schema）或有文本回答，返回失败原因（通过时为 None）"""
+    tool_calls = message.get("tool_calls")
+    if not tool_calls:
+        return None if (message.get("content") or "").strip() else "空回复"
+    schemas = {tool["function"]["name"]: tool["function"].get("parameters") or {} for tool in tools}
+    for tool_call in tool_calls:
+        function = tool_call.get("function") or {}
+        if not tool_call.get("id") or not function.get("name"):
+            return "调用格式错误"
+        if function["name"] not in schemas:
+            return "未知工具"
+        try:
+            args = json.loads(function.get("arguments") or "{}")
+        except ValueError:
+            return "参数不是合法 JSON"
+        parameters = schemas[function["name"]]
+        properties = parameters.get("properties")
+        if (not isinstance(args, dict)
+                or any(name not in args for name in parameters.get("required", []))
+                or properties is not None and any(name not in properties for name in args)):
+            return "参数错误"
+    return None
+
+
+def log_router_summary(stats: RouterStats = None):
+    """输出各模型的延迟和各规则的升级率（没有启用级联时不输出）"""
+    stats = stats or router_stats
+    if CHEAP_MODEL or any(route != "default" for route in stats.routes):
+        logger.info(stats.report())
 
 
 # ==================== Agent 核心类 ====================
 class Agent:
-    def __init__(self, system: str = "", mcp_client: MCPClient = None):
+    def __init__(self, system: str = "", mcp_client: MCPClient = None, client: LLMClient = None,
+                 cache: CompletionCache = None, history: HistoryManager = None, tracer: Tracer = None,
+                 router: ModelRouter = None):
         self.system = system
         self.messages = []
         self.mcp_client = mcp_client
+        self.client = client or get_llm_client()
+        self.cache = cache if cache is not None else get_completion_cache()
+        self.history = history or HistoryManager()
+        self.tracer = tracer or get_tracer()
+        self.encoder = RequestEncoder()
+        self.router = router or ModelRouter(ROUTE_RULES)
+        self.last_usage = {}  # 最近一次请求的 token 用量（命中缓存时为空）
+        self.last_cached = False  # 最近一次请求是否命中响应缓存
+        self.last_model = None  # 最近一轮最终使用的模型
+        self.last_escalation = None  # 最近一轮小模型的失败原因（没有升级时为 None）
         if self.system:
             self.messages.append({"role": "system", "content": system})
     
@@ -116,18 +773,69 @@ class Agent:
         return result
     
     def execute(self) -> dict:
-        """调用大模型 API（使用 Function Calling）"""
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {API_KEY}"
-        }
-        
+        """调用大模型 API（使用 Function Calling；按路由规则先用小模型，校验失败再升级到大模型）"""
+        data = self._build_request()
+        route, models = self._route(data)
+        validate = self._reply_check(data)
+
+        def attempt(model: str, cascading: bool) -> dict:
+            data["model"] = model
+            return self._chat_cached(data, validate if cascading else None)
+
+        message, self.last_model, self.last_escalation = cascade(
+            self.router, route, models, attempt, validate, cached=lambda: self.last_cached)
+        return message
+
+    def _route(self, data: dict) -> tuple:
+        """按压缩后实际发送的历史选择模型"""
+        return self.router.route(data["messages"], self.encoder.message_bytes)
+
+    @staticmethod
+    def _reply_check(data: dict):
+        """小模型回复的校验函数：按本次请求的工具定义检查 tool_calls"""
+        return lambda message: validate_fc_message(message, data.get("tools") or [])
+
+    def _chat_cached(self, data: dict, check=None) -> dict:
+        """先查响应缓存，未命中再请求大模型（check(message) 返回错误信息时不写入缓存）"""
+        key = self.cache.make_key(data, self.encoder) if self.cache else None
+        body = self._encode(data)
+        with self._chat_span(data, body) as span:
+            message, response = chat_cached(self.cache, key, lambda: self.client.chat(data, body), check)
+            self.last_cached = response is None
+            return self._record_response(span, message, response and response.get("usage"), self.last_cached)
+
+    def _encode(self, data: dict) -> bytes:
+        """增量编码请求体，并丢弃本次没有用到的消息编码"""
+        body = self.encoder.encode(data)
+        self.encoder.release()
+        return body
+
+    @contextmanager
+    def _chat_span(self, data: dict, body: bytes):
+        """一次大模型请求的追踪区间"""
+        with self.tracer.span("llm.chat", model=data["model"], stream=data["stream"]) as span:
+            span.set(request_bytes=len(body))
+            yield span
+
+    def _record_response(self, span: Span, message: dict, usage: dict, cached: bool = False) -> dict:
+        """记录回复字节数和 token 用量"""
+        self.last_usage = usage or {}
+        span.set(cached=cached)
+        for key in ("prompt_tokens", "completion_tokens", "total_tokens"):
+            if key in self.last_usage:
+                span.set(**{key: self.last_usage[key]})
+        if self.tracer.enabled:
+            span.set(response_bytes=payload_bytes(message))
+        return message
+
+    def _build_request(self) -> dict:
+        """构造请求体"""
         # 从 MCP Client 获取工具定义
         tools = self.mcp_client.get_tools_schema() if self.mcp_client else []
         
         data = {
             "model": MODEL,
-            "messages": self.messages,
+            "messages": self.history.compact(self.messages, self.encoder.message_bytes),
             "temperature": 0,
             "stream": False
         }
@@ -136,9 +844,7 @@ class Agent:
             data["tools"] = tools
             data["tool_choice"] = "auto"
         
-        response = requests.post(API_URL, headers=headers, json=data, verify=False)
-        response.raise_for_status()
-        return response.json()["choices"][0]["message"]
+        return data
     
     def add_tool_result(self, tool_call_id: str, result: str):
         """添加工具执行结果到消息历史"""
@@ -149,6 +855,67 @@ class Agent:
         })
 
 
+class AsyncAgent(Agent):
+    """异步 Agent：等待大模型时让出事件循环，多个会话可以并发运行"""
+
+    def __init__(self, system: str = "", mcp_client: MCPClient = None,
+                 client: AsyncLLMClient = None, stream: bool = False, cache: CompletionCache = None,
+                 history: HistoryManager = None, tracer: Tracer = None, router: ModelRouter = None):
+        super().__init__(system, mcp_client, client=client or get_async_llm_client(),
+                         cache=cache, history=history, tracer=tracer, router=router)
+        self.stream = stream
+
+    async def ainvoke(self, message: str = "", on_delta=None, on_tool_call=None) -> dict:
+        """发送消息并获取回复（异步，流式模式下通过回调增量输出）"""
+        if message:
+            self.messages.append({"role": "user", "content": message})
+        result = await self.aexecute(on_delta, on_tool_call)
+        self.messages.append(result)
+        return result
+
+    async def aexecute(self, on_delta=None, on_tool_call=None) -> dict:
+        """调用大模型 API（异步，按路由规则先用小模型，校验失败再升级到大模型）"""
+        data = self._build_request()
+        if self.stream:
+            data["stream"] = True
+            data["stream_options"] = {"include_usage": True}
+        route, models = self._route(data)
+        validate = self._reply_check(data)
+
+        async def attempt(model: str, cascading: bool) -> dict:
+            data["model"] = model
+            if not self.stream:
+                return await self._achat_cached(data, validate if cascading else None)
+            # 小模型的流式输出先缓冲（不回调），校验通过后再回放，无效的工具调用不会被提前执行
+            if cascading:
+                return await self._astream(data)
+            return await self._astream(data, on_delta, on_tool_call)
+
+        replay = (lambda message: replay_message(message, on_delta, on_tool_call)) if self.stream else None
+        message, self.last_model, self.last_escalation = await acascade(
+            self.router, route, models, attempt, validate, replay, lambda: self.last_cached)
+        return message
+
+    async def _astream(self, data: dict, on_delta=None, on_tool_call=None) -> dict:
+        """流式请求一次模型，组装成完整的 assistant 消息"""
+        self.last_cached = False
+        body = self._encode(data)
+        with self._chat_span(data, body) as span:
+            assembler = StreamAssembler(on_delta, on_tool_call)
+            async for chunk in self.client.chat_stream(data, body):
+                assembler.feed(chunk)
+            return self._record_response(span, assembler.finish(), assembler.usage)
+
+    async def _achat_cached(self, data: dict, check=None) -> dict:
+        """先查响应缓存，未命中再请求大模型（异步，check(message) 返回错误信息时不写入缓存）"""
+        key = self.cache.make_key(data, self.encoder) if self.cache else None
+        body = self._encode(data)
+        with self._chat_span(data, body) as span:
+            message, response = await achat_cached(self.cache, key, lambda: self.client.chat(data, body), check)
+            self.last_cached = response is None
+            return self._record_response(span, message, response and response.get("usage"), self.last_cached)
+
+
 PROMPT = """
 你是一个智能程序员助手，可以帮助开发者完成各种编程任务。
 
@@ -156,6 +923,8 @@ PROMPT = """
 - generate_uuid: 生成 UUID
 - generate_hash: 生成哈希值 (MD5, SHA256 等)
 - base64_encode: Base64 编码
+- hash_file: 计算文件哈希（大文件请用它，传文件路径而不是文件内容）
+- base64_encode_file: 文件 Base64 编码，结果写入输出文件
 
 ## 重要规则
 1. 根据用户需求选择合适的工具
@@ -166,8 +935,43 @@ PROMPT = """
 """
 
 
+# ==================== 工具调度 ====================
+async def dispatch_tool_calls(mcp_client: MCPClient, calls: list,
+                              concurrency: int = TOOL_CONCURRENCY,
+                              timeout: float = TOOL_TIMEOUT) -> list:
+    """
+    并发执行同一条 assistant 消息中的多个工具调用
+    
+    Args:
+        mcp_client: MCP 客户端
+        calls: [(工具名, 参数字典), ...]，顺序与 tool_calls 一致
+        concurrency: 最大并发数
+        timeout: 单个工具的超时时间（秒）
+    
+    Returns:
+        与 calls 顺序一致的结果列表
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    with mcp_client.tracer.span("tool.dispatch", calls=len(calls)):
+        return await asyncio.gather(*(call_tool_limited(mcp_client, name, args, semaphore, timeout)
+                                      for name, args in calls))
+
+
+async def call_tool_limited(mcp_client: MCPClient, name: str, args: dict,
+                            semaphore: asyncio.Semaphore, timeout: float = TOOL_TIMEOUT) -> str:
+    """在并发上限和超时限制下调用单个 MCP 工具"""
+    if not isinstance(args, dict):
+        return f"❌ 参数错误: {name}: {INVALID_JSON if args is None else '参数必须是 JSON 对象'}"
+    async with semaphore:
+        try:
+            return await asyncio.wait_for(mcp_client.call_tool(name, args), timeout)
+        except asyncio.TimeoutError:
+            return f"❌ 工具调用超时: {name}"
+
+
 # ==================== 主查询函数 ====================
-async def query(question: str, mcp_client: MCPClient, max_turns: int = 10) -> str:
+async def query(question: str, mcp_client: MCPClient, max_turns: int = 10,
+                stream: bool = STREAM, agent: AsyncAgent = None, on_event=None) -> str:
     """
     执行查询
     
@@ -175,65 +979,152 @@ async def query(question: str, mcp_client: MCPClient, max_turns: int = 10) -> st
         question: 用户的需求
         mcp_client: MCP 客户端
         max_turns: 最大循环次数
+        stream: 是否使用流式输出（工具参数一完整就立即调用）
+        agent: 复用已有的 Agent（多轮会话保留上下文），默认新建
+        on_event: 过程事件回调（turn / delta / action / observation），用于把过程推送给调用方
     
     Returns:
         最终的回答
     """
-    agent = Agent(PROMPT, mcp_client)
-    next_prompt = question
+    if agent is None:
+        agent = AsyncAgent(PROMPT, mcp_client, stream=stream)
+    with agent.tracer.span("agent.query") as span:
+        for i in range(max_turns):
+            span.set(turns=i + 1)
+            with agent.tracer.span("agent.turn"):
+                answer = await run_turn(agent, mcp_client, question if i == 0 else "", i, stream,
+                                        on_event or (lambda event: None))
+            for key, value in agent.last_usage.items():
+                if key.endswith("_tokens") and isinstance(value, int):
+                    span.add(key, value)
+            if answer is not None:
+                return answer
     
-    for i in range(max_turns):
-        print(f"\n{'='*60}")
-        print(f"第 {i+1} 轮对话")
-        print(f"{'='*60}")
+    return "抱歉，处理超时，请重试。"
+
+
+async def run_turn(agent: AsyncAgent, mcp_client: MCPClient, prompt: str, i: int, stream: bool, emit):
+    """执行一轮：请求大模型，有工具调用时执行工具并返回 None，否则返回最终回答"""
+    verbose = logger.isEnabledFor(logging.INFO)
+    logger.info(f"\n{'='*60}\n第 {i+1} 轮对话\n{'='*60}")
+    emit({"type": "turn", "turn": i + 1})
+    
+    # 大模型思考（使用 Function Calling）
+    if stream:
+        # 流式模式：边生成边显示，工具调用参数完整后立即发起 MCP 调用
+        semaphore = asyncio.Semaphore(TOOL_CONCURRENCY)
+        submitted = {}
         
-        # 大模型思考（使用 Function Calling）
-        msg = agent.invoke(next_prompt)
-        content = msg.get("content", "").strip()
+        def on_tool_call(tool_call: dict, func_args: dict):
+            func_name = tool_call["function"]["name"]
+            args_str = ", ".join(f"{k}={repr(v)}" for k, v in func_args.items())
+            logger.info(f"\n🔧 Action: {func_name}({args_str})")
+            emit({"type": "action", "tool": func_name, "args": func_args})
+            submitted[tool_call["id"]] = asyncio.create_task(
+                call_tool_limited(mcp_client, func_name, func_args, semaphore))
         
-        # 检查是否有工具调用
-        if "tool_calls" in msg and msg["tool_calls"]:
-            if content:
-                print(f"\n💭 思考: {content}")
-            
-            for tool_call in msg["tool_calls"]:
-                func_name = tool_call["function"]["name"]
-                func_args = json.loads(tool_call["function"]["arguments"])
-                
-                # 显示工具调用
-                args_str = ", ".join(f"{k}={repr(v)}" for k, v in func_args.items())
-                print(f"\n🔧 Action: {func_name}({args_str})")
-                
-                # 通过 MCP 调用工具
-                result = await mcp_client.call_tool(func_name, func_args)
-                
-                # 显示结果
-                print(f"\n📋 Observation:\n{result}")
-                
-                # 将工具结果加入历史
-                agent.add_tool_result(tool_call["id"], result)
-            
-            next_prompt = ""
-        else:
-            # 没有工具调用，输出最终回答
-            print(f"\n{content}")
-            print(f"\n✅ 任务完成!")
-            return content
+        def on_delta(text: str):
+            if verbose:
+                print(text, end="", flush=True)
+            emit({"type": "delta", "content": text})
+        
+        msg = await agent.ainvoke(prompt, on_delta=on_delta, on_tool_call=on_tool_call)
+        if verbose:
+            print()
+    else:
+        msg = await agent.ainvoke(prompt)
+    content = (msg.get("content") or "").strip()
+    if agent.last_escalation:
+        logger.info(f"\n⤴️ 小模型失败（{agent.last_escalation}），已升级到 {agent.last_model}")
     
-    return "抱歉，处理超时，请重试。"
+    record = agent.history.records[-1]
+    if record["after"] != record["before"]:
+        logger.info(f"\n📦 历史压缩: {record['before']} → {record['after']} 字节")
+    
+    # 没有工具调用，输出最终回答
+    if not msg.get("tool_calls"):
+        if not stream:
+            logger.info(f"\n{content}")
+        logger.info(f"\n✅ 任务完成!")
+        return content
+    
+    tool_calls = msg["tool_calls"]
+    if stream:
+        for tc in tool_calls:
+            if tc["id"] not in submitted:  # 参数不是合法 JSON 对象时兜底调用，由 call_tool_limited 返回错误信息
+                func_args = parse_arguments(tc["function"]["arguments"])
+                submitted[tc["id"]] = asyncio.create_task(
+                    call_tool_limited(mcp_client, tc["function"]["name"], func_args, semaphore))
+        results = await asyncio.gather(*(submitted[tc["id"]] for tc in tool_calls))
+    else:
+        if content:
+            logger.info(f"\n💭 思考: {content}")
+        
+        calls = [(tc["function"]["name"], parse_arguments(tc["function"]["arguments"])) for tc in tool_calls]
+        
+        # 显示工具调用
+        for func_name, func_args in calls:
+            args_str = (", ".join(f"{k}={repr(v)}" for k, v in func_args.items())
+                        if isinstance(func_args, dict) else repr(func_args))
+            logger.info(f"\n🔧 Action: {func_name}({args_str})")
+            emit({"type": "action", "tool": func_name, "args": func_args})
+        
+        # 通过 MCP 并发调用工具，结果按原顺序返回
+        results = await dispatch_tool_calls(mcp_client, calls)
+    
+    for tool_call, result in zip(tool_calls, results):
+        # 显示结果
+        logger.info(f"\n📋 Observation:\n{result}")
+        emit({"type": "observation", "tool": tool_call["function"]["name"], "content": result})
+        
+        # 将工具结果加入历史
+        agent.add_tool_result(tool_call["id"], result)
+    return None
 
 
 # ==================== 交互式会话 ====================
-async def interactive_session():
-    """交互式会话"""
+class _DaemonThreadExecutor(concurrent.futures.Executor):
+    """
+    每次提交都在新的守护线程中执行，用于等待终端输入
+
+    不用默认线程池：退出时 asyncio.run 和解释器都会 join 线程池的线程，
+    阻塞在 input() 上的线程会让 Ctrl+C 之后还要再按一次回车才能退出
+    """
+
+    def submit(self, fn, *args, **kwargs):
+        future = concurrent.futures.Future()
+
+        def run():
+            if not future.set_running_or_notify_cancel():
+                return
+            try:
+                future.set_result(fn(*args, **kwargs))
+            except BaseException as e:
+                future.set_exception(e)
+        threading.Thread(target=run, daemon=True).start()
+        return future
+
+
+_stdin_executor = _DaemonThreadExecutor()
+
+
+async def ainput(prompt: str = "") -> str:
+    """在线程中等待终端输入，不阻塞事件循环（后台握手、MCP 连接保活等照常进行）"""
+    return await asyncio.get_running_loop().run_in_executor(_stdin_executor, input, prompt)
+
+
+async def interactive_session(keep_context: bool = KEEP_CONTEXT):
+    """交互式会话（keep_context 时多次输入共用一个 Agent，保留上下文）"""
     print("🤖 程序员助手（MCP 版）")
     print("="*60)
     print("输入你的需求，输入 'quit' 或 'exit' 退出")
+    if keep_context:
+        print("多轮模式：保留之前的对话上下文，输入 'reset' 开始新对话")
     print("="*60)
     
     # 连接 MCP Server
-    mcp_client = MCPClient()
-    await mcp_client.connect(MCP_SERVER_SCRIPT)
+    mcp_client = MCPClientPool(MCP_POOL_SIZE) if MCP_POOL_SIZE > 1 else MCPClient()
+    await mcp_client.connect(MCP_SERVER_URL or MCP_SERVER_SCRIPT)
     
     print("\n📦 可用工具列表:")
     for tool in mcp_client.tools:
@@ -242,22 +1133,38 @@ async def interactive_session():
         print(f"   • {tool.name}: {desc}")
     print()
     
+    def new_agent():
+        # 多轮模式下整个会话复用同一个 Agent，已消费的工具输出不再重复发送
+        return AsyncAgent(PROMPT, mcp_client, stream=STREAM, history=DropConsumedToolOutputs())
+    
+    agent = new_agent() if keep_context else None
+    
     try:
         while True:
             try:
-                user_input = input("\n👤 用户: ").strip()
+                user_input = (await ainput("\n👤 用户: ")).strip()
                 if not user_input:
                     continue
                 if user_input.lower() in ['quit', 'exit', 'q']:
                     print("👋 再见！")
                     break
+                if keep_context and user_input.lower() == 'reset':
+                    agent = new_agent()
+                    print("🧹 已清空上下文")
+                    continue
                 
-                await query(user_input, mcp_client)
+                # agent 为 None 时 query 为本次输入新建 Agent
+                await query(user_input, mcp_client, agent=agent)
                 
-            except KeyboardInterrupt:
+            except (KeyboardInterrupt, EOFError, asyncio.CancelledError):
+                # 等待输入时按 Ctrl+C，asyncio.run 会取消主任务（CancelledError）而不是抛出 KeyboardInterrupt
                 print("\n👋 再见！")
                 break
     finally:
+        log_trace_summary(get_tracer())
+        log_router_summary()
+        get_tracer().close()
+        await close_async_llm_client()
         await mcp_client.disconnect()
 
 
@@ -268,8 +1175,8 @@ async def demo():
     print("="*60)
     
     # 连接 MCP Server
-    mcp_client = MCPClient()
-    await mcp_client.connect(MCP_SERVER_SCRIPT)
+    mcp_client = MCPClientPool(MCP_POOL_SIZE) if MCP_POOL_SIZE > 1 else MCPClient()
+    await mcp_client.connect(MCP_SERVER_URL or MCP_SERVER_SCRIPT)
     
     print("\n📦 可用工具列表:")
     for tool in mcp_client.tools:
@@ -290,14 +1197,16 @@ async def demo():
             print(f"👤 用户: {demo_query}")
             await query(demo_query, mcp_client)
     finally:
+        log_trace_summary(get_tracer())
+        log_router_summary()
+        get_tracer().close()
+        await close_async_llm_client()
         await mcp_client.disconnect()
 
 
 # ==================== 主程序入口 ====================
 if __name__ == "__main__":
-    import sys
-    import urllib3
-    urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+    logging.basicConfig(level=LOG_LEVEL, format="%(message)s")
     
     if len(sys.argv) > 1 and sys.argv[1] == "--demo":
         asyncio.run(demo())
@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""
+agent_server 压测脚本
+
+    stub: 启动本地大模型桩服务（OpenAI 兼容接口，按 dev_agent.scripted_reply 的规则调用工具后回答）
+    run:  并发创建会话并发送消息，统计吞吐量、首个事件延迟和整体延迟
+
+用法：
+    python3 load_test.py stub --port 9000
+    LLM_API_URL=http://127.0.0.1:9000/v1/chat/completions python3 agent_server.py --port 8080
+    python3 load_test.py run --url http://127.0.0.1:8080 --sessions 200 --concurrency 50
+"""
+import os
+import sys
+import json
+import math
+import time
+import uuid
+import asyncio
+import argparse
+
+# common 包在仓库根目录
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+# ==================== 大模型桩服务 ====================
+def stub_usage(data: dict, message: dict) -> dict:
+    """按字节数粗略估算 token 用量"""
+    prompt_tokens = len(json.dumps(data["messages"], ensure_ascii=False)) // 4
+    completion_tokens = len(json.dumps(message, ensure_ascii=False)) // 4
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens}
+
+
+def stub_chunks(message: dict, usage: dict):
+    """把完整消息拆成 SSE 数据块，最后一块携带 token 用量"""
+    from common.offline import message_to_chunks
+    for chunk in message_to_chunks(message):
+        yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+    yield f"data: {json.dumps({'choices': [], 'usage': usage})}\n\n"
+    yield "data: [DONE]\n\n"
+
+
+def create_stub_app(latency: float = 0.0):
+    """创建桩服务，latency 模拟大模型的响应耗时（秒）"""
+    from starlette.applications import Starlette
+    from starlette.responses import JSONResponse, StreamingResponse
+    from starlette.routing import Route
+    from dev_agent import scripted_reply
+
+    async def chat_completions(request):
+        data = await request.json()
+        if latency:
+            await asyncio.sleep(latency)
+        message = scripted_reply(data["messages"])
+        usage = stub_usage(data, message)
+        if data.get("stream"):
+            return StreamingResponse(stub_chunks(message, usage), media_type="text/event-stream")
+        return JSONResponse({"choices": [{"index": 0, "message": message}], "usage": usage})
+
+    return Starlette(routes=[Route("/v1/chat/completions", chat_completions, methods=["POST"])])
+
+
+# ==================== 压测 ====================
+def percentile(sorted_values: list, p: float) -> float:
+    """最近秩法计算百分位数"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+async def run_session(client, url: str, messages: int, stats: dict):
+    """一个模拟用户：创建会话，依次发送若干消息，结束后删除会话"""
+    response = await client.post(f"{url}/sessions")
+    if response.status_code != 201:
+        stats["rejected"] += 1
+        return
+    session_id = response.json()["session_id"]
+    for _ in range(messages):
+        start = time.perf_counter()
+        first_event = None
+        async with client.stream("POST", f"{url}/sessions/{session_id}/messages",
+                                 json={"message": f"帮我生成一个 UUID（#{uuid.uuid4().hex[:6]}）"}) as response:
+            if response.status_code != 200:
+                stats["rejected"] += 1
+                continue
+            async for line in response.aiter_lines():
+                if not line:
+                    continue
+                if first_event is None:
+                    first_event = time.perf_counter() - start
+                if json.loads(line)["type"] == "error":
+                    stats["errors"] += 1
+        stats["latencies"].append(time.perf_counter() - start)
+        stats["first_event"].append(first_event or 0.0)
+    await client.delete(f"{url}/sessions/{session_id}")
+
+
+async def run_load(url: str, sessions: int, concurrency: int, messages: int) -> dict:
+    """以 concurrency 个并发用户跑完 sessions 个会话"""
+    import httpx
+    stats = {"latencies": [], "first_event": [], "rejected": 0, "errors": 0}
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(limits=limits, timeout=120) as client:
+        async def limited():
+            async with semaphore:
+                await run_session(client, url, messages, stats)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(limited() for _ in range(sessions)))
+        elapsed = time.perf_counter() - start
+        server_stats = (await client.get(f"{url}/stats")).json()
+
+    latencies = sorted(stats["latencies"])
+    first_event = sorted(stats["first_event"])
+    return {
+        "messages": len(latencies),
+        "rejected": stats["rejected"],
+        "errors": stats["errors"],
+        "elapsed": elapsed,
+        "throughput": len(latencies) / elapsed if elapsed else 0.0,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "first_event_p50": percentile(first_event, 50),
+        "server": server_stats,
+    }
+
+
+# ==================== 主程序入口 ====================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="agent_server 压测")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    stub = commands.add_parser("stub", help="启动大模型桩服务")
+    stub.add_argument("--host", default="127.0.0.1")
+    stub.add_argument("--port", type=int, default=9000)
+    stub.add_argument("--latency", type=float, default=0.05, help="模拟的大模型响应耗时（秒）")
+
+    run = commands.add_parser("run", help="对 agent_server 发起压测")
+    run.add_argument("--url", default="http://127.0.0.1:8080")
+    run.add_argument("--sessions", type=int, default=200, help="会话总数")
+    run.add_argument("--concurrency", type=int, default=50, help="并发用户数")
+    run.add_argument("--messages", type=int, default=2, help="每个会话发送的消息数")
+
+    args = parser.parse_args()
+    if args.command == "stub":
+        import uvicorn
+        uvicorn.run(create_stub_app(args.latency), host=args.host, port=args.port, log_level="warning")
+    else:
+        result = asyncio.run(run_load(args.url, args.sessions, args.concurrency, args.messages))
+        print("=" * 50)
+        print(f"消息数: {result['messages']}  拒绝: {result['rejected']}  错误: {result['errors']}")
+        print(f"耗时: {result['elapsed']:.2f}s  吞吐量: {result['throughput']:.2f} 条/秒")
+        print(f"延迟 p50: {result['p50']*1000:.1f}ms  p95: {result['p95']*1000:.1f}ms  "
+              f"p99: {result['p99']*1000:.1f}ms  首个事件 p50: {result['first_event_p50']*1000:.1f}ms")
+        server = result["server"]
+        print(f"服务端: 会话 {server['sessions']}  回收 {server['evicted']}  拒绝 {server['rejected']}")
@@ -1,19 +1,124 @@
 # -*- coding: utf-8 -*-
 """
 程序员助手 MCP Server
-使用 FastMCP 提供实用的开发者工具（精简版：3 个核心工具）
+使用 FastMCP 提供实用的开发者工具（3 个核心工具 + 2 个大文件工具）
 """
+import os
+import sys
+import asyncio
 import hashlib
 import base64
 import uuid
+import functools
+import tempfile
 from fastmcp import FastMCP
+from fastmcp.exceptions import ToolError
 
 # 创建 MCP 服务器实例
 mcp = FastMCP(name="DevToolsServer")
 
+# HTTP 传输的路径
+HTTP_PATH = "/mcp"
+
+# 支持的哈希算法
+HASH_ALGORITHMS = {
+    'md5': hashlib.md5,
+    'sha1': hashlib.sha1,
+    'sha256': hashlib.sha256,
+    'sha512': hashlib.sha512
+}
+
+# CPU 密集型工具的执行方式：thread（hashlib 处理大数据时会释放 GIL）/ process / inline
+TOOL_EXECUTOR = os.environ.get("MCP_TOOL_EXECUTOR", "thread")
+TOOL_WORKERS = int(os.environ.get("MCP_TOOL_WORKERS", os.cpu_count() or 4))
+# 排队上限：在途任务超过 TOOL_WORKERS + TOOL_QUEUE_DEPTH 时直接拒绝，向客户端施加背压
+TOOL_QUEUE_DEPTH = int(os.environ.get("MCP_TOOL_QUEUE_DEPTH", 32))
+# 大负载（文件工具，或文本参数超过 LARGE_PAYLOAD_BYTES）走独立的执行池和排队上限，
+# 大文件哈希占满时小调用不会排在后面，也不会被“服务繁忙”拒绝
+LARGE_PAYLOAD_BYTES = int(os.environ.get("MCP_LARGE_PAYLOAD_BYTES", 1024 * 1024))
+LARGE_TOOL_WORKERS = int(os.environ.get("MCP_LARGE_TOOL_WORKERS", max(1, TOOL_WORKERS // 2)))
+LARGE_QUEUE_DEPTH = int(os.environ.get("MCP_LARGE_QUEUE_DEPTH", 4))
+
+# 大文件分块大小（base64 分块必须是 3 的倍数，保证各块编码后可直接拼接）
+CHUNK_SIZE = 3 * 1024 * 1024
+# 文件工具只能读写该目录下的文件（默认 Server 启动时的当前目录），路径按真实路径解析，符号链接也不能跳出
+FILE_BASE_DIR = os.path.realpath(os.environ.get("MCP_FILE_BASE_DIR", os.getcwd()))
+
+
+# ==================== CPU 密集型工具卸载 ====================
+# 被 @cpu_bound 标记的工具在线程池 / 进程池中执行，不阻塞 Server 的事件循环
+_CPU_BOUND = {}
+
+
+def _run_registered(name: str, args: tuple, kwargs: dict):
+    """在工作线程 / 进程中按名字执行原始函数（进程池中按名字查找，避免序列化工具对象）"""
+    return _CPU_BOUND[name](*args, **kwargs)
+
+
+class _Lane:
+    """一条执行通道：独立的执行池和在途上限"""
+
+    def __init__(self, name: str, workers: int, queue_depth: int):
+        self.name = name
+        self.workers = workers
+        self.limit = workers + queue_depth
+        self.in_flight = 0
+        self._executor = None
+
+    def executor(self):
+        if self._executor is None:
+            if TOOL_EXECUTOR == "process":
+                import multiprocessing
+                from concurrent.futures import ProcessPoolExecutor
+                # 用 spawn 启动工作进程：stdio 模式下 fork 会继承读 stdin 线程持有的锁，工作进程卡死
+                self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                     mp_context=multiprocessing.get_context("spawn"))
+            else:
+                from concurrent.futures import ThreadPoolExecutor
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=self.name)
+        return self._executor
+
+
+_small_lane = _Lane("tool", TOOL_WORKERS, TOOL_QUEUE_DEPTH)
+_large_lane = _Lane("tool-large", LARGE_TOOL_WORKERS, LARGE_QUEUE_DEPTH)
+
+
+def _payload_bytes(args: tuple, kwargs: dict) -> int:
+    """文本参数的总长度，用于区分大小负载"""
+    return sum(len(v) for v in (*args, *kwargs.values()) if isinstance(v, (str, bytes)))
+
+
+def cpu_bound(fn=None, *, large: bool = False):
+    """
+    把同步工具包装成异步工具，在执行池中运行，并限制排队深度
+
+    large=True 的工具（如按路径读文件）总是走大负载通道；其他工具按参数长度分流。
+    排满时抛出 ToolError：客户端收到 isError=True 的结果，不会把拒绝当作正常结果缓存
+    """
+    if fn is None:
+        return functools.partial(cpu_bound, large=large)
+    _CPU_BOUND[fn.__name__] = fn
+    if TOOL_EXECUTOR == "inline":
+        return fn
+
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        lane = _large_lane if large or _payload_bytes(args, kwargs) >= LARGE_PAYLOAD_BYTES else _small_lane
+        if lane.in_flight >= lane.limit:
+            raise ToolError("服务繁忙，请稍后重试")
+        lane.in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            call = functools.partial(_run_registered, fn.__name__, args, kwargs)
+            return await loop.run_in_executor(lane.executor(), call)
+        finally:
+            lane.in_flight -= 1
+    return wrapper
+
 
 # ==================== 工具 1：生成 UUID ====================
-@mcp.tool()
+# 每次结果都不同，客户端不能缓存
+@mcp.tool(annotations={"readOnlyHint": True, "idempotentHint": False})
 def generate_uuid(version: int = 4) -> str:
     """
     生成 UUID
@@ -32,7 +137,9 @@ def generate_uuid(version: int = 4) -> str:
 
 
 # ==================== 工具 2：生成哈希 ====================
-@mcp.tool()
+# 纯函数：相同参数结果相同，客户端可缓存
+@mcp.tool(annotations={"readOnlyHint": True, "idempotentHint": True})
+@cpu_bound
 def generate_hash(text: str, algorithm: str = "md5") -> str:
     """
     生成哈希值
@@ -42,23 +149,19 @@ def generate_hash(text: str, algorithm: str = "md5") -> str:
         algorithm: 算法 (md5, sha1, sha256, sha512)，默认 md5
     """
     try:
-        algorithms = {
-            'md5': hashlib.md5,
-            'sha1': hashlib.sha1,
-            'sha256': hashlib.sha256,
-            'sha512': hashlib.sha512
-        }
-        if algorithm not in algorithms:
-            return f"❌ 不支持的算法: {algorithm}，可选: {', '.join(algorithms.keys())}"
+        if algorithm not in HASH_ALGORITHMS:
+            return f"❌ 不支持的算法: {algorithm}，可选: {', '.join(HASH_ALGORITHMS.keys())}"
         
-        hash_obj = algorithms[algorithm](text.encode('utf-8'))
+        hash_obj = HASH_ALGORITHMS[algorithm](text.encode('utf-8'))
         return f"🔑 {algorithm.upper()} 哈希值:\n{hash_obj.hexdigest()}"
     except Exception as e:
         return f"❌ 哈希失败: {str(e)}"
 
 
 # ==================== 工具 3：Base64 编码 ====================
-@mcp.tool()
+# 纯函数：相同参数结果相同，客户端可缓存
+@mcp.tool(annotations={"readOnlyHint": True, "idempotentHint": True})
+@cpu_bound
 def base64_encode(text: str) -> str:
     """
     Base64 编码
@@ -73,13 +176,131 @@ def base64_encode(text: str) -> str:
         return f"❌ 编码失败: {str(e)}"
 
 
+# ==================== 工具 4：文件哈希（大文件）====================
+def _resolve_path(path: str) -> str:
+    """把相对 FILE_BASE_DIR 的路径解析为真实路径，不在该目录下时抛出 PermissionError"""
+    resolved = os.path.realpath(os.path.join(FILE_BASE_DIR, path))
+    if os.path.commonpath([FILE_BASE_DIR, resolved]) != FILE_BASE_DIR:
+        raise PermissionError(f"路径不在允许的目录内: {path}")
+    return resolved
+
+
+def _iter_file_chunks(path: str):
+    """用 mmap 按块读取文件，内存占用与文件大小无关"""
+    import mmap
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for offset in range(0, size, CHUNK_SIZE):
+                yield mm[offset:offset + CHUNK_SIZE]
+
+
+@mcp.tool(annotations={"readOnlyHint": True})
+@cpu_bound(large=True)
+def hash_file(path: str, algorithm: str = "sha256") -> dict:
+    """
+    计算文件哈希值（适合大文件，分块计算，内存占用固定）
+    
+    Args:
+        path: 文件路径（相对于 Server 的文件目录）
+        algorithm: 算法 (md5, sha1, sha256, sha512)，默认 sha256
+    """
+    if algorithm not in HASH_ALGORITHMS:
+        return {"error": f"不支持的算法: {algorithm}，可选: {', '.join(HASH_ALGORITHMS.keys())}"}
+    try:
+        hash_obj = HASH_ALGORITHMS[algorithm]()
+        size = 0
+        for chunk in _iter_file_chunks(_resolve_path(path)):
+            hash_obj.update(chunk)
+            size += len(chunk)
+        return {"path": path, "algorithm": algorithm, "bytes": size, "digest": hash_obj.hexdigest()}
+    except OSError as e:
+        return {"error": f"读取失败: {str(e)}"}
+
+
+# ==================== 工具 5：文件 Base64 编码（大文件）====================
+# 会创建或覆盖输出文件
+@mcp.tool(annotations={"readOnlyHint": False, "destructiveHint": True})
+@cpu_bound(large=True)
+def base64_encode_file(path: str, output_path: str = "") -> dict:
+    """
+    对文件进行 Base64 编码（适合大文件，分块编码后写入输出文件，不返回全文）
+    
+    Args:
+        path: 输入文件路径（相对于 Server 的文件目录）
+        output_path: 输出文件路径，默认为 输入文件路径 + ".b64"；已存在时会被覆盖
+    """
+    output_path = output_path or path + ".b64"
+    try:
+        input_path, output_path = _resolve_path(path), _resolve_path(output_path)
+        if input_path == output_path:
+            return {"error": "输出文件不能与输入文件相同"}
+        input_bytes = output_bytes = 0
+        # 先写同目录下的临时文件，完成后再替换输出文件：输入不存在或中途出错时不会清空已有的输出文件
+        fd, temp_path = tempfile.mkstemp(prefix=".b64-", dir=os.path.dirname(output_path))
+        try:
+            with os.fdopen(fd, "wb") as out:
+                for chunk in _iter_file_chunks(input_path):
+                    encoded = base64.b64encode(chunk)
+                    out.write(encoded)
+                    input_bytes += len(chunk)
+                    output_bytes += len(encoded)
+            os.replace(temp_path, output_path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+        return {"path": path, "output_path": output_path,
+                "input_bytes": input_bytes, "output_bytes": output_bytes}
+    except OSError as e:
+        return {"error": f"编码失败: {str(e)}"}
+
+
+# ==================== HTTP 传输 ====================
+def create_app():
+    """
+    创建 Streamable HTTP 的 ASGI 应用（供 uvicorn 多进程启动）
+
+    多进程时请求可能落到任意进程，因此使用无状态模式，不依赖进程内会话
+    """
+    return mcp.http_app(path=HTTP_PATH, stateless_http=True)
+
+
+def run_http(host: str, port: int, workers: int):
+    """以 HTTP 方式启动，一台机器上的多个 Agent 进程共享同一个 Server"""
+    if workers <= 1:
+        mcp.run(transport="http", host=host, port=port, path=HTTP_PATH)
+        return
+    import uvicorn
+    uvicorn.run("mcp_server:create_app", factory=True, host=host, port=port,
+                workers=workers, app_dir=os.path.dirname(os.path.abspath(__file__)))
+
+
 # ==================== 主程序入口 ====================
 if __name__ == "__main__":
-    print("🚀 启动程序员助手 MCP Server...")
-    print(f"📦 服务名称: {mcp.name}")
-    print("🔧 可用工具:")
-    print("   - generate_uuid: 生成 UUID")
-    print("   - generate_hash: 生成哈希值")
-    print("   - base64_encode: Base64 编码")
-    print("="*50)
-    mcp.run()
+    import argparse
+    parser = argparse.ArgumentParser(description="程序员助手 MCP Server")
+    parser.add_argument("--http", action="store_true", help="使用 Streamable HTTP 传输（默认 stdio）")
+    parser.add_argument("--host", default="127.0.0.1", help="HTTP 监听地址")
+    parser.add_argument("--port", type=int, default=8765, help="HTTP 监听端口")
+    parser.add_argument("--workers", type=int, default=1, help="HTTP 工作进程数")
+    args = parser.parse_args()
+
+    if args.http:
+        print(f"🚀 启动程序员助手 MCP Server（HTTP）: http://{args.host}:{args.port}{HTTP_PATH}，"
+              f"{args.workers} 个工作进程")
+        run_http(args.host, args.port, args.workers)
+    else:
+        # stdio 模式下 stdout 是协议通道，启动信息只能写到 stderr
+        # （缓冲在 stdout 中的文本会在进程池启动工作进程时被刷出，客户端无法解析）
+        print("🚀 启动程序员助手 MCP Server...", file=sys.stderr)
+        print(f"📦 服务名称: {mcp.name}", file=sys.stderr)
+        print("🔧 可用工具:", file=sys.stderr)
+        print("   - generate_uuid: 生成 UUID", file=sys.stderr)
+        print("   - generate_hash: 生成哈希值", file=sys.stderr)
+        print("   - base64_encode: Base64 编码", file=sys.stderr)
+        print("   - hash_file: 文件哈希（大文件）", file=sys.stderr)
+        print("   - base64_encode_file: 文件 Base64 编码（大文件）", file=sys.stderr)
+        print("="*50, file=sys.stderr)
+        mcp.run()
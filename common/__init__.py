@@ -0,0 +1,12 @@
+"""
+各章共用的基础设施
+
+- llm: 大模型 HTTP 客户端（同步 / 异步）和流式响应组装
+- offline: 录制 / 回放 / 脚本模型
+- encoding: 请求体的紧凑编码和增量编码
+- cache: 响应缓存（内存 LRU / SQLite）
+- router: 模型级联（小模型优先、失败升级）
+- tracing: 追踪（Span 计时和 JSONL / 直方图 / OpenTelemetry 输出）
+- tools: 工具注册表（JSON Schema 生成和参数校验）
+- menu / fast_path / expression: 点餐示例的菜单目录、快速通道和安全表达式计算
+"""
@@ -0,0 +1,159 @@
+"""
+响应缓存：temperature=0 时相同请求得到相同回复，按请求的规范化哈希缓存 assistant 消息
+"""
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+from common.encoding import RequestEncoder
+
+# ==================== 配置 ====================
+CACHE_BACKEND = os.environ.get("LLM_CACHE_BACKEND", "memory")  # memory / sqlite / none
+CACHE_SIZE = 1024  # 最大缓存条数
+CACHE_TTL = 24 * 3600  # 缓存有效期（秒），仅 sqlite 后端
+CACHE_PATH = os.environ.get("LLM_CACHE_PATH", ".llm_cache.sqlite")  # 相对路径按当前目录（即所在章节目录）
+
+
+# ==================== 响应缓存 ====================
+class CompletionCache:
+    """补全缓存基类：按 (model, messages, tools, tool_choice, stop, max_tokens) 的规范化哈希缓存 assistant 消息"""
+
+    KEY_FIELDS = ("model", "messages", "tools", "tool_choice")
+    GENERATION_FIELDS = ("stop", "max_tokens")  # 只在设置时参与哈希，未设置时与原来的键一致
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(data: dict, encoder: RequestEncoder = None) -> str:
+        """计算请求的规范化哈希（传入 encoder 时复用已缓存的消息编码）"""
+        generation = tuple(k for k in CompletionCache.GENERATION_FIELDS if data.get(k) is not None)
+        if encoder is not None:
+            return hashlib.sha256(encoder.encode(data, CompletionCache.KEY_FIELDS + generation)).hexdigest()
+        key = {k: data.get(k) for k in CompletionCache.KEY_FIELDS}
+        key.update({k: data[k] for k in generation})
+        canonical = json.dumps(key, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def stats(self) -> dict:
+        """命中 / 未命中 / 淘汰计数"""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    def get(self, key: str):
+        raise NotImplementedError
+
+    def set(self, key: str, message: dict):
+        raise NotImplementedError
+
+
+class LRUCompletionCache(CompletionCache):
+    """内存 LRU 缓存"""
+
+    def __init__(self, max_size: int = CACHE_SIZE):
+        super().__init__()
+        self.max_size = max_size
+        self._data = OrderedDict()
+
+    def get(self, key: str):
+        with self._lock:
+            value = self._data.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+        return json.loads(value)
+
+    def set(self, key: str, message: dict):
+        value = json.dumps(message, ensure_ascii=False)
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+
+class SQLiteCompletionCache(CompletionCache):
+    """磁盘 SQLite 缓存：支持 TTL 过期和按条数淘汰（最久未访问优先）"""
+
+    def __init__(self, path: str = CACHE_PATH, max_size: int = CACHE_SIZE, ttl: float = CACHE_TTL):
+        import sqlite3
+        super().__init__()
+        self.max_size = max_size
+        self.ttl = ttl
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS completions "
+            "(key TEXT PRIMARY KEY, value TEXT, created REAL, accessed REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_accessed ON completions (accessed)")
+        self._conn.commit()
+
+    def get(self, key: str):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created FROM completions WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and now - row[1] > self.ttl:
+                self._conn.execute("DELETE FROM completions WHERE key = ?", (key,))
+                self._conn.commit()
+                self.evictions += 1
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE completions SET accessed = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, key: str, message: dict):
+        now = time.time()
+        value = json.dumps(message, ensure_ascii=False)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO completions (key, value, created, accessed) VALUES (?, ?, ?, ?)",
+                (key, value, now, now)
+            )
+            expired = self._conn.execute(
+                "DELETE FROM completions WHERE created < ?", (now - self.ttl,)
+            ).rowcount
+            overflow = self._conn.execute("SELECT COUNT(*) FROM completions").fetchone()[0] - self.max_size
+            if overflow > 0:
+                self._conn.execute(
+                    "DELETE FROM completions WHERE key IN "
+                    "(SELECT key FROM completions ORDER BY accessed LIMIT ?)", (overflow,)
+                )
+            self._conn.commit()
+            self.evictions += expired + max(overflow, 0)
+
+
+_completion_cache = None
+_completion_cache_lock = threading.Lock()
+
+
+def get_completion_cache():
+    """获取进程内共享的补全缓存（由 CACHE_BACKEND 决定，"none" 时返回 None）"""
+    global _completion_cache
+    if _completion_cache is None and CACHE_BACKEND != "none":
+        with _completion_cache_lock:
+            if _completion_cache is None:
+                if CACHE_BACKEND == "sqlite":
+                    _completion_cache = SQLiteCompletionCache()
+                else:
+                    _completion_cache = LRUCompletionCache()
+    return _completion_cache
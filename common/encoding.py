@@ -0,0 +1,80 @@
+"""
+请求序列化：紧凑 JSON 编码（可选 orjson）和按消息缓存的增量请求体编码
+"""
+import json
+
+_orjson = None  # 可选依赖，首次编码时探测：None 未探测 / False 未安装
+
+
+def dumps_compact(obj) -> bytes:
+    """编码为紧凑的 UTF-8 JSON 字节（安装了 orjson 时自动使用）"""
+    global _orjson
+    if _orjson is None:
+        try:
+            import orjson as _orjson
+        except ImportError:
+            _orjson = False
+    if _orjson:
+        return _orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class RequestEncoder:
+    """
+    增量序列化请求体：tools 等静态字段和每条消息只编码一次并按对象缓存，
+    每次请求只拼接缓存的字节，不再随历史增长重复序列化整个对话
+
+    消息加入历史后不能原地修改（需要修改时替换为新的 dict）
+    """
+
+    def __init__(self):
+        self._cache = {}  # id(对象) -> (对象, 编码后的字节)
+        self._used = set()  # 本次请求用到的对象
+        self.hits = 0
+        self.misses = 0
+
+    def _encode_cached(self, obj) -> bytes:
+        key = id(obj)
+        self._used.add(key)
+        entry = self._cache.get(key)
+        if entry is not None and entry[0] is obj:
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        encoded = dumps_compact(obj)
+        self._cache[key] = (obj, encoded)
+        return encoded
+
+    def message_bytes(self, messages: list) -> int:
+        """消息列表编码后的字节数（复用缓存，可直接替代 message_bytes）"""
+        return sum(len(self._encode_cached(m)) for m in messages) + max(len(messages) - 1, 0) + 2
+
+    def encode(self, data: dict, fields: tuple = None) -> bytes:
+        """编码请求体；指定 fields 时只编码这些字段（用于计算缓存键）"""
+        parts = []
+        for key in fields or data:
+            value = data.get(key)
+            if key == "messages":
+                encoded = b"[" + b",".join(self._encode_cached(m) for m in value) + b"]"
+            elif isinstance(value, (list, dict)):
+                encoded = self._encode_cached(value)
+            else:
+                encoded = dumps_compact(value)
+            parts.append(dumps_compact(key) + b":" + encoded)
+        return b"{" + b",".join(parts) + b"}"
+
+    def release(self):
+        """请求发出后调用：丢弃本次没有用到的缓存（已被裁剪或压缩掉的消息）"""
+        self._cache = {key: entry for key, entry in self._cache.items() if key in self._used}
+        self._used = set()
+
+
+def message_bytes(messages: list) -> int:
+    """消息列表序列化后的字节数（近似请求体大小）"""
+    return len(json.dumps(messages, ensure_ascii=False).encode("utf-8"))
+
+
+def json_backend() -> str:
+    """当前使用的 JSON 编码库：orjson 或 json"""
+    dumps_compact(None)
+    return "orjson" if _orjson else "json"
@@ -0,0 +1,78 @@
+"""
+安全表达式计算：只允许数字和 + - * / ** 运算，用 Decimal 做金额计算，替代 eval
+"""
+import ast
+import decimal
+import operator
+import functools
+from decimal import Decimal
+
+# ==================== 配置 ====================
+MAX_EXPRESSION_LENGTH = 200  # 表达式最大长度
+MAX_EXPRESSION_DEPTH = 30  # 语法树最大嵌套深度
+MAX_EXPONENT = 10  # 乘方指数上限，防止 9**9**9 之类耗尽 CPU
+
+# ==================== 求值 ====================
+_MONEY_CONTEXT = decimal.Context(prec=28, Emax=999, Emin=-999,
+                                 traps=[decimal.InvalidOperation, decimal.DivisionByZero, decimal.Overflow])
+_BIN_OPS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.Pow: operator.pow,
+}
+_UNARY_OPS = {
+    ast.UAdd: operator.pos,
+    ast.USub: operator.neg,
+}
+_NORMALIZE = str.maketrans({"×": "*", "÷": "/", "（": "(", "）": ")", "＋": "+", "－": "-"})
+
+
+def _eval_node(node, depth: int = 0) -> Decimal:
+    """递归求值白名单内的语法树节点"""
+    if depth > MAX_EXPRESSION_DEPTH:
+        raise ValueError("表达式嵌套过深")
+    if isinstance(node, ast.Constant) and type(node.value) in (int, float):
+        return Decimal(str(node.value))
+    if isinstance(node, ast.UnaryOp) and type(node.op) in _UNARY_OPS:
+        return _UNARY_OPS[type(node.op)](_eval_node(node.operand, depth + 1))
+    if isinstance(node, ast.BinOp) and type(node.op) in _BIN_OPS:
+        left = _eval_node(node.left, depth + 1)
+        right = _eval_node(node.right, depth + 1)
+        if isinstance(node.op, ast.Pow) and (right != right.to_integral_value() or abs(right) > MAX_EXPONENT):
+            raise ValueError(f"指数必须是不超过 {MAX_EXPONENT} 的整数")
+        return _BIN_OPS[type(node.op)](left, right)
+    raise ValueError(f"不支持的表达式: {type(node).__name__}")
+
+
+@functools.lru_cache(maxsize=1024)
+def evaluate_expression(expression: str) -> Decimal:
+    """解析并计算算术表达式（结果按表达式缓存）"""
+    # 先检查长度再规范化：超长输入不做任何复制和解析
+    if len(expression) > MAX_EXPRESSION_LENGTH:
+        raise ValueError(f"表达式过长（超过 {MAX_EXPRESSION_LENGTH} 个字符）")
+    expression = expression.translate(_NORMALIZE).strip()
+    tree = ast.parse(expression, mode="eval")
+    with decimal.localcontext(_MONEY_CONTEXT):
+        return _eval_node(tree.body)
+
+
+def format_money(value: Decimal) -> str:
+    """金额保留两位小数，去掉多余的 0"""
+    value = value.quantize(Decimal("0.01"), rounding=decimal.ROUND_HALF_UP)
+    if value == value.to_integral_value():
+        return str(value.to_integral_value())
+    return format(value.normalize(), "f")
+
+
+def calculate(expression: str) -> str:
+    """计算数学表达式"""
+    try:
+        return f"{format_money(evaluate_expression(expression))}元"
+    except ZeroDivisionError:
+        return "计算错误: 除数不能为 0"
+    except ArithmeticError:
+        return "计算错误: 数值超出范围"
+    except (SyntaxError, ValueError) as e:
+        return f"计算错误: {str(e)}"
@@ -0,0 +1,129 @@
+"""
+快速通道：形如 "我要2份汉堡和1杯可乐" 的订单直接在本地解析计价，解析不了再交给 Agent
+"""
+import re
+import threading
+
+from common.menu import get_menu_catalog
+
+_CN_DIGITS = {"零": 0, "一": 1, "二": 2, "两": 2, "三": 3, "四": 4,
+              "五": 5, "六": 6, "七": 7, "八": 8, "九": 9}
+_CN_UNITS = {"十": 10, "百": 100}
+_QTY = r'(?P<qty>\d+|[零一二两三四五六七八九十百]+)?\s*(?:份|杯|个|只|块|盒|瓶|碗|包|串|对)?'
+_LEAD = r'(?:我要|我想要|我想点|请给我|给我|帮我点|还要|再来|再要|要|来|点)?'
+_FIRST_SEGMENT_RE = re.compile(rf'^\s*{_LEAD}\s*{_QTY}\s*$')
+_NEXT_SEGMENT_RE = re.compile(rf'^\s*(?:和|跟|与|加|以及|还有|[、，,；;+])+\s*{_LEAD}\s*{_QTY}\s*$')
+_TAIL_RE = re.compile(r'^[\s。！!~.，,]*(?:谢谢|吧|就这些)?[\s。！!~.]*$')
+
+
+def parse_quantity(text: str) -> int:
+    """解析数量，支持阿拉伯数字和中文数字（如 两、十二、一百零五）"""
+    if not text:
+        return 1
+    if text.isdigit():
+        return int(text)
+    total, current = 0, 0
+    for ch in text:
+        if ch in _CN_DIGITS:
+            current = _CN_DIGITS[ch]
+        else:
+            total += (current or 1) * _CN_UNITS[ch]
+            current = 0
+    return total + current
+
+
+def parse_order(text: str):
+    """
+    把订单解析为 [(菜品, 数量), ...]
+
+    只要有任何一段文字无法识别就返回 None，交给 Agent 处理
+    """
+    catalog = get_menu_catalog()
+    items, pos, i = [], 0, 0
+    while i < len(text):
+        # 在菜单目录中做最长匹配
+        match = catalog.longest_match(text, i)
+        if match is None:
+            i += 1
+            continue
+        segment_re = _NEXT_SEGMENT_RE if items else _FIRST_SEGMENT_RE
+        m = segment_re.match(text[pos:i])
+        if not m:
+            return None
+        quantity = parse_quantity(m.group("qty"))
+        if quantity <= 0:
+            return None
+        items.append((match[0], quantity))
+        pos = i = match[1]
+    if not items or not _TAIL_RE.match(text[pos:]):
+        return None
+    return items
+
+
+def try_fast_path(question: str):
+    """能完整解析的订单直接在本地计价，返回 Answer；否则返回 None"""
+    items = parse_order(question)
+    if items is None:
+        return None
+    quantities = {}
+    for name, quantity in items:
+        quantities[name] = quantities.get(name, 0) + quantity
+    catalog = get_menu_catalog()
+    prices = {name: catalog.price(name) for name in quantities}
+    if None in prices.values():  # 解析后菜单刚好热更新，交给 Agent 处理
+        return None
+    lines = [f"{name}x{quantity}={prices[name] * quantity}元" for name, quantity in quantities.items()]
+    total = sum(prices[name] * quantity for name, quantity in quantities.items())
+    return f"Answer: 您的订单：{'，'.join(lines)}，总计{total}元"
+
+
+class FastPathStats:
+    """快速通道统计：命中率，以及按未命中订单平均耗时估算的节省延迟"""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.fast_time = 0.0
+        self.agent_time = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, hit: bool, elapsed: float):
+        with self._lock:
+            if hit:
+                self.hits += 1
+                self.fast_time += elapsed
+            else:
+                self.misses += 1
+                self.agent_time += elapsed
+
+    def summary(self) -> dict:
+        total = self.hits + self.misses
+        avg_agent = self.agent_time / self.misses if self.misses else 0.0
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "avg_fast_ms": self.fast_time / self.hits * 1000 if self.hits else 0.0,
+            "avg_agent_ms": avg_agent * 1000,
+            "saved_seconds": max(self.hits * avg_agent - self.fast_time, 0.0),
+        }
+
+
+fast_path_stats = FastPathStats()
+
+
+def extract_order_items(text: str) -> list:
+    """脚本模型的宽松点单识别：先用快速通道解析，失败时找出提到的菜品（数量按 1）"""
+    items = parse_order(text)
+    if items:
+        return items
+    catalog = get_menu_catalog()
+    found, i = {}, 0
+    while i < len(text):
+        match = catalog.longest_match(text, i)
+        if match is None:
+            i += 1
+            continue
+        found[match[0]] = 1
+        i = match[1]
+    return list(found.items())
@@ -0,0 +1,269 @@
+"""
+大模型 HTTP 客户端：同步（requests 连接池）和异步（httpx）两种，以及流式响应组装
+
+requests / httpx 在创建客户端时才导入，缩短启动时间
+"""
+import os
+import json
+import time
+import asyncio
+import functools
+from email.utils import parsedate_to_datetime
+
+from common.encoding import dumps_compact
+
+# ==================== 配置 ====================
+API_URL = os.environ.get("LLM_API_URL", "https://api.lkeap.cloud.tencent.com/v1/chat/completions")
+API_KEY = os.environ.get("TENCENT_API_KEY", "")
+MODEL = "deepseek-v3"
+
+# 连接池配置
+POOL_SIZE = 10
+REQUEST_TIMEOUT = (5, 60)  # (连接超时, 读取超时) 秒
+MAX_RETRIES = 3
+
+# 重试策略：chat/completions 不是幂等请求，读超时或 5xx 时服务端可能已经生成（并计费），重发会重复调用。
+# 默认只重试一定没有被处理的请求：连接失败（请求未发出），以及带 Retry-After 的 429 / 503（服务端明确拒绝）
+RETRY_AFTER_STATUS = (429, 503)
+RETRY_AFTER_MAX = 30  # Retry-After 的最长等待（秒）
+RETRY_POST = os.environ.get("LLM_RETRY_POST", "") == "1"  # 设为 1 时读超时和 5xx 也重试（可能重复计费）
+RETRY_POST_STATUS = (429, 500, 502, 503, 504)
+
+
+# ==================== 重试策略 ====================
+def retry_after_seconds(value: str):
+    """解析 Retry-After 头（秒数或 HTTP 日期），无法解析时返回 None"""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+@functools.lru_cache(maxsize=None)
+def _retry_after_only():
+    """只在服务端给出 Retry-After 时按状态码重试的 urllib3 Retry（urllib3 首次使用时才导入）"""
+    from urllib3.util.retry import Retry
+
+    class RetryAfterOnly(Retry):
+        def is_retry(self, method: str, status_code: int, has_retry_after: bool = False) -> bool:
+            return has_retry_after and super().is_retry(method, status_code, has_retry_after)
+    return RetryAfterOnly
+
+
+# ==================== SSE 解析 ====================
+SSE_DONE = object()  # 流结束标记（data: [DONE]）
+
+
+def parse_sse_line(line: str):
+    """
+    解析 SSE 的一行：返回数据块（dict），流结束时返回 SSE_DONE，其他行返回 None
+
+    空行、注释（: keep-alive）、event / id / retry 字段和空的 data 都忽略；
+    data 不是合法 JSON 时抛出 ValueError，不能悄悄丢掉（丢掉的可能是工具参数的片段）
+    """
+    if not line.startswith("data:"):
+        return None
+    payload = line[5:].strip()
+    if not payload:
+        return None
+    if payload == "[DONE]":
+        return SSE_DONE
+    try:
+        return json.loads(payload)
+    except ValueError:
+        raise ValueError(f"SSE 数据块不是合法 JSON: {payload[:100]}") from None
+
+
+# ==================== 同步客户端 ====================
+class LLMClient:
+    """大模型 HTTP 客户端：连接池 + keep-alive + 超时 + 重试退避，进程内共享"""
+
+    def __init__(self, pool_size: int = POOL_SIZE, timeout=REQUEST_TIMEOUT,
+                 max_retries: int = MAX_RETRIES, backoff_factor: float = 0.5, retry_post: bool = RETRY_POST):
+        import requests
+        import urllib3
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+        # 请求使用 verify=False，在创建客户端时（而不是程序启动时）关闭对应警告，异步路径不必导入 urllib3
+        urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers.update({
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {API_KEY}"
+        })
+        if retry_post:
+            retry = Retry(
+                total=max_retries,
+                backoff_factor=backoff_factor,
+                status_forcelist=RETRY_POST_STATUS,
+                allowed_methods=frozenset(["POST"]),
+            )
+        else:
+            # 连接失败总会重试；读超时不重发（read=False 原样抛出）；状态码只重试带 Retry-After 的 429 / 503
+            retry = _retry_after_only()(
+                total=max_retries,
+                read=False,
+                backoff_factor=backoff_factor,
+                status_forcelist=RETRY_AFTER_STATUS,
+                allowed_methods=frozenset(["POST"]),
+                retry_after_max=RETRY_AFTER_MAX,
+                raise_on_status=False,
+            )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def chat(self, data: dict, body: bytes = None) -> dict:
+        """发送一次 chat/completions 请求，复用连接池中的连接（body 为预先编码好的请求体）"""
+        response = self.session.post(API_URL, data=body or dumps_compact(data), timeout=self.timeout, verify=False)
+        response.raise_for_status()
+        return response.json()
+
+    def chat_stream(self, data: dict, body: bytes = None):
+        """发送流式请求（SSE），逐个产出解析后的数据块"""
+        with self.session.post(API_URL, data=body or dumps_compact(data), timeout=self.timeout,
+                               verify=False, stream=True) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                chunk = parse_sse_line(line.decode("utf-8"))
+                if chunk is SSE_DONE:
+                    break
+                if chunk is not None:
+                    yield chunk
+
+    def close(self):
+        """关闭连接池"""
+        self.session.close()
+
+
+# ==================== 异步客户端 ====================
+class AsyncLLMClient:
+    """异步大模型 HTTP 客户端：基于 httpx.AsyncClient，不阻塞事件循环"""
+
+    def __init__(self, pool_size: int = POOL_SIZE, timeout=REQUEST_TIMEOUT,
+                 max_retries: int = MAX_RETRIES, backoff_factor: float = 0.5, retry_post: bool = RETRY_POST):
+        import httpx
+        connect_timeout, read_timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.retry_post = retry_post
+        self.client = httpx.AsyncClient(
+            headers={
+                "Content-Type": "application/json",
+                "Authorization": f"Bearer {API_KEY}"
+            },
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            verify=False,
+        )
+
+    async def chat(self, data: dict, body: bytes = None) -> dict:
+        """发送一次 chat/completions 请求，可安全重发的失败按指数退避重试（body 为预先编码好的请求体）"""
+        import httpx
+        body = body or dumps_compact(data)
+        # 连接阶段的失败说明请求没有发出；读超时等发出后的失败只在 retry_post 时重试
+        retryable_errors = httpx.TransportError if self.retry_post else (httpx.ConnectError, httpx.ConnectTimeout,
+                                                                         httpx.PoolTimeout)
+        for attempt in range(self.max_retries + 1):
+            delay = self.backoff_factor * (2 ** attempt)
+            try:
+                response = await self.client.post(API_URL, content=body)
+            except retryable_errors:
+                if attempt == self.max_retries:
+                    raise
+            else:
+                wait = self._retry_wait(response)
+                if wait is None or attempt == self.max_retries:
+                    response.raise_for_status()
+                    return response.json()
+                delay = max(delay, wait)
+            await asyncio.sleep(delay)
+
+    def _retry_wait(self, response) -> float:
+        """按状态码判断是否重试：返回服务端要求的等待秒数（没有要求时为 0），不重试时返回 None"""
+        wait = retry_after_seconds(response.headers.get("Retry-After"))
+        if response.status_code in RETRY_AFTER_STATUS and wait is not None:
+            return min(wait, RETRY_AFTER_MAX)
+        if self.retry_post and response.status_code in RETRY_POST_STATUS:
+            return 0.0
+        return None
+
+    async def chat_stream(self, data: dict, body: bytes = None):
+        """发送流式请求（SSE），逐个产出解析后的数据块"""
+        async with self.client.stream("POST", API_URL, content=body or dumps_compact(data)) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                chunk = parse_sse_line(line)
+                if chunk is SSE_DONE:
+                    break
+                if chunk is not None:
+                    yield chunk
+
+    async def close(self):
+        """关闭连接池"""
+        await self.client.aclose()
+
+
+# ==================== 流式响应组装 ====================
+class StreamAssembler:
+    """增量组装流式响应：拼接 content，按 index 拼接 tool_calls 片段"""
+
+    def __init__(self, on_delta=None, on_tool_call=None):
+        self.on_delta = on_delta
+        self.on_tool_call = on_tool_call
+        self.content = []
+        self.tool_calls = {}  # index -> tool_call
+        self.usage = None  # 最后一个数据块中的 token 用量（需 stream_options.include_usage）
+        self._dispatched = set()
+
+    def feed(self, chunk: dict):
+        """处理一个 SSE 数据块"""
+        if chunk.get("usage"):
+            self.usage = chunk["usage"]
+        for choice in chunk.get("choices", []):
+            delta = choice.get("delta") or {}
+            if delta.get("content"):
+                self.content.append(delta["content"])
+                if self.on_delta:
+                    self.on_delta(delta["content"])
+            for fragment in delta.get("tool_calls") or []:
+                index = fragment.get("index", 0)
+                tool_call = self.tool_calls.setdefault(index, {
+                    "id": "",
+                    "type": "function",
+                    "function": {"name": "", "arguments": ""}
+                })
+                if fragment.get("id"):
+                    tool_call["id"] = fragment["id"]
+                function = fragment.get("function") or {}
+                tool_call["function"]["name"] += function.get("name") or ""
+                tool_call["function"]["arguments"] += function.get("arguments") or ""
+                self._try_dispatch(index)
+
+    def _try_dispatch(self, index: int):
+        """参数 JSON 一旦完整就立即回调 on_tool_call"""
+        if index in self._dispatched or not self.on_tool_call:
+            return
+        arguments = self.tool_calls[index]["function"]["arguments"].rstrip()
+        if not arguments.endswith("}"):
+            return
+        try:
+            func_args = json.loads(arguments)
+        except ValueError:
+            return
+        self._dispatched.add(index)
+        self.on_tool_call(self.tool_calls[index], func_args)
+
+    def finish(self) -> dict:
+        """流结束，返回完整的 assistant 消息"""
+        message = {"role": "assistant", "content": "".join(self.content)}
+        if self.tool_calls:
+            message["tool_calls"] = [self.tool_calls[i] for i in sorted(self.tool_calls)]
+        return message
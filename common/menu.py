@@ -0,0 +1,524 @@
+"""
+菜单：内置菜单数据、菜品名模糊检索、菜单目录（内存 / SQLite）和计价
+"""
+import os
+import re
+import heapq
+import functools
+import itertools
+import time
+import sqlite3
+import threading
+from array import array
+from collections import Counter, defaultdict
+
+# ==================== 配置 ====================
+# 菜单目录：默认使用内置 MENU；设置 MENU_DB_PATH 后从 SQLite 目录读取（大规模菜单、多门店价格、热更新）
+MENU_DB_PATH = os.environ.get("MENU_DB_PATH", "")
+STORE_ID = os.environ.get("STORE_ID", "default")  # 当前门店，门店没有单独定价时用默认价格
+MENU_RELOAD_INTERVAL = 5  # 检查目录文件是否更新的间隔（秒）
+MENU_DB_MMAP_SIZE = 256 * 1024 * 1024  # SQLite 以 mmap 方式读取的上限（字节）
+MENU_LIST_LIMIT = 20  # 启动时最多列出的菜品数
+MENU_SUGGEST_K = 3  # 查不到菜品时给出的相近菜品数（不再列出整个菜单）
+MENU_SUGGEST_CUTOFF = 0.3  # 相似度低于该值的不作为建议
+MENU_MATCH_CUTOFF = 0.5  # 相似度不低于该值时直接按最接近的菜品计价
+MENU_SUGGEST_PINYIN = True  # 安装了 pypinyin 时同时按拼音检索（同音字、拼音输入）
+
+# ==================== 菜单数据 ====================
+MENU = {
+    "汉堡": 25,
+    "薯条": 12,
+    "可乐": 8,
+    "鸡翅": 18,
+    "冰淇淋": 6,
+    "咖啡": 15,
+    "沙拉": 20,
+    "披萨": 45,
+    "三明治": 22,
+    "奶茶": 10,
+}
+
+# 菜品别名（常见叫法 → 菜单名）
+MENU_ALIASES = {
+    "汉堡包": "汉堡",
+    "炸薯条": "薯条",
+    "可口可乐": "可乐",
+    "鸡翅膀": "鸡翅",
+    "炸鸡翅": "鸡翅",
+    "冰激凌": "冰淇淋",
+    "雪糕": "冰淇淋",
+    "比萨": "披萨",
+    "匹萨": "披萨",
+    "三文治": "三明治",
+}
+
+
+# ==================== 菜品名模糊检索 ====================
+class SuggestionIndex:
+    """
+    菜品名模糊检索：用字二元组（安装了 pypinyin 时再加拼音音节二元组）的倒排索引召回候选，
+    再按 Dice 系数 + 编辑距离重排，返回最接近的 k 个菜单名
+
+    召回时先处理出现次数少的二元组，扫描量用完后跳过剩下的高频二元组（如大目录里的“香辣”）；
+    重排时相似度上界不可能进入前 k 的候选不再计算编辑距离
+    """
+
+    MAX_POSTINGS = 5000  # 已有候选时跳过超过该条目数的二元组；第一个二元组也只扫描这么多
+    SCAN_BUDGET = 1000  # 已有足够候选时，累计扫描超过该条目数就停止召回
+    PRESELECT = 100  # 按共有二元组数预选的候选数
+    RERANK = 20  # 进入重排的候选数
+
+    def __init__(self, entries, version: int = 0, pinyin: bool = MENU_SUGGEST_PINYIN):
+        """entries 为 [(名称, 菜单名)]，名称可以是菜单名本身或别名"""
+        self.version = version
+        self.pinyin = pinyin and to_pinyin("菜") is not None  # 没有安装 pypinyin 时构建和查询都跳过拼音
+        self.names = []  # 条目 id → 名称
+        self.targets = []  # 条目 id → 菜单名
+        self.gram_counts = array("H")
+        self.syllables = set()  # 见过的拼音音节，用于切分拼音输入
+        postings = defaultdict(lambda: array("I"))
+        for i, (name, target) in enumerate(entries):
+            self.names.append(name)
+            self.targets.append(target)
+            syllables = self._syllables_of(name)
+            if syllables:
+                self.syllables.update(s for c, s in zip(name, syllables) if s != c)
+            grams = self._grams(name, syllables)
+            self.gram_counts.append(min(len(grams), 65535))
+            for gram in grams:
+                postings[gram].append(i)
+        self.postings = dict(postings)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def _syllables_of(self, text: str):
+        """文本的拼音音节；没有 pypinyin 或不含汉字时返回 None"""
+        if not self.pinyin or not _CJK_RE.search(text):
+            return None
+        return to_pinyin(text)
+
+    @staticmethod
+    def _grams(text: str, syllables=None) -> set:
+        """带首尾标记的字二元组 + 拼音音节二元组（以 # 开头，与字二元组区分）"""
+        padded = f"\x02{text}\x03"
+        grams = {padded[i:i + 2] for i in range(len(padded) - 1)}
+        if syllables:
+            tokens = ("^", *syllables, "$")
+            grams.update(f"#{a} {b}" for a, b in zip(tokens, tokens[1:]))
+        return grams
+
+    def _segment(self, text: str):
+        """把拼音输入（如 kele）按已知音节做最长匹配切分，切不开返回 None"""
+        syllables, i = [], 0
+        while i < len(text):
+            for end in range(min(len(text), i + 6), i, -1):
+                if text[i:end] in self.syllables:
+                    syllables.append(text[i:end])
+                    i = end
+                    break
+            else:
+                return None
+        return syllables
+
+    def _similarity(self, query: str, query_grams: set, query_syllables, name: str, floor: float = 0.0) -> float:
+        """Dice 系数和归一化编辑距离各占一半；有拼音时取字和拼音两种相似度的较大值。上界不超过 floor 时返回 0"""
+        name_syllables = self._syllables_of(name) if query_syllables else None
+        name_grams = self._grams(name, name_syllables)
+        dice = 2 * len(query_grams & name_grams) / (len(query_grams) + len(name_grams))
+        if dice / 2 + 0.5 <= floor:
+            return 0.0
+        score = 1 - edit_distance(query, name) / max(len(query), len(name))
+        if query_syllables and name_syllables:
+            # 按音节比较：同音字、拼音输入的距离为 0，序列也比拼接后的字符串短得多
+            distance = edit_distance(query_syllables, name_syllables)
+            score = max(score, 1 - distance / max(len(query_syllables), len(name_syllables)))
+        return dice / 2 + score / 2
+
+    def search(self, query: str, k: int = MENU_SUGGEST_K, cutoff: float = MENU_SUGGEST_CUTOFF) -> list:
+        """返回 [(菜单名, 相似度)]，按相似度从高到低，同一菜单名只出现一次"""
+        query = query.strip()
+        if not query:
+            return []
+        syllables = self._syllables_of(query)
+        if syllables is None and self.syllables and query.isascii() and query.isalpha():
+            syllables = self._segment(query.lower())
+        grams = self._grams(query, syllables)
+
+        counts = Counter()
+        scanned = 0
+        for gram in sorted(grams, key=lambda g: len(self.postings.get(g, ()))):
+            ids = self.postings.get(gram)
+            if not ids:
+                continue
+            if counts and (len(ids) > self.MAX_POSTINGS or (scanned >= self.SCAN_BUDGET and len(counts) >= self.RERANK)):
+                break
+            counts.update(ids[:self.MAX_POSTINGS])
+            scanned += min(len(ids), self.MAX_POSTINGS)
+        # most_common 在 C 里比较计数，先粗选再按名称长度归一化，避免对所有候选调用 Python 的 key 函数
+        preselect = counts.most_common(self.PRESELECT)
+        shortlist = heapq.nlargest(self.RERANK, preselect,
+                                   key=lambda item: item[1] / (len(grams) + self.gram_counts[item[0]]))
+
+        best = {}
+        floor = cutoff  # 当前第 k 名的相似度，上界不超过它的候选跳过
+        for i, _ in shortlist:
+            score = self._similarity(query, grams, syllables, self.names[i], floor)
+            target = self.targets[i]
+            if score >= cutoff and score > best.get(target, 0.0):
+                best[target] = score
+                if len(best) >= k:
+                    floor = max(floor, sorted(best.values())[-k])
+        return heapq.nlargest(k, best.items(), key=lambda item: item[1])
+
+
+_CJK_RE = re.compile(r'[\u4e00-\u9fff]')
+_pinyin = None  # 可选依赖 pypinyin，首次使用时探测：None 未探测 / False 未安装
+
+
+def to_pinyin(text: str):
+    """
+    逐字转成不带声调的拼音音节（非汉字原样保留），没有安装 pypinyin 时返回 None
+    按字缓存，重排时大量候选名称也只是查表；多音字不看上下文，模糊检索可以接受
+    """
+    global _pinyin
+    if _pinyin is None:
+        try:
+            from pypinyin import lazy_pinyin as _pinyin
+        except ImportError:
+            _pinyin = False
+    return tuple(map(_char_pinyin, text)) if _pinyin else None
+
+
+@functools.lru_cache(maxsize=None)
+def _char_pinyin(char: str) -> str:
+    return _pinyin(char)[0] if _CJK_RE.match(char) else char
+
+
+def edit_distance(a, b) -> int:
+    """Levenshtein 编辑距离（字符串或音节元组）：去掉公共前后缀后用位并行算法（Myers），每个元素只需几次整数运算"""
+    start = 0
+    for x, y in zip(a, b):
+        if x != y:
+            break
+        start += 1
+    a, b = a[start:], b[start:]
+    end = 0
+    for x, y in zip(reversed(a), reversed(b)):
+        if x != y:
+            break
+        end += 1
+    if end:
+        a, b = a[:-end], b[:-end]
+    if not a or not b:
+        return len(a) + len(b)
+    peq = {}  # 字符 → 它在 a 中出现位置的位图
+    for i, c in enumerate(a):
+        peq[c] = peq.get(c, 0) | (1 << i)
+    full = (1 << len(a)) - 1
+    last = 1 << (len(a) - 1)
+    pv, mv, distance = full, 0, len(a)
+    for c in b:
+        eq = peq.get(c, 0)
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+        ph = mv | (~(xh | pv) & full)
+        mh = pv & xh
+        if ph & last:
+            distance += 1
+        elif mh & last:
+            distance -= 1
+        ph = ((ph << 1) | 1) & full
+        mh = (mh << 1) & full
+        pv = mh | (~(xv | ph) & full)
+        mv = ph & xv
+    return distance
+
+
+# ==================== 菜单目录 ====================
+class MenuCatalog:
+    """菜单目录基类：按门店查价格、解析别名、在文本中匹配菜品名"""
+
+    def __init__(self, store: str = STORE_ID):
+        self.store = store
+        self.version = 0  # 每次热更新加 1
+        self._index = None
+        self._index_lock = threading.Lock()
+
+    def price(self, name: str, store: str = None):
+        """菜品在门店的价格（门店没有单独定价时用默认价格），不在菜单中返回 None"""
+        raise NotImplementedError
+
+    def resolve(self, name: str):
+        """菜单名或别名 → 菜单名，都不是返回 None"""
+        raise NotImplementedError
+
+    def longest_match(self, text: str, start: int):
+        """从 start 开始匹配最长的菜单名，返回 (菜单名, 结束位置)，匹配不到返回 None"""
+        raise NotImplementedError
+
+    def names(self, limit: int = None) -> list:
+        """菜单名列表（limit 限制条数）"""
+        raise NotImplementedError
+
+    def suggest(self, name: str, k: int = MENU_SUGGEST_K) -> list:
+        """
+        与 name 最接近的 k 个菜单名 [(菜单名, 相似度)]
+        检索索引在首次使用时构建；热更新后在后台线程重建，重建完成前沿用旧索引（百万条目录构建需要数秒）
+        """
+        index = self._index
+        if index is None:
+            with self._index_lock:
+                if self._index is None:
+                    self._index = self._build_index()
+                index = self._index
+        elif index.version != self.version and self._index_lock.acquire(blocking=False):
+            threading.Thread(target=self._rebuild_index, daemon=True).start()
+        return index.search(name, k)
+
+    def _build_index(self):
+        version = self.version  # 先取版本号：构建期间再次热更新时，下次查询会发现版本不一致并重建
+        return SuggestionIndex(self._suggestion_entries(), version)
+
+    def _rebuild_index(self):
+        try:
+            self._index = self._build_index()
+        finally:
+            self._index_lock.release()
+
+    def _suggestion_entries(self):
+        """参与模糊检索的 (名称, 菜单名)：菜单名和别名"""
+        raise NotImplementedError
+
+
+class MenuSnapshot:
+    """一份完整的内存菜单，构建后只读，热更新时整体替换"""
+
+    __slots__ = ("prices", "store_prices", "aliases", "max_length")
+
+    def __init__(self, prices: dict, store_prices: dict = None, aliases: dict = None):
+        self.prices = dict(prices)
+        self.store_prices = {store: dict(items) for store, items in (store_prices or {}).items()}
+        self.aliases = {alias: name for alias, name in (aliases or {}).items() if name in self.prices}
+        self.max_length = max(map(len, self.prices), default=0)
+
+
+class DictMenuCatalog(MenuCatalog):
+    """内存目录：查价 O(1)，适合内置菜单和中小规模菜单"""
+
+    def __init__(self, prices: dict = MENU, store_prices: dict = None, aliases: dict = MENU_ALIASES,
+                 store: str = STORE_ID):
+        super().__init__(store)
+        self.replace(prices, store_prices, aliases)
+
+    def replace(self, prices: dict, store_prices: dict = None, aliases: dict = None):
+        """热更新：先构建新快照再一次性替换引用，查询看到的要么是旧菜单要么是新菜单"""
+        self._snapshot = MenuSnapshot(prices, store_prices, aliases)
+        self.version += 1
+
+    def price(self, name: str, store: str = None):
+        snapshot = self._snapshot
+        price = snapshot.prices.get(name)
+        if price is None:
+            return None
+        return snapshot.store_prices.get(store or self.store, {}).get(name, price)
+
+    def resolve(self, name: str):
+        snapshot = self._snapshot
+        return name if name in snapshot.prices else snapshot.aliases.get(name)
+
+    def longest_match(self, text: str, start: int):
+        snapshot = self._snapshot
+        for end in range(min(len(text), start + snapshot.max_length), start, -1):
+            if text[start:end] in snapshot.prices:
+                return text[start:end], end
+        return None
+
+    def names(self, limit: int = None) -> list:
+        return list(itertools.islice(self._snapshot.prices, limit))
+
+    def _suggestion_entries(self):
+        snapshot = self._snapshot
+        return itertools.chain(((name, name) for name in snapshot.prices), snapshot.aliases.items())
+
+
+class SQLiteMenuCatalog(MenuCatalog):
+    """
+    SQLite 目录：菜品、门店价格、别名都是以名称为主键的 WITHOUT ROWID 表，查价是一次 B 树查找（O(log n)），
+    以只读方式打开并用 mmap 读取，Python 进程内不保存菜单，内存占用与菜单规模无关
+
+    热更新：用 build_menu_db() 生成新文件（写临时文件后 os.replace 覆盖），
+    目录每隔 reload_interval 秒检查一次文件，变化后新的查询改读新文件
+    """
+
+    def __init__(self, path: str = MENU_DB_PATH, store: str = STORE_ID,
+                 reload_interval: float = MENU_RELOAD_INTERVAL):
+        super().__init__(store)
+        self.path = path
+        self.reload_interval = reload_interval
+        self._local = threading.local()  # 每个线程一个只读连接，查询之间不加锁
+        self._lock = threading.Lock()
+        self._stamp = None
+        self._next_check = 0.0
+        self.max_length = 0
+        self.reload()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA query_only = ON")
+        conn.execute(f"PRAGMA mmap_size = {MENU_DB_MMAP_SIZE}")
+        return conn
+
+    def reload(self) -> bool:
+        """文件有变化时切换到新文件，返回是否切换"""
+        stat = os.stat(self.path)
+        stamp = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            self._next_check = time.monotonic() + self.reload_interval
+            if stamp == self._stamp:
+                return False
+            conn = self._connect()
+            row = conn.execute("SELECT value FROM meta WHERE key = 'max_length'").fetchone()
+            conn.close()
+            self.max_length = int(row[0]) if row else 0
+            self._stamp = stamp
+            self.version += 1
+            return True
+
+    def _conn(self):
+        """当前线程的连接；到了检查间隔先看文件是否更新"""
+        if time.monotonic() >= self._next_check:
+            self.reload()
+        local = self._local
+        if getattr(local, "version", None) != self.version:
+            if getattr(local, "conn", None) is not None:
+                local.conn.close()
+            local.conn = self._connect()
+            local.version = self.version
+        return local.conn
+
+    def price(self, name: str, store: str = None):
+        row = self._conn().execute(
+            "SELECT COALESCE(s.price, i.price) FROM items i "
+            "LEFT JOIN store_prices s ON s.store_id = ? AND s.name = i.name WHERE i.name = ?",
+            (store or self.store, name)
+        ).fetchone()
+        return row[0] if row else None
+
+    def resolve(self, name: str):
+        row = self._conn().execute(
+            "SELECT name FROM items WHERE name = ?1 UNION ALL SELECT name FROM aliases WHERE alias = ?1 LIMIT 1",
+            (name,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def longest_match(self, text: str, start: int):
+        prefixes = [text[start:end] for end in range(start + 1, min(len(text), start + self.max_length) + 1)]
+        if not prefixes:
+            return None
+        row = self._conn().execute(
+            f"SELECT name FROM items WHERE name IN ({','.join('?' * len(prefixes))}) "
+            "ORDER BY length(name) DESC LIMIT 1", prefixes
+        ).fetchone()
+        return (row[0], start + len(row[0])) if row else None
+
+    def names(self, limit: int = None) -> list:
+        rows = self._conn().execute("SELECT name FROM items LIMIT ?", (-1 if limit is None else limit,))
+        return [row[0] for row in rows]
+
+    def _suggestion_entries(self):
+        return self._conn().execute("SELECT name, name FROM items UNION ALL SELECT alias, name FROM aliases")
+
+
+def build_menu_db(path: str, prices: dict, store_prices: dict = None, aliases: dict = None):
+    """
+    生成 SQLite 菜单目录文件
+
+    先写临时文件再 os.replace 覆盖，正在读旧文件的进程不受影响，SQLiteMenuCatalog 检查到后自动切换
+    """
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    conn = sqlite3.connect(tmp_path)
+    with conn:
+        conn.execute("CREATE TABLE items (name TEXT PRIMARY KEY, price INTEGER NOT NULL) WITHOUT ROWID")
+        conn.execute(
+            "CREATE TABLE store_prices (store_id TEXT, name TEXT, price INTEGER NOT NULL, "
+            "PRIMARY KEY (store_id, name)) WITHOUT ROWID"
+        )
+        conn.execute("CREATE TABLE aliases (alias TEXT PRIMARY KEY, name TEXT NOT NULL) WITHOUT ROWID")
+        conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT) WITHOUT ROWID")
+        conn.executemany("INSERT INTO items VALUES (?, ?)", sorted(prices.items()))
+        conn.executemany("INSERT INTO store_prices VALUES (?, ?, ?)", sorted(
+            (store, name, price) for store, items in (store_prices or {}).items()
+            for name, price in items.items() if name in prices
+        ))
+        conn.executemany("INSERT INTO aliases VALUES (?, ?)",
+                         sorted((alias, name) for alias, name in (aliases or {}).items() if name in prices))
+        conn.execute("INSERT INTO meta VALUES ('max_length', ?)", (str(max(map(len, prices), default=0)),))
+    conn.close()
+    os.replace(tmp_path, path)
+
+
+_menu_catalog = None
+_menu_catalog_lock = threading.Lock()
+
+
+def get_menu_catalog() -> MenuCatalog:
+    """获取进程内共享的菜单目录（设置了 MENU_DB_PATH 时使用 SQLite 目录）"""
+    global _menu_catalog
+    if _menu_catalog is None:
+        with _menu_catalog_lock:
+            if _menu_catalog is None:
+                _menu_catalog = SQLiteMenuCatalog() if MENU_DB_PATH else DictMenuCatalog()
+    return _menu_catalog
+
+
+# ==================== 查价与计价 ====================
+def ask_menu_price(item_name: str) -> str:
+    """查询菜品价格"""
+    item_name = item_name.strip()
+    catalog = get_menu_catalog()
+    price = catalog.price(item_name)
+    if price is not None:
+        return f"{item_name}的价格是{price}元"
+    # 热更新后旧索引可能还在服务，已下架的菜品没有价格，跳过
+    prices = ((name, catalog.price(name)) for name, _ in catalog.suggest(item_name))
+    suggestions = [f"{name}（{price}元）" for name, price in prices if price is not None]
+    if not suggestions:
+        return f"抱歉，菜单中没有{item_name}"
+    return f"抱歉，菜单中没有{item_name}。相近的菜品有：{'、'.join(suggestions)}"
+
+
+def match_menu_item(name: str):
+    """按 精确 → 别名 → 模糊检索 的顺序匹配菜品名，找不到返回 None"""
+    name = name.strip()
+    catalog = get_menu_catalog()
+    matched = catalog.resolve(name)
+    if matched is not None:
+        return matched
+    suggestions = catalog.suggest(name, k=1)
+    if suggestions and suggestions[0][1] >= MENU_MATCH_CUTOFF:
+        return suggestions[0][0]
+    return None
+
+
+def price_items(items: list) -> str:
+    """批量计价：items 为 [(菜品名, 数量), ...]，返回逐项单价、小计和合计"""
+    catalog = get_menu_catalog()
+    lines, total = [], 0
+    for name, quantity in items:
+        if quantity < 1:
+            lines.append(f"抱歉，{name.strip()}的数量必须至少为 1")
+            continue
+        matched = match_menu_item(name)
+        price = catalog.price(matched) if matched is not None else None
+        if price is None:
+            lines.append(f"抱歉，菜单中没有{name}")
+            continue
+        subtotal = price * quantity
+        total += subtotal
+        label = matched if matched == name.strip() else f"{name.strip()}→{matched}"
+        lines.append(f"{label}x{quantity}：单价{price}元，小计{subtotal}元")
+    lines.append(f"合计：{total}元")
+    return "\n".join(lines)
@@ -0,0 +1,272 @@
+"""
+离线模式：录制 / 回放 / 脚本模型，同步和异步客户端各一套，接口与 LLMClient / AsyncLLMClient 一致
+"""
+import os
+import json
+import time
+import asyncio
+import threading
+
+from common.cache import CompletionCache
+from common.llm import POOL_SIZE, LLMClient, AsyncLLMClient
+
+# ==================== 配置 ====================
+# live 请求真实接口 / record 请求并录制 / replay 按录制文件回放 / scripted 本地脚本模型
+LLM_MODE = os.environ.get("LLM_MODE", "live")
+LLM_FIXTURE_PATH = os.environ.get("LLM_FIXTURE_PATH", "llm_fixture.jsonl")  # 相对路径按当前目录（即所在章节目录）
+LLM_REPLAY_LATENCY = os.environ.get("LLM_REPLAY_LATENCY", "recorded")  # recorded 按录制耗时，或固定秒数
+
+
+# ==================== 辅助函数 ====================
+def message_to_chunks(message: dict) -> list:
+    """把完整的 assistant 消息拆成流式数据块"""
+    delta = {"role": "assistant", "content": message.get("content") or ""}
+    if message.get("tool_calls"):
+        delta["tool_calls"] = [dict(tc, index=i) for i, tc in enumerate(message["tool_calls"])]
+    return [{"choices": [{"index": 0, "delta": delta}]}]
+
+
+def apply_stop(text: str, stop) -> str:
+    """模拟接口的停止序列：在最早出现的停止序列处截断（不含停止序列本身）"""
+    cut = min((i for i in (text.find(s) for s in stop or ()) if i >= 0), default=-1)
+    return text if cut < 0 else text[:cut]
+
+
+def truncate_response(response: dict, content: str) -> dict:
+    """复制一份回复，把内容替换为截断后的文本，completion_tokens 按比例缩减"""
+    message = response["choices"][0]["message"]
+    truncated = dict(response, choices=[{"index": 0, "message": dict(message, content=content),
+                                         "finish_reason": "stop"}])
+    usage = response.get("usage")
+    if usage and message.get("content"):
+        completion_tokens = round(usage.get("completion_tokens", 0) * len(content) / len(message["content"]))
+        truncated["usage"] = dict(usage, completion_tokens=completion_tokens,
+                                  total_tokens=usage.get("prompt_tokens", 0) + completion_tokens)
+    return truncated
+
+
+def scripted_latency() -> float:
+    """脚本模型的固定耗时（LLM_REPLAY_LATENCY 为 recorded 时不等待）"""
+    return 0.0 if LLM_REPLAY_LATENCY == "recorded" else float(LLM_REPLAY_LATENCY)
+
+
+# ==================== 录制 ====================
+class RecordingLLMClient:
+    """录制模式：请求真实接口，同时把 (请求哈希, 回复, 耗时) 逐行追加到录制文件"""
+
+    def __init__(self, client, path: str = LLM_FIXTURE_PATH):
+        self.client = client
+        self.path = path
+        self._lock = threading.Lock()
+
+    def chat(self, data: dict, body: bytes = None) -> dict:
+        start = time.perf_counter()
+        response = self.client.chat(data, body)
+        self._save(data, {"response": response}, time.perf_counter() - start)
+        return response
+
+    def chat_stream(self, data: dict, body: bytes = None):
+        start = time.perf_counter()
+        chunks = []
+        try:
+            for chunk in self.client.chat_stream(data, body):
+                chunks.append(chunk)
+                yield chunk
+        except GeneratorExit:
+            # 调用方提前断开（如 ReAct 已匹配到 [Call: ...]）：录制已收到的部分
+            self._save(data, {"chunks": chunks}, time.perf_counter() - start)
+            raise
+        self._save(data, {"chunks": chunks}, time.perf_counter() - start)
+
+    def _save(self, data: dict, entry: dict, elapsed: float):
+        entry = {"key": CompletionCache.make_key(data), "elapsed": round(elapsed, 3), **entry}
+        line = json.dumps(entry, ensure_ascii=False, separators=(",", ":"))
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+    def close(self):
+        self.client.close()
+
+
+class AsyncRecordingLLMClient(RecordingLLMClient):
+    """录制模式（异步）"""
+
+    async def chat(self, data: dict, body: bytes = None) -> dict:
+        start = time.perf_counter()
+        response = await self.client.chat(data, body)
+        self._save(data, {"response": response}, time.perf_counter() - start)
+        return response
+
+    async def chat_stream(self, data: dict, body: bytes = None):
+        start = time.perf_counter()
+        chunks = []
+        async for chunk in self.client.chat_stream(data, body):
+            chunks.append(chunk)
+            yield chunk
+        self._save(data, {"chunks": chunks}, time.perf_counter() - start)
+
+    async def close(self):
+        await self.client.close()
+
+
+# ==================== 回放 ====================
+class ReplayLLMClient:
+    """
+    回放模式：按请求哈希返回录制的回复，不访问网络
+
+    没有录制过当前 stop / max_tokens 的请求时，回退到不带这些参数的录制，
+    按接口语义用 stop 截断回复，耗时按保留的比例缩短；流式回复把耗时均摊到每个数据块
+    """
+
+    def __init__(self, path: str = LLM_FIXTURE_PATH, latency=LLM_REPLAY_LATENCY):
+        """latency 为 "recorded" 时按录制时的耗时等待，否则等待固定秒数"""
+        self.latency = latency
+        self.entries = {}
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self.entries.setdefault(entry["key"], {}).update(entry)
+
+    def _lookup(self, data: dict):
+        """返回 (录制条目, 模拟耗时)"""
+        entry = self.entries.get(CompletionCache.make_key(data))
+        if entry is None and any(data.get(k) is not None for k in CompletionCache.GENERATION_FIELDS):
+            entry = self.entries.get(CompletionCache.make_key(dict(data, stop=None, max_tokens=None)))
+        if entry is None:
+            raise LookupError("录制文件中没有该请求，请先用 record 模式录制")
+        delay = entry.get("elapsed", 0.0) if self.latency == "recorded" else float(self.latency)
+        return entry, delay
+
+    def _response(self, data: dict) -> tuple:
+        """返回 (按 stop 截断后的回复, 模拟耗时)"""
+        entry, delay = self._lookup(data)
+        if "response" not in entry:
+            raise LookupError("该请求只录制了流式回复")
+        response = entry["response"]
+        content = response["choices"][0]["message"].get("content") or ""
+        kept = apply_stop(content, data.get("stop"))
+        if len(kept) < len(content):
+            response = truncate_response(response, kept)
+            delay *= len(kept) / len(content)
+        return response, delay
+
+    def _chunks(self, data: dict):
+        """逐个产出 (发送前的等待时间, 按 stop 截断后的数据块)"""
+        entry, delay = self._lookup(data)
+        chunks = entry.get("chunks") or message_to_chunks(entry["response"]["choices"][0]["message"])
+        stop = data.get("stop")
+        text = ""
+        for chunk in chunks:
+            delta = "".join((c.get("delta") or {}).get("content") or "" for c in chunk.get("choices", []))
+            kept = apply_stop(text + delta, stop)
+            if len(kept) < len(text) + len(delta):
+                yield delay / len(chunks), {"choices": [{"index": 0, "delta": {"content": kept[len(text):]},
+                                                         "finish_reason": "stop"}]}
+                return
+            text = kept
+            yield delay / len(chunks), chunk
+
+    def chat(self, data: dict, body: bytes = None) -> dict:
+        response, delay = self._response(data)
+        if delay:
+            time.sleep(delay)
+        return response
+
+    def chat_stream(self, data: dict, body: bytes = None):
+        for delay, chunk in self._chunks(data):
+            if delay:
+                time.sleep(delay)
+            yield chunk
+
+    def close(self):
+        pass
+
+
+class AsyncReplayLLMClient(ReplayLLMClient):
+    """回放模式（异步）"""
+
+    async def chat(self, data: dict, body: bytes = None) -> dict:
+        response, delay = self._response(data)
+        if delay:
+            await asyncio.sleep(delay)
+        return response
+
+    async def chat_stream(self, data: dict, body: bytes = None):
+        for delay, chunk in self._chunks(data):
+            if delay:
+                await asyncio.sleep(delay)
+            yield chunk
+
+    async def close(self):
+        pass
+
+
+# ==================== 脚本模型 ====================
+class ScriptedLLMClient:
+    """脚本模型：script(messages) 按规则生成回复（工具调用或最终回答），用于离线压测和回归"""
+
+    def __init__(self, script, latency: float = 0.0):
+        self.script = script
+        self.latency = latency
+
+    def _reply(self, data: dict) -> dict:
+        message = self.script(data["messages"])
+        prompt_tokens = len(json.dumps(data["messages"], ensure_ascii=False)) // 4
+        completion_tokens = len(json.dumps(message, ensure_ascii=False)) // 4
+        return {
+            "choices": [{"index": 0, "message": message}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens}
+        }
+
+    def chat(self, data: dict, body: bytes = None) -> dict:
+        if self.latency:
+            time.sleep(self.latency)
+        return self._reply(data)
+
+    def chat_stream(self, data: dict, body: bytes = None):
+        yield from message_to_chunks(self.chat(data)["choices"][0]["message"])
+
+    def close(self):
+        pass
+
+
+class AsyncScriptedLLMClient(ScriptedLLMClient):
+    """脚本模型（异步）"""
+
+    async def chat(self, data: dict, body: bytes = None) -> dict:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._reply(data)
+
+    async def chat_stream(self, data: dict, body: bytes = None):
+        for chunk in message_to_chunks((await self.chat(data))["choices"][0]["message"]):
+            yield chunk
+
+    async def close(self):
+        pass
+
+
+# ==================== 按模式创建客户端 ====================
+def create_llm_client(script, mode: str = LLM_MODE, path: str = LLM_FIXTURE_PATH):
+    """按 LLM_MODE 创建同步大模型客户端（script 为 scripted 模式使用的脚本规则）"""
+    if mode == "record":
+        return RecordingLLMClient(LLMClient(), path)
+    if mode == "replay":
+        return ReplayLLMClient(path)
+    if mode == "scripted":
+        return ScriptedLLMClient(script, latency=scripted_latency())
+    return LLMClient()
+
+
+def create_async_llm_client(script, mode: str = LLM_MODE, pool_size: int = POOL_SIZE,
+                            path: str = LLM_FIXTURE_PATH):
+    """按 LLM_MODE 创建异步大模型客户端"""
+    if mode == "record":
+        return AsyncRecordingLLMClient(AsyncLLMClient(pool_size), path)
+    if mode == "replay":
+        return AsyncReplayLLMClient(path)
+    if mode == "scripted":
+        return AsyncScriptedLLMClient(script, latency=scripted_latency())
+    return AsyncLLMClient(pool_size)
@@ -0,0 +1,266 @@
+"""
+模型路由（级联）：命中规则的轮次先用小模型，输出校验失败（或请求失败）再升级到大模型，并统计各模型延迟和升级率
+"""
+import os
+import json
+import time
+import threading
+from collections import Counter, deque
+
+from common.llm import MODEL
+from common.encoding import message_bytes
+
+# ==================== 配置 ====================
+CHEAP_MODEL = os.environ.get("CHEAP_MODEL", "")  # 小模型名称，留空不启用级联
+ROUTER_LATENCY_SAMPLES = 4096  # 每个模型保留的最近延迟样本数（计算 p50 / p95）
+
+
+# ==================== 路由统计 ====================
+class RouterStats:
+    """模型路由统计：各模型的请求数、延迟和失败数，各规则的升级率和升级原因"""
+
+    def __init__(self, samples: int = ROUTER_LATENCY_SAMPLES):
+        self.samples = samples
+        self.models = {}  # 模型 → 请求数、失败数、缓存命中数、总耗时、最近的延迟样本
+        self.routes = {}  # 规则名 → 轮数、走级联的轮数、升级数、升级原因
+        self._lock = threading.Lock()
+
+    def record_call(self, model: str, elapsed: float, ok: bool, cached: bool = False):
+        """记录一次模型请求（命中缓存的不计入延迟）"""
+        with self._lock:
+            stats = self.models.setdefault(model, {
+                "calls": 0, "failures": 0, "cached": 0, "total": 0.0,
+                "latencies": deque(maxlen=self.samples),
+            })
+            stats["calls"] += 1
+            stats["failures"] += not ok
+            if cached:
+                stats["cached"] += 1
+            else:
+                stats["total"] += elapsed
+                stats["latencies"].append(elapsed)
+
+    def record_turn(self, route: str, cascaded: bool, reason: str = None):
+        """记录一轮的路由结果，reason 不为空表示小模型失败、升级到了大模型"""
+        with self._lock:
+            stats = self.routes.setdefault(route, {"turns": 0, "cascaded": 0, "escalations": 0,
+                                                   "reasons": Counter()})
+            stats["turns"] += 1
+            stats["cascaded"] += cascaded
+            if reason:
+                stats["escalations"] += 1
+                stats["reasons"][reason] += 1
+
+    def summary(self) -> dict:
+        with self._lock:
+            models = {}
+            for model, stats in self.models.items():
+                latencies = sorted(stats["latencies"])
+                timed = stats["calls"] - stats["cached"]
+                models[model] = {
+                    "calls": stats["calls"],
+                    "failures": stats["failures"],
+                    "cached": stats["cached"],
+                    "avg_ms": stats["total"] / timed * 1000 if timed else 0.0,
+                    "p50_ms": latencies[len(latencies) // 2] * 1000 if latencies else 0.0,
+                    "p95_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000
+                    if latencies else 0.0,
+                }
+            routes = {
+                route: {
+                    "turns": stats["turns"],
+                    "cascaded": stats["cascaded"],
+                    "escalations": stats["escalations"],
+                    "escalation_rate": stats["escalations"] / stats["cascaded"] if stats["cascaded"] else 0.0,
+                    "reasons": dict(stats["reasons"]),
+                }
+                for route, stats in self.routes.items()
+            }
+        turns = sum(r["turns"] for r in routes.values())
+        cascaded = sum(r["cascaded"] for r in routes.values())
+        escalations = sum(r["escalations"] for r in routes.values())
+        return {
+            "turns": turns,
+            "escalation_rate": escalations / cascaded if cascaded else 0.0,
+            "cheap_share": (cascaded - escalations) / turns if turns else 0.0,  # 由小模型完成的轮次占比
+            "models": models,
+            "routes": routes,
+        }
+
+    def report(self) -> str:
+        """多行文本报告：各模型延迟、各规则升级率和原因"""
+        summary = self.summary()
+        lines = [f"🔀 模型路由: {summary['turns']} 轮  小模型完成 {summary['cheap_share']:.0%}  "
+                 f"升级率 {summary['escalation_rate']:.0%}"]
+        for model, stats in summary["models"].items():
+            lines.append(f"  {model}: {stats['calls']} 次  平均 {stats['avg_ms']:.0f}ms  "
+                         f"p50 {stats['p50_ms']:.0f}ms  p95 {stats['p95_ms']:.0f}ms  "
+                         f"失败 {stats['failures']}  缓存命中 {stats['cached']}")
+        for route, stats in summary["routes"].items():
+            reasons = "、".join(f"{reason}×{count}" for reason, count in stats["reasons"].items())
+            lines.append(f"  规则 {route}: {stats['turns']} 轮  级联 {stats['cascaded']}  "
+                         f"升级 {stats['escalations']}（{stats['escalation_rate']:.0%}）"
+                         + (f"  原因: {reasons}" if reasons else ""))
+        return "\n".join(lines)
+
+
+router_stats = RouterStats()
+
+# ==================== 路由规则 ====================
+class ModelRouter:
+    """
+    按规则为每轮选择模型：命中规则的轮次先用小模型，输出校验失败再升级到 MODEL
+
+    rules 按顺序匹配，第一条满足的规则决定先用哪个模型（省略 model 时为 CHEAP_MODEL），省略的条件不限制：
+    turn: user（刚收到用户消息）/ tool（刚收到工具结果）；max_pending_tools: 待处理的工具结果数上限；
+    max_messages / max_bytes: 历史消息数 / 字节数上限（历史越长，小模型越容易出错）
+    """
+
+    def __init__(self, rules: list, cheap_model: str = CHEAP_MODEL, model: str = MODEL,
+                 stats: RouterStats = None):
+        self.rules = rules
+        self.cheap_model = cheap_model
+        self.model = model
+        self.stats = stats or router_stats
+
+    @staticmethod
+    def pending_tools(messages: list) -> int:
+        """末尾连续的工具结果数（Function Calling 以 tool 消息传回工具结果）"""
+        pending = 0
+        for message in reversed(messages):
+            if message.get("role") != "tool":
+                break
+            pending += 1
+        return pending
+
+    def features(self, messages: list, measure=message_bytes) -> dict:
+        """本轮的路由特征：轮次类型、待处理的工具结果数、历史消息数和字节数"""
+        pending = self.pending_tools(messages)
+        return {"turn": "tool" if pending else "user", "pending_tools": pending,
+                "messages": len(messages), "bytes": measure(messages)}
+
+    @staticmethod
+    def matches(rule: dict, features: dict) -> bool:
+        return (rule.get("turn", features["turn"]) == features["turn"]
+                and features["pending_tools"] <= rule.get("max_pending_tools", features["pending_tools"])
+                and features["messages"] <= rule.get("max_messages", features["messages"])
+                and features["bytes"] <= rule.get("max_bytes", features["bytes"]))
+
+    def route(self, messages: list, measure=message_bytes) -> tuple:
+        """返回 (规则名, 依次尝试的模型)；没有配置小模型或没有命中规则时只用 MODEL"""
+        if self.cheap_model:
+            features = self.features(messages, measure)
+            for rule in self.rules:
+                if self.matches(rule, features):
+                    first = rule.get("model", self.cheap_model)
+                    return rule["name"], [first, self.model] if first != self.model else [self.model]
+        return "default", [self.model]
+
+
+# ==================== 级联执行 ====================
+# 三章的 Agent 共用：每章只提供请求一次模型的 attempt 和校验回复的 validate
+def _attempt_failed(router: ModelRouter, model: str, start: float, cascading: bool, error: Exception) -> str:
+    """请求失败：小模型返回升级原因，最后一个模型的异常继续抛出"""
+    router.stats.record_call(model, time.perf_counter() - start, False)
+    if not cascading:
+        raise error
+    return f"请求失败({type(error).__name__})"
+
+
+def _check_attempt(router: ModelRouter, model: str, start: float, cascading: bool, reply, validate,
+                   cached) -> str:
+    """校验小模型的回复（最后一个模型的回复直接采用），返回升级原因（通过时为 None）"""
+    error = validate(reply) if cascading else None
+    router.stats.record_call(model, time.perf_counter() - start, error is None, cached())
+    return error
+
+
+def cascade(router: ModelRouter, route: str, models: list, attempt, validate, replay=None,
+            cached=lambda: False) -> tuple:
+    """
+    一轮的级联：依次用 models 调用 attempt(model, cascading)，小模型请求失败或 validate(回复) 返回失败原因时升级
+
+    cascading 为 True（还有后备模型）时，attempt 应缓冲流式输出、并把 validate 交给 chat_cached；
+    小模型的回复通过校验后调用 replay(回复) 回放。cached() 返回刚才的请求是否命中响应缓存。
+
+    Returns:
+        (回复, 最终使用的模型, 小模型的失败原因)，没有升级时失败原因为 None
+    """
+    escalation = None
+    for i, model in enumerate(models):
+        cascading = i < len(models) - 1
+        start = time.perf_counter()
+        try:
+            reply = attempt(model, cascading)
+        except Exception as e:
+            escalation = _attempt_failed(router, model, start, cascading, e)
+            continue
+        error = _check_attempt(router, model, start, cascading, reply, validate, cached)
+        if error is None:
+            if cascading and replay:
+                replay(reply)
+            break
+        escalation = error
+    router.stats.record_turn(route, len(models) > 1, escalation)
+    return reply, model, escalation
+
+
+async def acascade(router: ModelRouter, route: str, models: list, attempt, validate, replay=None,
+                   cached=lambda: False) -> tuple:
+    """cascade 的异步版本：attempt(model, cascading) 返回协程"""
+    escalation = None
+    for i, model in enumerate(models):
+        cascading = i < len(models) - 1
+        start = time.perf_counter()
+        try:
+            reply = await attempt(model, cascading)
+        except Exception as e:
+            escalation = _attempt_failed(router, model, start, cascading, e)
+            continue
+        error = _check_attempt(router, model, start, cascading, reply, validate, cached)
+        if error is None:
+            if cascading and replay:
+                replay(reply)
+            break
+        escalation = error
+    router.stats.record_turn(route, len(models) > 1, escalation)
+    return reply, model, escalation
+
+
+def replay_message(message: dict, on_delta=None, on_tool_call=None):
+    """回放缓冲的小模型回复（Function Calling）：校验通过后再输出内容、提交工具调用"""
+    if on_delta and message.get("content"):
+        on_delta(message["content"])
+    if on_tool_call:
+        for tool_call in message.get("tool_calls") or []:
+            on_tool_call(tool_call, json.loads(tool_call["function"]["arguments"] or "{}"))
+
+
+def chat_cached(cache, key: str, request, check=None) -> tuple:
+    """
+    先查响应缓存，未命中再调用 request() 请求模型，返回 (message, response)；命中缓存时 response 为 None
+
+    check(message) 返回失败原因时不写入缓存：小模型的无效回复会被升级丢弃，写入缓存的话下次会直接命中这条无效回复
+    """
+    if key:
+        message = cache.get(key)
+        if message is not None:
+            return message, None
+    response = request()
+    message = response["choices"][0]["message"]
+    if key and not (check and check(message)):
+        cache.set(key, message)
+    return message, response
+
+
+async def achat_cached(cache, key: str, request, check=None) -> tuple:
+    """chat_cached 的异步版本：request() 返回协程"""
+    if key:
+        message = cache.get(key)
+        if message is not None:
+            return message, None
+    response = await request()
+    message = response["choices"][0]["message"]
+    if key and not (check and check(message)):
+        cache.set(key, message)
+    return message, response
@@ -0,0 +1,197 @@
+"""
+工具注册表：从函数签名生成 JSON Schema 和参数校验器，同时服务 Function Calling 和 ReAct 文本协议
+"""
+import json
+import inspect
+
+# ==================== 工具注册表 ====================
+# 用 @registry.tool 注册工具：导入时从函数签名生成 JSON Schema 和参数校验器，
+# 调用时按名字查表后直接 fn(**args)，新增工具只需写一个函数
+_JSON_TYPES = {str: "string", int: "integer", float: "number", bool: "boolean", list: "array", dict: "object"}
+
+
+INVALID_JSON = "参数不是合法 JSON"
+
+
+def parse_arguments(arguments: str):
+    """解析 tool_call 的参数字符串；模型输出被截断或不是合法 JSON 时返回 None，由校验把错误返回给模型"""
+    try:
+        return json.loads(arguments or "{}")
+    except ValueError:
+        return None
+
+
+_SCHEMA_TYPES = {"string": str, "integer": int, "number": (int, float), "boolean": bool,
+                 "array": list, "object": dict}
+
+
+def _compile_schema(schema: dict):
+    """
+    把参数 Schema 编译成校验函数 check(value, path)，返回错误信息或 None
+
+    支持 type / items / properties / required / enum / minimum，足够覆盖工具参数；
+    对象中 Schema 未声明的字段不报错（与 JSON Schema 默认一致），工具函数自行忽略
+    """
+    expected = _SCHEMA_TYPES.get(schema.get("type"))
+    enum = schema.get("enum")
+    minimum = schema.get("minimum")
+    items = _compile_schema(schema["items"]) if isinstance(schema.get("items"), dict) else None
+    properties = {name: _compile_schema(spec) for name, spec in (schema.get("properties") or {}).items()}
+    required = schema.get("required") or []
+
+    def check(value, path: str) -> str:
+        if expected and (not isinstance(value, expected) or isinstance(value, bool) and expected is not bool):
+            return f"参数 {path} 类型错误"
+        if enum is not None and value not in enum:
+            return f"参数 {path} 取值错误"
+        if minimum is not None and isinstance(value, (int, float)) and not isinstance(value, bool) and value < minimum:
+            return f"参数 {path} 不能小于 {minimum}"
+        if items and isinstance(value, list):
+            for i, item in enumerate(value):
+                error = items(item, f"{path}[{i}]")
+                if error:
+                    return error
+        if isinstance(value, dict):
+            for name in required:
+                if name not in value:
+                    return f"缺少参数 {path}.{name}"
+            for name, field_check in properties.items():
+                if name in value:
+                    error = field_check(value[name], f"{path}.{name}")
+                    if error:
+                        return error
+        return None
+    return check
+
+
+class Tool:
+    """已注册的工具：函数、JSON Schema、参数校验器和参数显示方式"""
+
+    def __init__(self, fn, description: str = None, params: dict = None, display=None):
+        self.fn = fn
+        self.name = fn.__name__
+        self.description = description or (fn.__doc__ or "").strip().split("\n")[0]
+        self.display = display
+        self.fields = []  # [(参数名, Python 类型, 是否必填), ...]
+        properties = {}
+        for name, param in inspect.signature(fn).parameters.items():
+            annotation = param.annotation if param.annotation in _JSON_TYPES else None
+            spec = (params or {}).get(name, "")
+            # params 中可以给出参数说明（字符串），或完整的参数 Schema（字典）
+            if isinstance(spec, dict):
+                properties[name] = spec
+            else:
+                properties[name] = {"type": _JSON_TYPES.get(annotation, "string")}
+                if spec:
+                    properties[name]["description"] = spec
+            self.fields.append((name, annotation, param.default is inspect.Parameter.empty))
+        self.schema = {
+            "type": "function",
+            "function": {
+                "name": self.name,
+                "description": self.description,
+                "parameters": {
+                    "type": "object",
+                    "properties": properties,
+                    "required": [name for name, _, required in self.fields if required]
+                }
+            }
+        }
+        self.validate = self._compile_validator()
+
+    def _compile_validator(self):
+        """预先生成参数校验函数（嵌套的数组元素和对象字段按 Schema 逐层检查），返回错误信息或 None"""
+        properties = self.schema["function"]["parameters"]["properties"]
+        required = [name for name, _, is_required in self.fields if is_required]
+        checks = {name: _compile_schema(properties[name]) for name, _, _ in self.fields}
+
+        def validate(args) -> str:
+            if args is None:
+                return INVALID_JSON
+            if not isinstance(args, dict):
+                return "参数必须是 JSON 对象"
+            for name in required:
+                if name not in args:
+                    return f"缺少参数 {name}"
+            for name, value in args.items():
+                if name not in checks:
+                    return f"未知参数 {name}"
+                error = checks[name](value, name)
+                if error:
+                    return error
+            return None
+        return validate
+
+    def format_args(self, args: dict) -> str:
+        """格式化参数显示（自定义显示只用于通过校验的参数，模型给出的参数可能缺字段或类型不对）"""
+        if self.display and self.validate(args) is None:
+            return self.display(args)
+        if isinstance(args, dict) and len(args) == 1:
+            return str(next(iter(args.values())))
+        return json.dumps(args, ensure_ascii=False)
+
+
+class ToolRegistry:
+    """工具注册表：同时服务 Function Calling（JSON 参数）和 ReAct 文本协议（单个字符串参数）"""
+
+    def __init__(self):
+        self._tools = {}
+
+    def tool(self, description: str = None, params: dict = None, display=None):
+        """注册工具的装饰器"""
+        def decorator(fn):
+            self._tools[fn.__name__] = Tool(fn, description, params, display)
+            return fn
+        return decorator
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._tools
+
+    def schemas(self) -> list:
+        """所有工具的 JSON Schema（Function Calling 的 tools 参数）"""
+        return [tool.schema for tool in self._tools.values()]
+
+    def format_args(self, name: str, args: dict) -> str:
+        tool = self._tools.get(name)
+        return tool.format_args(args) if tool else json.dumps(args, ensure_ascii=False)
+
+    def validate(self, name: str, args: dict) -> str:
+        """检查工具名和参数，返回错误信息（没有问题时返回 None）"""
+        tool = self._tools.get(name)
+        if tool is None:
+            return f"未知工具: {name}"
+        error = tool.validate(args)
+        return f"参数错误: {name}: {error}" if error else None
+
+    def validate_text(self, name: str, text: str) -> str:
+        """ReAct 文本协议的参数检查，规则与 dispatch_text 一致"""
+        tool = self._tools.get(name)
+        if tool is None:
+            return f"未知工具: {name}"
+        if len(tool.fields) == 1:
+            return None if text.strip() else f"参数错误: {name}: 参数为空"
+        try:
+            args = json.loads(text)
+        except ValueError:
+            return f"参数错误: {name}: 参数必须是 JSON 对象"
+        return self.validate(name, args)
+
+    def dispatch(self, name: str, args: dict) -> str:
+        """Function Calling：校验参数后调用 fn(**args)"""
+        error = self.validate(name, args)
+        if error:
+            return error
+        return self._tools[name].fn(**args)
+
+    def dispatch_text(self, name: str, text: str) -> str:
+        """ReAct 文本协议：单参数工具直接传入文本，多参数工具的文本按 JSON 对象解析"""
+        tool = self._tools.get(name)
+        if tool is None:
+            return f"未知工具: {name}"
+        if len(tool.fields) == 1:
+            return tool.fn(text)
+        try:
+            args = json.loads(text)
+        except ValueError:
+            return f"参数错误: {name}: 参数必须是 JSON 对象"
+        return self.dispatch(name, args)
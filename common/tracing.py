@@ -0,0 +1,208 @@
+"""
+追踪：Span 记录每段耗时和属性（token、字节数、缓存命中），结束时交给 Sink（JSONL / 内存直方图 / OpenTelemetry）
+"""
+import os
+import json
+import time
+import bisect
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# ==================== 配置 ====================
+TRACE_SINKS = os.environ.get("AGENT_TRACE_SINKS", "histogram")  # 逗号分隔：jsonl / histogram / otel，留空关闭
+TRACE_PATH = os.environ.get("AGENT_TRACE_PATH", "traces.jsonl")  # 相对路径按当前目录（即所在章节目录）
+
+
+# ==================== 追踪 ====================
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    """一段计时区间：记录名称、父子关系、耗时和属性（字节数、token 数等）"""
+
+    def __init__(self, name: str, parent: "Span" = None, attributes: dict = None):
+        self.name = name
+        self.trace_id = parent.trace_id if parent else os.urandom(8).hex()
+        self.span_id = os.urandom(4).hex()
+        self.parent_id = parent.span_id if parent else None
+        self.start = time.time()
+        self.duration = 0.0
+        self.attributes = dict(attributes or {})
+        self.error = None
+
+    def set(self, **attributes):
+        """设置属性"""
+        self.attributes.update(attributes)
+
+    def add(self, key: str, value):
+        """累加数值属性"""
+        self.attributes[key] = self.attributes.get(key, 0) + value
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start": self.start,
+            "duration": self.duration,
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+class TraceSink:
+    """追踪输出基类：每个 Span 结束时调用 export"""
+
+    def export(self, span: Span):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class JSONLSink(TraceSink):
+    """每个 Span 写一行 JSON，便于离线分析"""
+
+    def __init__(self, path: str = TRACE_PATH):
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def export(self, span: Span):
+        line = json.dumps(span.to_dict(), ensure_ascii=False)
+        with self._lock:
+            self._file.write(line + "\n")
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class HistogramSink(TraceSink):
+    """内存直方图：按 Span 名称统计耗时分布，并累加数值属性（token、字节、缓存命中）"""
+
+    BOUNDS = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1, 2, 5, 10, 30, 60)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.series = {}
+
+    def export(self, span: Span):
+        index = bisect.bisect_left(self.BOUNDS, span.duration)
+        with self._lock:
+            series = self.series.setdefault(span.name, {
+                "buckets": [0] * (len(self.BOUNDS) + 1),
+                "count": 0, "total": 0.0, "max": 0.0, "errors": 0, "sums": {}
+            })
+            series["buckets"][index] += 1
+            series["count"] += 1
+            series["total"] += span.duration
+            series["max"] = max(series["max"], span.duration)
+            if span.error:
+                series["errors"] += 1
+            for key, value in span.attributes.items():
+                if isinstance(value, (int, float)):
+                    series["sums"][key] = series["sums"].get(key, 0) + value
+
+    def quantile(self, name: str, q: float) -> float:
+        """估算分位数（返回所在桶的上界）"""
+        series = self.series.get(name)
+        if not series or not series["count"]:
+            return 0.0
+        rank = q * series["count"]
+        seen = 0
+        for index, count in enumerate(series["buckets"]):
+            seen += count
+            if seen >= rank:
+                return min(self.BOUNDS[index], series["max"]) if index < len(self.BOUNDS) else series["max"]
+        return series["max"]
+
+    def summary(self) -> dict:
+        with self._lock:
+            return {
+                name: {
+                    "count": series["count"],
+                    "mean": series["total"] / series["count"],
+                    "p50": self.quantile(name, 0.5),
+                    "p95": self.quantile(name, 0.95),
+                    "p99": self.quantile(name, 0.99),
+                    "errors": series["errors"],
+                    **series["sums"],
+                }
+                for name, series in self.series.items()
+            }
+
+
+class OTelSink(TraceSink):
+    """转发给 OpenTelemetry（需安装 opentelemetry-api，并由应用配置 TracerProvider 和导出器）"""
+
+    def __init__(self, name: str = "dev_agent"):
+        from opentelemetry import trace
+        self._trace = trace
+        self._tracer = trace.get_tracer(name)
+
+    def export(self, span: Span):
+        start = int(span.start * 1e9)
+        attributes = {k: v for k, v in span.attributes.items() if isinstance(v, (str, bool, int, float))}
+        # Span 结束时才导出，子 Span 先于父 Span 结束，因此用属性记录父子关系
+        attributes.update({"agent.trace_id": span.trace_id, "agent.span_id": span.span_id,
+                           "agent.parent_id": span.parent_id or ""})
+        otel_span = self._tracer.start_span(span.name, start_time=start, attributes=attributes)
+        if span.error:
+            otel_span.set_status(self._trace.Status(self._trace.StatusCode.ERROR, span.error))
+        otel_span.end(end_time=start + int(span.duration * 1e9))
+
+
+class Tracer:
+    """追踪器：用 with tracer.span(...) 包住一段代码，结束时交给所有 Sink"""
+
+    def __init__(self, sinks: list = None):
+        self.sinks = list(sinks or [])
+
+    @property
+    def enabled(self) -> bool:
+        """没有 Sink 时跳过字节数统计等额外开销"""
+        return bool(self.sinks)
+
+    @property
+    def histogram(self):
+        return next((sink for sink in self.sinks if isinstance(sink, HistogramSink)), None)
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        span = Span(name, _current_span.get(), attributes)
+        token = _current_span.set(span)
+        start = time.perf_counter()
+        try:
+            yield span
+        except BaseException as e:
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            span.duration = time.perf_counter() - start
+            _current_span.reset(token)
+            for sink in self.sinks:
+                sink.export(span)
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+
+def payload_bytes(obj) -> int:
+    """JSON 序列化后的字节数"""
+    return len(json.dumps(obj, ensure_ascii=False).encode("utf-8"))
+
+
+_tracer = None
+
+
+def get_tracer() -> Tracer:
+    """获取共享的 Tracer（Sink 由 TRACE_SINKS 配置）"""
+    global _tracer
+    if _tracer is None:
+        sink_types = {"jsonl": JSONLSink, "histogram": HistogramSink, "otel": OTelSink}
+        kinds = [kind.strip() for kind in TRACE_SINKS.split(",") if kind.strip()]
+        _tracer = Tracer([sink_types[kind]() for kind in kinds])
+    return _tracer
@@ -0,0 +1,14 @@
+"""
+测试公共配置：把仓库根目录和各章节目录加入 sys.path，测试可直接 import common 和章节模块
+"""
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (ROOT, *(os.path.join(ROOT, d) for d in ("01_build_agent_from_scratch", "02_tool_calling_fc",
+                                                        "03_mcp_practice"))):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+# 章节模块导入时会读取 API Key，测试不访问真实接口
+os.environ.setdefault("TENCENT_API_KEY", "stub")
@@ -0,0 +1,119 @@
+"""
+Agent 服务的准入控制：流式响应无论是否开始发送都归还名额
+"""
+import asyncio
+
+from starlette.requests import ClientDisconnect
+
+from agent_server import AdmissionController, AdmittedStreamingResponse
+from dev_agent import HistoryManager
+
+SCOPE = {"type": "http", "method": "POST", "path": "/", "headers": [], "asgi": {"spec_version": "2.4"}}
+
+
+async def receive():
+    await asyncio.sleep(3600)
+    return {"type": "http.disconnect"}
+
+
+def serve(send) -> tuple:
+    """准入后返回流式响应并按 ASGI 发送，返回 (准入控制器, 生成器是否开始执行)"""
+    started = []
+
+    async def body():
+        started.append(True)
+        yield "data\n"
+
+    async def run():
+        admission = AdmissionController(max_inflight=1, max_queue=0, timeout=0.1)
+        await admission.acquire()
+        response = AdmittedStreamingResponse(body(), admission)
+        try:
+            await response(SCOPE, receive, send)
+        except ClientDisconnect:
+            pass
+        return admission
+    return asyncio.run(run()), bool(started)
+
+
+def test_permit_released_after_stream():
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+    admission, started = serve(send)
+    assert started and admission.inflight == 0
+    assert sent[-1] == {"type": "http.response.body", "body": b"", "more_body": False}
+
+
+def test_permit_released_when_client_gone_before_body():
+    async def send(message):
+        raise OSError("client disconnected")
+    admission, started = serve(send)
+    # 生成器从未开始迭代，名额仍然归还
+    assert not started and admission.inflight == 0
+    assert not admission._semaphore.locked()
+
+
+def test_history_records_are_bounded():
+    history = HistoryManager(max_records=3)
+    messages = [{"role": "user", "content": "hi"}]
+    for _ in range(10):
+        history.compact(messages)
+    assert len(history.records) == 3
+    assert history.records[-1]["before"] == history.records[-1]["after"]
+
+
+
+def test_cancelled_reply_rolls_back_messages(monkeypatch):
+    import agent_server
+
+    class FakeAgent:
+        messages = [{"role": "system", "content": "sys"}]
+
+    async def stuck_query(message, mcp_client, max_turns, stream, agent, on_event):
+        agent.messages.append({"role": "user", "content": message})
+        agent.messages.append({"role": "assistant", "tool_calls": [{"id": "call_1"}]})
+        on_event({"type": "action", "tool": "generate_uuid"})
+        await asyncio.sleep(3600)
+
+    monkeypatch.setattr(agent_server, "query", stuck_query)
+    session = agent_server.Session("s1", FakeAgent())
+
+    async def run():
+        events = agent_server.AgentServer().reply(session, "hi")
+        assert (await events.__anext__())["type"] == "action"
+        await events.aclose()  # 客户端断开
+        for _ in range(10):
+            await asyncio.sleep(0)
+    asyncio.run(run())
+    # 回滚到请求前，不留下没有工具结果的 tool_calls
+    assert session.agent.messages == [{"role": "system", "content": "sys"}]
+    assert not session.busy
+
+
+def test_parse_message_rejects_malformed_body():
+    import pytest
+    from agent_server import parse_message
+    assert parse_message(b'{"message": " hi "}') == "hi"
+    assert parse_message('{}') == ""
+    for raw in [b"{not json", b"42", b'["hi"]', b'{"message": 42}', b"\xff"]:
+        with pytest.raises(ValueError):
+            parse_message(raw)
+
+
+def test_malformed_requests_get_client_errors(monkeypatch):
+    from starlette.testclient import TestClient
+    import agent_server
+    monkeypatch.setattr(agent_server.server, "sessions", agent_server.SessionStore(object))
+    session = agent_server.server.sessions.create()
+    client = TestClient(agent_server.app)  # 不进入 lifespan，不启动 MCP Server
+    for body in [b"{not json", b"42"]:
+        response = client.post(f"/sessions/{session.id}/messages", content=body)
+        assert response.status_code == 400
+    with client.websocket_connect(f"/ws?session_id={session.id}") as websocket:
+        assert websocket.receive_json()["type"] == "session"
+        websocket.send_text("{not json")
+        assert websocket.receive_json()["type"] == "error"
+        websocket.send_text("[1, 2]")
+        assert websocket.receive_json()["type"] == "error"
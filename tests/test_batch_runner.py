@@ -0,0 +1,21 @@
+"""
+批量点餐：格式不对的行记为失败，不中断整批
+"""
+import json
+
+import batch_runner
+
+
+def test_malformed_lines_are_recorded_as_errors(tmp_path, monkeypatch):
+    monkeypatch.setattr(batch_runner, "query", lambda order, max_turns, verbose: f"已处理 {order}")
+    source = tmp_path / "orders.jsonl"
+    source.write_text('{"order": "一份汉堡"}\n42\n{"max_turns": 3}\n["可乐"]\n一杯可乐\n', encoding="utf-8")
+    output = tmp_path / "results.jsonl"
+
+    stats = batch_runner.run_batch(batch_runner.load_orders(str(source)), str(output), workers=2)
+
+    assert stats["total"] == 5 and stats["errors"] == 3
+    records = sorted((json.loads(line) for line in output.read_text(encoding="utf-8").splitlines()),
+                     key=lambda record: record["index"])
+    assert [record.get("result") for record in records] == ["已处理 一份汉堡", None, None, None, "已处理 一杯可乐"]
+    assert records[1]["order"] == 42 and records[1]["error"].startswith("ValueError")
@@ -0,0 +1,18 @@
+"""
+ReAct 输出控制对比的回放录制：提示词或请求格式变化后录制会失效，需要重新录制
+"""
+import pytest
+
+import bench_react
+from common.offline import ReplayLLMClient
+
+
+@pytest.mark.parametrize("stream", [False, True], ids=["batch", "stream"])
+def test_fixture_replays_both_variants(stream):
+    client = ReplayLLMClient(bench_react.FIXTURE_PATH, latency=0)
+    tokens = {}
+    for name, options in bench_react.VARIANTS.items():
+        results = bench_react.run_variant(bench_react.ORDERS, stream, options, client)
+        assert [order for order, _ in results] == bench_react.ORDERS
+        tokens[name] = sum(turn["completion_tokens"] for _, turns in results for turn in turns)
+    assert tokens["after"] < tokens["before"]
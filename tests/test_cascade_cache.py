@@ -0,0 +1,96 @@
+"""
+模型级联与响应缓存：小模型的无效回复被升级丢弃，不能写入缓存
+"""
+import asyncio
+
+import pytest
+
+import order_agent
+import order_agent_fc
+import dev_agent
+from common.cache import LRUCompletionCache
+from common.router import RouterStats
+
+CHEAP = "cheap-model"
+
+
+class TwoModelClient:
+    """小模型总是返回无效回复，大模型返回有效回复，并统计各模型的请求次数"""
+
+    def __init__(self, valid: dict):
+        self.valid = valid
+        self.calls = {}
+
+    def chat(self, data: dict, body: bytes = None) -> dict:
+        self.calls[data["model"]] = self.calls.get(data["model"], 0) + 1
+        message = {"role": "assistant", "content": ""} if data["model"] == CHEAP else self.valid
+        return {"choices": [{"index": 0, "message": message}]}
+
+    def close(self):
+        pass
+
+
+class AsyncTwoModelClient(TwoModelClient):
+    async def chat(self, data: dict, body: bytes = None) -> dict:
+        return TwoModelClient.chat(self, data, body)
+
+
+def make_agent(module, client, cache, router_cls=None):
+    router = (router_cls or module.ModelRouter)(module.ROUTE_RULES, cheap_model=CHEAP, model=module.MODEL,
+                                                 stats=RouterStats())
+    return module.Agent("system", client=client, cache=cache, router=router)
+
+
+@pytest.mark.parametrize("module, valid, router_cls", [
+    (order_agent, {"role": "assistant", "content": "Thought: 完成\nAnswer: 共 58 元"}, order_agent.ReActRouter),
+    (order_agent_fc, {"role": "assistant", "content": "共 58 元"}, None),
+    (dev_agent, {"role": "assistant", "content": "完成"}, None),
+])
+def test_invalid_cheap_reply_is_not_cached(module, valid, router_cls):
+    client = TwoModelClient(valid)
+    cache = LRUCompletionCache()
+    for _ in range(2):
+        agent = make_agent(module, client, cache, router_cls)
+        agent.messages.append({"role": "user", "content": "我要一个汉堡"})
+        agent.execute()
+    # 第二次仍然请求小模型（无效回复没有被缓存），大模型的有效回复命中缓存
+    assert client.calls == {CHEAP: 2, module.MODEL: 1}
+    assert len(cache._data) == 1
+
+
+def test_invalid_cheap_reply_is_not_cached_async():
+    client = AsyncTwoModelClient({"role": "assistant", "content": "完成"})
+    cache = LRUCompletionCache()
+
+    async def run():
+        for _ in range(2):
+            router = dev_agent.ModelRouter(dev_agent.ROUTE_RULES, cheap_model=CHEAP, model=dev_agent.MODEL,
+                                           stats=RouterStats())
+            agent = dev_agent.AsyncAgent("system", client=client, cache=cache, router=router)
+            agent.messages.append({"role": "user", "content": "生成一个 UUID"})
+            await agent.aexecute()
+    asyncio.run(run())
+    assert client.calls == {CHEAP: 2, dev_agent.MODEL: 1}
+    assert len(cache._data) == 1
+
+
+def test_shared_cascade_escalates_on_failure_and_replays_cheap_reply():
+    from common.router import ModelRouter, cascade
+    router = ModelRouter([], cheap_model=CHEAP, model="big", stats=RouterStats())
+    replayed = []
+
+    def attempt(model, cascading):
+        if model == "broken":
+            raise ConnectionError("down")
+        return {"model": model, "buffered": cascading}
+
+    # 小模型请求失败时升级，升级原因记录异常类型
+    reply, model, escalation = cascade(router, "r", ["broken", "big"], attempt, lambda reply: None)
+    assert (reply, model, escalation) == ({"model": "big", "buffered": False}, "big", "请求失败(ConnectionError)")
+    # 小模型的回复通过校验后回放
+    reply, model, escalation = cascade(router, "r", [CHEAP, "big"], attempt, lambda reply: None, replayed.append)
+    assert model == CHEAP and escalation is None and replayed == [{"model": CHEAP, "buffered": True}]
+    # 最后一个模型的异常继续抛出
+    with pytest.raises(ConnectionError):
+        cascade(router, "r", ["broken"], attempt, lambda reply: "不会校验")
+    assert router.stats.summary()["routes"]["r"]["escalations"] == 1
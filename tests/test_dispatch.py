@@ -0,0 +1,67 @@
+"""
+Function Calling 工具分发：无论几个调用，工具异常和超时都转成错误信息返回给模型
+"""
+import time
+
+import pytest
+
+from order_agent_fc import dispatch_tool_calls, registry
+
+
+def test_single_call_error_is_reported(monkeypatch):
+    def broken(**args):
+        raise KeyError("name")
+    monkeypatch.setattr(registry, "dispatch", lambda name, args: broken(**args))
+    assert dispatch_tool_calls([("ask_menu_prices", {"items": [{}]})]) == ["工具执行错误: ask_menu_prices: 'name'"]
+
+
+def test_single_call_timeout(monkeypatch):
+    monkeypatch.setattr(registry, "dispatch", lambda name, args: time.sleep(0.5) or "late")
+    assert dispatch_tool_calls([("calculate", {"expression": "1"})], timeout=0.05) == ["工具执行超时: calculate"]
+
+
+def test_invalid_nested_arguments_do_not_crash():
+    results = dispatch_tool_calls([("ask_menu_prices", {"items": [{"quantity": 2}]}),
+                                   ("ask_menu_prices", {"items": [{"name": "汉堡", "quantity": "两"}]})])
+    assert results == ["参数错误: ask_menu_prices: 缺少参数 items[0].name",
+                       "参数错误: ask_menu_prices: 参数 items[0].quantity 类型错误"]
+
+
+def test_results_keep_call_order():
+    results = dispatch_tool_calls([("ask_menu_price", {"item_name": "汉堡"}), ("calculate", {"expression": "2*3"})])
+    assert len(results) == 2 and "汉堡" in results[0] and "6" in results[1]
+
+
+def truncated_call_script(name: str, arguments: str):
+    """脚本模型：第一轮给出参数被截断的工具调用，收到工具结果后原样回答"""
+    def script(messages):
+        last = messages[-1]
+        if last["role"] == "tool":
+            return {"role": "assistant", "content": f"Answer: {last['content']}"}
+        return {"role": "assistant", "content": "", "tool_calls": [{
+            "id": "call_1", "type": "function", "function": {"name": name, "arguments": arguments}}]}
+    return script
+
+
+@pytest.mark.parametrize("stream", [False, True], ids=["batch", "stream"])
+def test_invalid_json_arguments_are_reported(stream):
+    import order_agent_fc
+    from common.offline import ScriptedLLMClient
+    client = ScriptedLLMClient(truncated_call_script("calculate", '{"expression": "1+1"'))
+    agent = order_agent_fc.Agent(order_agent_fc.PROMPT, client=client, stream=stream)
+    answer = order_agent_fc.run_agent("算一下 1+1", verbose=False, agent=agent)
+    assert "参数错误: calculate: 参数不是合法 JSON" in answer
+
+
+@pytest.mark.parametrize("stream", [False, True], ids=["batch", "stream"])
+def test_mcp_invalid_json_arguments_are_reported(stream):
+    import asyncio
+    from types import SimpleNamespace
+    import dev_agent
+    from common.offline import AsyncScriptedLLMClient
+    # 参数不合法时不会发起 MCP 调用，不需要启动 Server
+    mcp_client = SimpleNamespace(get_tools_schema=lambda: [], tracer=dev_agent.get_tracer())
+    client = AsyncScriptedLLMClient(truncated_call_script("generate_hash", '{"text": "hel'))
+    agent = dev_agent.AsyncAgent(dev_agent.PROMPT, mcp_client, client=client, stream=stream)
+    answer = asyncio.run(dev_agent.query("计算 hello 的 md5", mcp_client, stream=stream, agent=agent))
+    assert "参数错误: generate_hash: 参数不是合法 JSON" in answer
@@ -0,0 +1,100 @@
+"""
+安全表达式计算：正常的金额计算，以及对抗性输入的拒绝和 CPU / 内存上限
+"""
+import time
+import tracemalloc
+from decimal import Decimal
+
+import pytest
+
+from common.expression import MAX_EXPRESSION_LENGTH, MAX_EXPRESSION_DEPTH, calculate, evaluate_expression
+
+
+@pytest.mark.parametrize("expression, expected", [
+    ("25*2 + 8*1", "58元"),
+    ("15×2 ＋ 8", "38元"),
+    ("（12.5 + 7.5）÷ 3", "6.67元"),
+    ("0.1 + 0.2", "0.3元"),
+    ("-5 + +3", "-2元"),
+    ("2**10", "1024元"),
+])
+def test_arithmetic(expression, expected):
+    assert calculate(expression) == expected
+
+
+@pytest.mark.parametrize("expression", [
+    # 属性访问、下划线名称、函数调用：都不在白名单内
+    "().__class__.__bases__[0].__subclasses__()",
+    "__import__('os').system('echo hi')",
+    "(1).__class__",
+    "__builtins__",
+    "open('/etc/passwd').read()",
+    "x",
+    "[1, 2][0]",
+    "lambda: 1",
+    "'a' * 10",
+    "1 if 1 else 2",
+    "1 < 2",
+    "True + 1",
+    "7 // 2",
+    "7 % 2",
+    "1 << 10000",
+])
+def test_rejects_non_arithmetic(expression):
+    assert calculate(expression).startswith("计算错误")
+
+
+@pytest.mark.parametrize("expression", [
+    "9**9**9",
+    "2**100",
+    "10**-11",
+    "2**0.5",
+    "((9**10)**10)**10**1",
+    "((((9**10)**10)**10)**10)",
+    "99999999999999**10**1",
+])
+def test_huge_exponents_are_cheap(expression):
+    start = time.perf_counter()
+    assert calculate(expression).startswith("计算错误")
+    assert time.perf_counter() - start < 0.1
+
+
+@pytest.mark.parametrize("expression, expected", [
+    ("-" * (MAX_EXPRESSION_DEPTH + 5) + "1", "计算错误: 表达式嵌套过深"),
+    ("+".join(["1"] * (MAX_EXPRESSION_DEPTH + 5)), "计算错误: 表达式嵌套过深"),
+    ("(" * 90 + "1" + ")" * 90, "1元"),  # 括号本身不增加语法树深度
+    ("(" * 200 + "1" + ")" * 200, f"计算错误: 表达式过长（超过 {MAX_EXPRESSION_LENGTH} 个字符）"),
+], ids=["unary", "sum", "parens", "too-many-parens"])
+def test_deep_nesting(expression, expected):
+    assert calculate(expression) == expected
+
+
+@pytest.mark.parametrize("expression", [
+    "1+" * 5000 + "1",
+    "9" * 100_000,
+    " " * 10_000_000 + "1",
+], ids=["chain", "digits", "padding"])
+def test_long_input_is_rejected_without_parsing(expression):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = calculate(expression)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    assert "表达式过长" in result
+    assert elapsed < 0.5
+    # 超长输入在规范化和解析之前就被拒绝，不会复制输入或分配语法树
+    assert peak < 64 * 1024
+
+
+def test_overflow_and_division():
+    assert calculate("1/0") == "计算错误: 除数不能为 0"
+    assert calculate("9" * 150 + "*" + "9" * 40) == "计算错误: 数值超出范围"
+    assert calculate("1e999999") == "计算错误: 数值超出范围"
+
+
+def test_results_are_memoized():
+    evaluate_expression.cache_clear()
+    assert evaluate_expression("38*3+3+5") == Decimal("122")
+    evaluate_expression("38*3+3+5")
+    assert evaluate_expression.cache_info().hits == 1
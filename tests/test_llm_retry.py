@@ -0,0 +1,131 @@
+"""
+大模型客户端的重试策略：只重发一定没有被处理的请求
+"""
+import json
+import time
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from common import llm
+from common.llm import LLMClient, AsyncLLMClient, retry_after_seconds
+
+OK = {"choices": [{"index": 0, "message": {"role": "assistant", "content": "ok"}}]}
+
+
+class StubServer:
+    """按脚本依次返回 (状态码, 响应头, 延迟) 的本地 HTTP 服务，记录收到的请求数"""
+
+    def __init__(self, script: list):
+        self.script = list(script)
+        self.calls = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                index = min(stub.calls, len(stub.script) - 1)
+                stub.calls += 1
+                status, headers, delay = stub.script[index]
+                time.sleep(delay)
+                body = json.dumps(OK).encode() if status == 200 else b"{}"
+                try:
+                    self.send_response(status)
+                    for key, value in headers.items():
+                        self.send_header(key, value)
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                except OSError:
+                    pass
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/v1/chat/completions"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    servers = []
+
+    def start(*script):
+        server = StubServer(script)
+        servers.append(server)
+        monkeypatch.setattr(llm, "API_URL", server.url)
+        return server
+    yield start
+    for server in servers:
+        server.close()
+
+
+def sync_chat(**kwargs):
+    client = LLMClient(backoff_factor=0, **kwargs)
+    try:
+        return client.chat({"messages": []})
+    finally:
+        client.close()
+
+
+def async_chat(**kwargs):
+    async def run():
+        client = AsyncLLMClient(backoff_factor=0, **kwargs)
+        try:
+            return await client.chat({"messages": []})
+        finally:
+            await client.close()
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize("chat", [sync_chat, async_chat])
+def test_server_error_is_not_resent(stub, chat):
+    server = stub((500, {}, 0), (200, {}, 0))
+    with pytest.raises(Exception):
+        chat()
+    assert server.calls == 1
+
+
+@pytest.mark.parametrize("chat", [sync_chat, async_chat])
+def test_read_timeout_is_not_resent(stub, chat):
+    server = stub((200, {}, 0.5), (200, {}, 0))
+    with pytest.raises(Exception):
+        chat(timeout=(1, 0.2))
+    assert server.calls == 1
+
+
+@pytest.mark.parametrize("chat", [sync_chat, async_chat])
+@pytest.mark.parametrize("status", [429, 503])
+def test_retry_after_is_honoured(stub, chat, status):
+    server = stub((status, {"Retry-After": "0"}, 0), (200, {}, 0))
+    assert chat() == OK
+    assert server.calls == 2
+
+
+@pytest.mark.parametrize("chat", [sync_chat, async_chat])
+def test_rejection_without_retry_after_is_not_resent(stub, chat):
+    server = stub((503, {}, 0), (200, {}, 0))
+    with pytest.raises(Exception):
+        chat()
+    assert server.calls == 1
+
+
+@pytest.mark.parametrize("chat", [sync_chat, async_chat])
+def test_retry_post_opt_in(stub, chat):
+    server = stub((500, {}, 0), (200, {}, 0))
+    assert chat(retry_post=True) == OK
+    assert server.calls == 2
+
+
+def test_retry_after_seconds():
+    assert retry_after_seconds("3") == 3.0
+    assert retry_after_seconds("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+    assert retry_after_seconds("soon") is None
+    assert retry_after_seconds(None) is None
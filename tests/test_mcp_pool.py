@@ -0,0 +1,69 @@
+"""
+MCP 连接池：Server 进程被杀掉后，调用改走健康的进程，崩溃的进程在后台重启
+"""
+import os
+import signal
+import asyncio
+
+import pytest
+
+import dev_agent
+
+pytestmark = pytest.mark.skipif(not os.path.isdir("/proc"), reason="按 /proc 查找 Server 子进程")
+
+
+def server_pids() -> set:
+    """当前进程启动的 mcp_server.py 子进程"""
+    pids = set()
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+            with open(f"/proc/{entry}/cmdline", "rb") as f:
+                cmdline = f.read()
+        except OSError:
+            continue
+        if ppid == os.getpid() and b"mcp_server.py" in cmdline:
+            pids.add(int(entry))
+    return pids
+
+
+def test_pool_survives_killed_worker():
+    async def run():
+        pool = dev_agent.MCPClientPool(2)
+        await pool.connect(dev_agent.MCP_SERVER_SCRIPT)
+        try:
+            pids = server_pids()
+            assert len(pids) == 2
+            os.kill(next(iter(pids)), signal.SIGKILL)
+            await asyncio.sleep(0.5)
+            results = [await pool.call_tool("generate_uuid", {}) for _ in range(4)]
+            # 崩溃的进程在后台重启，最终两个进程都可用
+            for _ in range(100):
+                if all(worker.alive for worker in pool.workers):
+                    break
+                await asyncio.sleep(0.1)
+            alive = [worker.alive for worker in pool.workers]
+            after = await asyncio.gather(*(pool.call_tool("generate_uuid", {}) for _ in range(4)))
+        finally:
+            await pool.disconnect()
+        return results, alive, after
+
+    results, alive, after = asyncio.run(run())
+    assert all(r.startswith("🆔") for r in results), results
+    assert alive == [True, True]
+    assert all(r.startswith("🆔") for r in after), after
+
+
+def test_connection_closed_error_marks_worker_dead():
+    from mcp.shared.exceptions import McpError
+    from mcp.types import CONNECTION_CLOSED, ErrorData
+    worker = dev_agent._ServerConnection("mcp_server.py")
+    worker.session = object()
+    worker._task = asyncio.Future(loop=asyncio.new_event_loop())  # 后台任务仍在运行
+    assert not worker.check_failure(ValueError("工具出错"))
+    assert worker.alive
+    assert worker.check_failure(McpError(ErrorData(code=CONNECTION_CLOSED, message="Connection closed")))
+    assert not worker.alive
@@ -0,0 +1,104 @@
+"""
+MCP Server 的 CPU 密集型工具：繁忙时返回错误结果，大负载与小调用分开限流
+"""
+import asyncio
+
+import pytest
+from fastmcp import Client
+
+import mcp_server
+
+
+def call(name: str, args: dict):
+    async def run():
+        async with Client(mcp_server.mcp) as client:
+            return await client.call_tool(name, args, raise_on_error=False)
+    return asyncio.run(run())
+
+
+@pytest.fixture
+def full_lane(monkeypatch):
+    def fill(lane):
+        monkeypatch.setattr(lane, "in_flight", lane.limit)
+    return fill
+
+
+def test_busy_is_an_error_result(full_lane):
+    full_lane(mcp_server._small_lane)
+    result = call("generate_hash", {"text": "hello"})
+    assert result.is_error
+    assert "服务繁忙" in result.content[0].text
+
+
+def test_small_calls_unaffected_by_large_lane(full_lane, tmp_path):
+    full_lane(mcp_server._large_lane)
+    assert not call("generate_hash", {"text": "hello"}).is_error
+    path = tmp_path / "data.bin"
+    path.write_bytes(b"x" * 10)
+    assert call("hash_file", {"path": str(path)}).is_error
+    # 超过 LARGE_PAYLOAD_BYTES 的文本同样走大负载通道
+    assert call("base64_encode", {"text": "x" * mcp_server.LARGE_PAYLOAD_BYTES}).is_error
+
+
+@pytest.fixture
+def base_dir(monkeypatch, tmp_path):
+    base = tmp_path / "files"
+    base.mkdir()
+    monkeypatch.setattr(mcp_server, "FILE_BASE_DIR", str(base.resolve()))
+    return base
+
+
+def test_file_tools_stay_inside_base_dir(base_dir, tmp_path):
+    (base_dir / "data.bin").write_bytes(b"abc")
+    (tmp_path / "secret.txt").write_text("secret")
+    (base_dir / "link.txt").symlink_to(tmp_path / "secret.txt")
+    hash_file = mcp_server._CPU_BOUND["hash_file"]
+    base64_encode_file = mcp_server._CPU_BOUND["base64_encode_file"]
+
+    assert hash_file("data.bin")["bytes"] == 3
+    for path in ("../secret.txt", str(tmp_path / "secret.txt"), "link.txt"):
+        assert "不在允许的目录内" in hash_file(path)["error"]
+        assert "不在允许的目录内" in base64_encode_file(path)["error"]
+    assert "不在允许的目录内" in base64_encode_file("data.bin", "../out.b64")["error"]
+    assert not (tmp_path / "out.b64").exists()
+
+    result = base64_encode_file("data.bin")
+    assert (base_dir / "data.bin.b64").read_bytes() == b"YWJj" and result["output_bytes"] == 4
+    assert "error" in base64_encode_file("data.bin", "data.bin")
+    assert (base_dir / "data.bin").read_bytes() == b"abc"
+
+    # 输入不存在时保留已有的输出文件，也不留下临时文件
+    (base_dir / "keep.txt").write_text("keep")
+    assert "编码失败" in base64_encode_file("missing.bin", "keep.txt")["error"]
+    assert (base_dir / "keep.txt").read_text() == "keep"
+    assert sorted(p.name for p in base_dir.iterdir()) == ["data.bin", "data.bin.b64", "keep.txt", "link.txt"]
+
+
+def test_file_writer_is_not_read_only():
+    tools = asyncio.run(mcp_server.mcp.get_tools())
+    writer = tools["base64_encode_file"].annotations
+    assert writer.destructiveHint and not writer.readOnlyHint
+    assert tools["hash_file"].annotations.readOnlyHint
+
+
+def test_stdio_server_inherits_server_settings(monkeypatch):
+    import mcp.client.stdio
+    from dev_agent import _ServerConnection
+    captured = {}
+    monkeypatch.setattr(mcp.client.stdio, "stdio_client", lambda params: captured.setdefault("env", params.env))
+    monkeypatch.setenv("MCP_TOOL_WORKERS", "3")
+    monkeypatch.setenv("MCP_LARGE_QUEUE_DEPTH", "16")
+    monkeypatch.setenv("MCP_FILE_BASE_DIR", "/srv/data")
+    _ServerConnection("mcp_server.py")._transport()
+    assert captured["env"]["MCP_TOOL_WORKERS"] == "3"
+    assert captured["env"]["MCP_LARGE_QUEUE_DEPTH"] == "16"
+    assert captured["env"]["MCP_FILE_BASE_DIR"] == "/srv/data"
+
+
+def test_stdio_stdout_carries_only_protocol():
+    import sys
+    import subprocess
+    # stdin 立即关闭时 Server 直接退出，退出前缓冲的 stdout 会被刷出
+    result = subprocess.run([sys.executable, mcp_server.__file__], input=b"", capture_output=True, timeout=60)
+    assert result.stdout == b""
+    assert "启动程序员助手" in result.stderr.decode("utf-8")
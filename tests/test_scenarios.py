@@ -0,0 +1,180 @@
+"""
+端到端回归基准：三章的 Agent 用脚本模型（不访问网络）跑固定场景，记录每个场景的轮数、耗时和字节数
+
+    轮数：请求大模型的次数，必须与基线一致
+    字节：请求体 / 回复的总字节数，不能比基线多出 SCENARIO_BYTES_TOLERANCE
+    耗时：端到端耗时（脚本模型耗时为 SCENARIO_MODEL_LATENCY），不能超过 SCENARIO_MAX_SECONDS
+
+    SCENARIO_REPORT=report.json pytest tests/test_scenarios.py      # 输出本次结果
+    SCENARIO_UPDATE_BASELINE=1 pytest tests/test_scenarios.py       # 有意改变行为后更新基线
+"""
+import os
+import io
+import json
+import time
+import asyncio
+from contextlib import redirect_stdout
+
+import pytest
+
+import order_agent
+import order_agent_fc
+import dev_agent
+from common.cache import LRUCompletionCache
+from common.encoding import dumps_compact
+from common.offline import ScriptedLLMClient, AsyncScriptedLLMClient
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "scenario_baseline.json")
+BYTES_TOLERANCE = float(os.environ.get("SCENARIO_BYTES_TOLERANCE", "0.1"))
+MAX_SECONDS = float(os.environ.get("SCENARIO_MAX_SECONDS", "5"))
+MODEL_LATENCY = float(os.environ.get("SCENARIO_MODEL_LATENCY", "0"))
+
+ORDERS = ["我要2份汉堡和1杯可乐", "一份披萨、一份沙拉和两杯奶茶，帮我算一下总价"]
+DEV_TASKS = ["帮我生成一个 UUID", "计算 hello 的 md5", "把 Hello MCP 进行 base64 编码: Hello MCP"]
+
+
+class MeteredClient:
+    """包装脚本模型客户端，统计请求次数和请求 / 回复字节数"""
+
+    def __init__(self, client):
+        self.client = client
+        self.turns = 0
+        self.request_bytes = 0
+        self.response_bytes = 0
+
+    def _request(self, data: dict, body: bytes):
+        self.turns += 1
+        self.request_bytes += len(body or dumps_compact(data))
+
+    def chat(self, data: dict, body: bytes = None) -> dict:
+        self._request(data, body)
+        response = self.client.chat(data, body)
+        self.response_bytes += len(dumps_compact(response))
+        return response
+
+    def chat_stream(self, data: dict, body: bytes = None):
+        self._request(data, body)
+        for chunk in self.client.chat_stream(data, body):
+            self.response_bytes += len(dumps_compact(chunk))
+            yield chunk
+
+    def close(self):
+        pass
+
+
+class AsyncMeteredClient(MeteredClient):
+    async def chat(self, data: dict, body: bytes = None) -> dict:
+        self._request(data, body)
+        response = await self.client.chat(data, body)
+        self.response_bytes += len(dumps_compact(response))
+        return response
+
+    async def chat_stream(self, data: dict, body: bytes = None):
+        self._request(data, body)
+        async for chunk in self.client.chat_stream(data, body):
+            self.response_bytes += len(dumps_compact(chunk))
+            yield chunk
+
+    async def close(self):
+        pass
+
+
+def metrics(client: MeteredClient, elapsed: float, answer: str) -> dict:
+    return {"turns": client.turns, "request_bytes": client.request_bytes,
+            "response_bytes": client.response_bytes, "seconds": round(elapsed, 4), "answer": answer}
+
+
+def run_order(module, order: str, stream: bool) -> dict:
+    """01 / 02：同步 Agent 处理一个订单（每个场景使用独立的空缓存）"""
+    client = MeteredClient(ScriptedLLMClient(module.scripted_reply, latency=MODEL_LATENCY))
+    agent = module.Agent(module.PROMPT, client=client, stream=stream, cache=LRUCompletionCache())
+    start = time.perf_counter()
+    with redirect_stdout(io.StringIO()):
+        answer = module.run_agent(order, agent=agent)
+    return metrics(client, time.perf_counter() - start, answer)
+
+
+async def run_dev_tasks() -> dict:
+    """03：连接一次 MCP Server，依次运行所有任务（流式和非流式）"""
+    mcp_client = dev_agent.MCPClient()
+    await mcp_client.connect(dev_agent.MCP_SERVER_SCRIPT, lazy=False)
+    results = {}
+    try:
+        for stream in (False, True):
+            for task in DEV_TASKS:
+                mcp_client.result_cache = dev_agent.ToolResultCache()  # 场景之间互不命中工具结果缓存
+                client = AsyncMeteredClient(AsyncScriptedLLMClient(dev_agent.scripted_reply, latency=MODEL_LATENCY))
+                agent = dev_agent.AsyncAgent(dev_agent.PROMPT, mcp_client, client=client, stream=stream,
+                                             cache=LRUCompletionCache())
+                start = time.perf_counter()
+                answer = await dev_agent.query(task, mcp_client, stream=stream, agent=agent)
+                results[scenario_id("dev_agent", task, stream)] = metrics(client, time.perf_counter() - start, answer)
+    finally:
+        await mcp_client.disconnect()
+    return results
+
+
+def scenario_id(chapter: str, question: str, stream: bool) -> str:
+    return f"{chapter}/{'stream' if stream else 'batch'}/{question}"
+
+
+@pytest.fixture(scope="module")
+def dev_results():
+    return asyncio.run(run_dev_tasks())
+
+
+@pytest.fixture(scope="module")
+def baseline():
+    with open(BASELINE_PATH, encoding="utf-8") as f:
+        data = json.load(f)
+    results = {}
+    yield data, results
+    if os.environ.get("SCENARIO_UPDATE_BASELINE") == "1":
+        keep = ("turns", "request_bytes", "response_bytes")
+        with open(BASELINE_PATH, "w", encoding="utf-8") as f:
+            json.dump({k: {f: v[f] for f in keep} for k, v in sorted(results.items())}, f,
+                      ensure_ascii=False, indent=2)
+            f.write("\n")
+    if os.environ.get("SCENARIO_REPORT"):
+        with open(os.environ["SCENARIO_REPORT"], "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+def check(baseline, key: str, result: dict):
+    data, results = baseline
+    results[key] = result
+    if os.environ.get("SCENARIO_UPDATE_BASELINE") == "1":
+        return
+    expected = data[key]
+    assert result["turns"] == expected["turns"], f"{key}: 轮数 {result['turns']} != 基线 {expected['turns']}"
+    for field in ("request_bytes", "response_bytes"):
+        assert result[field] <= expected[field] * (1 + BYTES_TOLERANCE), \
+            f"{key}: {field} {result[field]} 超过基线 {expected[field]} 的 {BYTES_TOLERANCE:.0%}"
+    assert result["seconds"] <= MAX_SECONDS
+
+
+@pytest.mark.parametrize("stream", [False, True], ids=["batch", "stream"])
+@pytest.mark.parametrize("order", ORDERS)
+@pytest.mark.parametrize("module", [order_agent, order_agent_fc], ids=["order_agent", "order_agent_fc"])
+def test_order_scenarios(baseline, module, order, stream):
+    result = run_order(module, order, stream)
+    assert "总计" in result["answer"]
+    check(baseline, scenario_id(module.__name__, order, stream), result)
+
+
+@pytest.mark.parametrize("stream", [False, True], ids=["batch", "stream"])
+@pytest.mark.parametrize("task", DEV_TASKS)
+def test_dev_agent_scenarios(baseline, dev_results, task, stream):
+    key = scenario_id("dev_agent", task, stream)
+    result = dev_results[key]
+    assert not result["answer"].startswith("抱歉")
+    check(baseline, key, result)
+
+
+@pytest.mark.parametrize("module", [order_agent, order_agent_fc, dev_agent], ids=["order_agent", "order_agent_fc", "dev_agent"])
+def test_sync_llm_client_follows_llm_mode(module):
+    """三章的同步客户端都按 LLM_MODE 创建，脚本模式下同步 Agent 可以离线运行"""
+    client = module.create_llm_client("scripted")
+    assert isinstance(client, ScriptedLLMClient)
+    agent = module.Agent(module.PROMPT, client=client, cache=LRUCompletionCache())
+    assert agent.invoke("我要2份汉堡和1杯可乐" if module is not dev_agent else "帮我生成一个 UUID")
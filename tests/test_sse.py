@@ -0,0 +1,165 @@
+"""
+流式响应（SSE）：本地桩服务按录制的数据块分段发送，检查两种客户端的解析和 StreamAssembler 的增量组装
+"""
+import os
+import time
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from common import llm
+from common.llm import LLMClient, AsyncLLMClient, StreamAssembler, SSE_DONE, parse_sse_line
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def load_fixture(name: str) -> bytes:
+    with open(os.path.join(FIXTURES, name), "rb") as f:
+        return f.read()
+
+
+class SSEStubServer:
+    """把固定的响应体按 piece 字节一段发送（故意把一行切在任意位置），发送完关闭连接"""
+
+    def __init__(self, body: bytes, piece: int = 7):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.0"
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.end_headers()
+                try:
+                    for i in range(0, len(stub.body), stub.piece):
+                        self.wfile.write(stub.body[i:i + stub.piece])
+                        self.wfile.flush()
+                        time.sleep(0.0005)
+                except OSError:
+                    pass  # 客户端读到 [DONE] 后提前断开
+
+            def log_message(self, *args):
+                pass
+
+        self.body = body
+        self.piece = piece
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/v1/chat/completions"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def serve(monkeypatch):
+    servers = []
+
+    def start(body: bytes, piece: int = 7):
+        server = SSEStubServer(body, piece)
+        servers.append(server)
+        monkeypatch.setattr(llm, "API_URL", server.url)
+        return server
+    yield start
+    for server in servers:
+        server.close()
+
+
+def sync_assemble(assembler: StreamAssembler) -> dict:
+    client = LLMClient()
+    try:
+        for chunk in client.chat_stream({"stream": True}):
+            assembler.feed(chunk)
+    finally:
+        client.close()
+    return assembler.finish()
+
+
+def async_assemble(assembler: StreamAssembler) -> dict:
+    async def run():
+        client = AsyncLLMClient()
+        try:
+            async for chunk in client.chat_stream({"stream": True}):
+                assembler.feed(chunk)
+        finally:
+            await client.close()
+        return assembler.finish()
+    return asyncio.run(run())
+
+
+CLIENTS = pytest.mark.parametrize("assemble", [sync_assemble, async_assemble], ids=["sync", "async"])
+
+
+@CLIENTS
+@pytest.mark.parametrize("piece", [1, 7, 4096])
+def test_split_arguments(serve, assemble, piece):
+    serve(load_fixture("sse_split_arguments.txt"), piece)
+    dispatched = []
+    assembler = StreamAssembler(on_tool_call=lambda tc, args: dispatched.append((tc["id"], args)))
+    message = assemble(assembler)
+    args = {"items": [{"name": "汉堡", "quantity": 2}, {"name": "可乐"}]}
+    assert dispatched == [("call_1", args)]
+    assert message["tool_calls"][0]["function"]["name"] == "ask_menu_prices"
+    assert assembler.usage["total_tokens"] == 150
+
+
+@CLIENTS
+def test_multiple_indices_dispatch_as_each_completes(serve, assemble):
+    serve(load_fixture("sse_multiple_indices.txt").replace(b"\n", b"\r\n"))
+    deltas, dispatched = [], []
+    assembler = StreamAssembler(on_delta=deltas.append,
+                                on_tool_call=lambda tc, args: dispatched.append(tc["function"]["name"]))
+    message = assemble(assembler)
+    # index 1 的参数先完整，先派发；[DONE] 之后的数据不再读取
+    assert dispatched == ["calculate", "ask_menu_price"]
+    assert deltas == ["好的，", "我来查一下。"]
+    assert message["content"] == "好的，我来查一下。"
+    assert [tc["id"] for tc in message["tool_calls"]] == ["call_a", "call_b"]
+    assert message["tool_calls"][0]["function"]["arguments"] == '{"item_name": "汉堡"}'
+
+
+@CLIENTS
+def test_stream_without_done(serve, assemble):
+    body = load_fixture("sse_split_arguments.txt").replace(b"data: [DONE]\n", b"")
+    serve(body)
+    assert assemble(StreamAssembler())["tool_calls"][0]["id"] == "call_1"
+
+
+@CLIENTS
+def test_malformed_data_is_an_error(serve, assemble):
+    serve(load_fixture("sse_malformed.txt"))
+    deltas = []
+    with pytest.raises(ValueError, match="不是合法 JSON"):
+        assemble(StreamAssembler(on_delta=deltas.append))
+    assert deltas == ["前半句"]
+
+
+@pytest.mark.parametrize("line, expected", [
+    ("", None),
+    (": keep-alive", None),
+    ("event: message", None),
+    ("id: 42", None),
+    ("data:", None),
+    ("data: [DONE]", SSE_DONE),
+    ("data:[DONE]", SSE_DONE),
+    ('data:{"a":1}', {"a": 1}),
+    ('data: {"a": 1}  ', {"a": 1}),
+])
+def test_parse_sse_line(line, expected):
+    result = parse_sse_line(line)
+    assert result == expected if isinstance(expected, dict) else result is expected
+
+
+def test_incomplete_arguments_are_not_dispatched():
+    dispatched = []
+    assembler = StreamAssembler(on_tool_call=lambda tc, args: dispatched.append(args))
+    for fragment in ['{"text": "a}', '"', "}"]:
+        assembler.feed({"choices": [{"index": 0, "delta": {"tool_calls": [
+            {"index": 0, "id": "c", "function": {"name": "generate_hash", "arguments": fragment}}]}}]})
+    # '{"text": "a}' 以 } 结尾但不是完整 JSON，不能提前派发
+    assert dispatched == [{"text": "a}"}]
@@ -0,0 +1,62 @@
+"""
+MCP 工具结果缓存：只缓存成功结果，暂时性失败和错误结果下次重新调用
+"""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from mcp.types import TextContent
+
+from dev_agent import MCPClient
+
+
+def tool_result(text: str, is_error: bool = False, structured: dict = None):
+    return SimpleNamespace(content=[TextContent(type="text", text=text)], isError=is_error,
+                           structuredContent=structured)
+
+
+class FlakyClient(MCPClient):
+    """按顺序返回预设结果（异常则抛出）的 MCPClient，不连接真实 Server"""
+
+    def __init__(self, results: list):
+        super().__init__()
+        self._cacheable = {"generate_hash", "hash_file"}
+        self.results = list(results)
+        self.calls = 0
+
+    async def _call_tool_uncached(self, name: str, arguments: dict):
+        result = self.results[min(self.calls, len(self.results) - 1)]
+        self.calls += 1
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+
+def call_twice(client: MCPClient, name: str = "generate_hash") -> list:
+    async def run():
+        return [await client.call_tool(name, {"text": "hello"}) for _ in range(2)]
+    return asyncio.run(run())
+
+
+OK = tool_result("🔑 MD5 哈希值:\n5d41402abc4b2a76b9719d911017c592")
+
+
+@pytest.mark.parametrize("failure", [
+    ConnectionError("server restarting"),
+    asyncio.TimeoutError(),
+    tool_result("服务繁忙，请稍后重试", is_error=True),
+    tool_result("❌ 哈希失败: boom"),
+    tool_result('{"error": "读取失败"}', structured={"error": "读取失败"}),
+])
+def test_transient_failures_are_never_cached(failure):
+    client = FlakyClient([failure, OK])
+    first, second = call_twice(client)
+    assert second == OK.content[0].text
+    assert client.calls == 2
+    assert list(client.result_cache._data.values()) == [second]
+
+
+def test_success_is_cached():
+    client = FlakyClient([OK])
+    assert call_twice(client) == [OK.content[0].text] * 2
+    assert client.calls == 1
@@ -0,0 +1,73 @@
+"""
+工具注册表的参数校验：嵌套的数组元素和对象字段也按 Schema 检查
+"""
+import pytest
+
+from order_agent_fc import registry
+
+
+@pytest.mark.parametrize("args, error", [
+    ({"items": [{"quantity": 2}]}, "缺少参数 items[0].name"),
+    ({"items": [{"name": "汉堡", "quantity": "两"}]}, "参数 items[0].quantity 类型错误"),
+    ({"items": [{"name": "汉堡"}, {"name": 1}]}, "参数 items[1].name 类型错误"),
+    ({"items": [{"name": "汉堡", "quantity": True}]}, "参数 items[0].quantity 类型错误"),
+    ({"items": [{"name": "汉堡", "quantity": 0}]}, "参数 items[0].quantity 不能小于 1"),
+    ({"items": [{"name": "汉堡", "quantity": -3}]}, "参数 items[0].quantity 不能小于 1"),
+    ({"items": ["汉堡"]}, "参数 items[0] 类型错误"),
+    ({"items": "汉堡"}, "参数 items 类型错误"),
+    ({}, "缺少参数 items"),
+    ({"items": [], "note": ""}, "未知参数 note"),
+])
+def test_nested_arguments_are_rejected(args, error):
+    assert registry.validate("ask_menu_prices", args) == f"参数错误: ask_menu_prices: {error}"
+    # dispatch 返回错误信息给模型，而不是在工具函数里抛异常
+    assert registry.dispatch("ask_menu_prices", args) == f"参数错误: ask_menu_prices: {error}"
+
+
+def test_valid_nested_arguments():
+    args = {"items": [{"name": "汉堡", "quantity": 2}, {"name": "可乐", "extra": "x"}]}
+    assert registry.validate("ask_menu_prices", args) is None
+    assert "汉堡" in registry.dispatch("ask_menu_prices", args)
+
+
+def test_top_level_types():
+    assert registry.validate("calculate", {"expression": 1}) == "参数错误: calculate: 参数 expression 类型错误"
+    assert registry.validate("nope", {}) == "未知工具: nope"
+
+
+def test_format_args_falls_back_for_invalid_arguments():
+    assert registry.format_args("ask_menu_prices", {"items": [{"name": "汉堡", "quantity": 2}]}) == "汉堡*2"
+    # 校验不通过时不调用自定义显示，按通用格式显示原始参数
+    assert registry.format_args("ask_menu_prices", {"items": [{"item": "汉堡"}]}) == "[{'item': '汉堡'}]"
+    assert registry.format_args("ask_menu_prices", ["汉堡"]) == '["汉堡"]'
+
+
+@pytest.mark.parametrize("stream", [False, True], ids=["batch", "stream"])
+def test_run_agent_survives_invalid_tool_arguments(stream):
+    """显示参数不能先于校验执行：缺字段的参数以错误信息返回给模型，而不是让 run_agent 崩溃"""
+    import json
+    import order_agent_fc
+    from common.offline import ScriptedLLMClient
+
+    def script(messages):
+        last = messages[-1]
+        if last["role"] == "tool":
+            return {"role": "assistant", "content": f"Answer: {last['content']}"}
+        arguments = json.dumps({"items": [{"item": "汉堡"}]}, ensure_ascii=False)
+        return {"role": "assistant", "content": "", "tool_calls": [{
+            "id": "call_1", "type": "function", "function": {"name": "ask_menu_prices", "arguments": arguments}}]}
+
+    agent = order_agent_fc.Agent(order_agent_fc.PROMPT, client=ScriptedLLMClient(script), stream=stream)
+    answer = order_agent_fc.run_agent("我要一个汉堡", verbose=False, agent=agent)
+    assert "缺少参数 items[0].name" in answer
+
+
+def test_non_positive_quantities_are_not_priced():
+    import order_agent
+    from common.menu import price_items
+    assert price_items([("汉堡", -3), ("可乐", 1)]).splitlines() == [
+        "抱歉，汉堡的数量必须至少为 1", "可乐x1：单价8元，小计8元", "合计：8元"]
+    # ReAct 文本协议的 "汉堡*0" / "汉堡*-3" 同样被拒绝
+    for items in ("汉堡*0", "汉堡*-3"):
+        assert order_agent.registry.dispatch_text("ask_menu_prices", items).splitlines() == [
+            "抱歉，汉堡的数量必须至少为 1", "合计：0元"]
@@ -0,0 +1,30 @@
+"""
+追踪：嵌套 Span 记录父子关系，结束时交给所有 Sink
+"""
+import json
+
+import pytest
+
+from common.tracing import HistogramSink, JSONLSink, Tracer
+
+
+def test_nested_spans_are_exported_to_all_sinks(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    histogram = HistogramSink()
+    tracer = Tracer([histogram, JSONLSink(str(path))])
+    with tracer.span("agent.query") as parent:
+        with tracer.span("llm.chat", model="m") as child:
+            child.add("prompt_tokens", 3)
+            child.add("prompt_tokens", 4)
+        with pytest.raises(ValueError):
+            with tracer.span("tool.call"):
+                raise ValueError("失败")
+    tracer.close()
+
+    spans = {span["name"]: span for span in map(json.loads, path.read_text(encoding="utf-8").splitlines())}
+    assert spans["llm.chat"]["parent_id"] == parent.span_id == spans["agent.query"]["span_id"]
+    assert spans["llm.chat"]["trace_id"] == spans["agent.query"]["trace_id"]
+    assert spans["tool.call"]["error"] == "ValueError: 失败"
+    summary = histogram.summary()
+    assert summary["llm.chat"]["prompt_tokens"] == 7 and summary["tool.call"]["errors"] == 1
+    assert tracer.histogram is histogram